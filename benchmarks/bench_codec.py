@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Benchmark of the JSON encoders of ALTO responses.
+
+Compare the encoders of `alto.common.codec`, and the default renderer of
+the REST framework, on network maps, cost maps and path vector responses
+of growing sizes:
+
+    $ python benchmarks/bench_codec.py --pids 100 500 1000
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alto.server.northbound.settings')
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from alto.common.codec import JSON_ENCODERS, get_json_encoder, iter_json  # noqa: E402
+
+
+def networkmap(n):
+    return {
+        'meta': {'vtag': {'resource-id': 'networkmap', 'tag': '0' * 40}},
+        'network-map': {'PID{}'.format(i): {'ipv4': ['10.{}.{}.0/24'.format(i // 256, i % 256)]}
+                        for i in range(n)}
+    }
+
+
+def costmap(n):
+    pids = ['PID{}'.format(i) for i in range(n)]
+    return {
+        'meta': {
+            'dependent-vtags': [{'resource-id': 'networkmap', 'tag': '0' * 40}],
+            'cost-type': {'cost-mode': 'numerical', 'cost-metric': 'routingcost'}
+        },
+        'cost-map': {src: {dst: random.randint(1, 100) for dst in pids} for src in pids}
+    }
+
+
+def pathvector(n):
+    hosts = ['10.0.{}.{}'.format(i // 256, i % 256) for i in range(n)]
+    return {
+        'meta': {
+            'vtag': {'resource-id': 'pv.ecs', 'tag': '0' * 32},
+            'cost-type': {'cost-mode': 'array', 'cost-metric': 'ane-path'}
+        },
+        'endpoint-cost-map': {src: {dst: ['autolink_{}'.format(random.randint(1, 50))
+                                          for _ in range(4)]
+                                    for dst in hosts} for src in hosts}
+    }
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON encoder benchmark')
+    parser.add_argument('--pids', type=int, nargs='+', default=[100, 500, 1000],
+                        help='numbers of PIDs (or hosts for path vectors)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of rounds')
+    args = parser.parse_args()
+
+    random.seed(0)
+    encoders = [('drf', JSONRenderer().render)]
+    for name in JSON_ENCODERS:
+        try:
+            encoders.append((name, get_json_encoder(name)))
+        except ImportError:
+            print('{} is not installed'.format(name))
+
+    for gen in [networkmap, costmap, pathvector]:
+        for n in args.pids:
+            if gen is not networkmap and n > 1000:
+                continue
+            data = gen(n)
+            for name, encoder in encoders:
+                best = timeit(lambda: encoder(data), args.repeat)
+                print('{:>12} {:>6} {:>8}: best {:.3f}s'.format(gen.__name__, n, name, best))
+            if gen is pathvector:
+                # Path vectors are streamed row by row
+                for name, encoder in encoders[1:]:
+                    best = timeit(lambda: b''.join(iter_json(data, encoder=encoder)), args.repeat)
+                    print('{:>12} {:>6} {:>8}: best {:.3f}s'.format(gen.__name__, n,
+                                                                  name + '*', best))
+
+
+if __name__ == '__main__':
+    main()
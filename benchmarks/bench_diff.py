@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Benchmark of the patch generation of TIPS update graphs.
+
+Compare the structural diff in `alto.server.components.diff` with the
+generic `jsonpatch` and `json_merge_patch` libraries on an N x N cost map
+where a fraction of the costs changed:
+
+    $ python benchmarks/bench_diff.py --pids 2000 --change 0.01
+"""
+
+import argparse
+import copy
+import random
+import time
+
+import json_merge_patch
+import jsonpatch
+
+from alto.common.constants import Diff
+from alto.server.components.diff import create_patch
+
+
+def random_costmap(n):
+    pids = ['PID{}'.format(i) for i in range(n)]
+    return {
+        'meta': {
+            'dependent-vtags': [{'resource-id': 'networkmap', 'tag': '0' * 40}],
+            'cost-type': {'cost-mode': 'numerical', 'cost-metric': 'routingcost'}
+        },
+        'cost-map': {src: {dst: random.randint(1, 100) for dst in pids} for src in pids}
+    }
+
+
+def mutate(costmap, change):
+    costmap = copy.deepcopy(costmap)
+    rows = costmap['cost-map']
+    pids = list(rows)
+    for _ in range(int(len(pids) ** 2 * change)):
+        rows[random.choice(pids)][random.choice(pids)] = random.randint(1, 100)
+    return costmap
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TIPS patch generation benchmark')
+    parser.add_argument('--pids', type=int, default=1000,
+                        help='number of PIDs of the cost map')
+    parser.add_argument('--change', type=float, default=0.01,
+                        help='fraction of changed costs')
+    parser.add_argument('--repeat', type=int, default=3, help='number of rounds')
+    args = parser.parse_args()
+
+    random.seed(0)
+    old = random_costmap(args.pids)
+    new = mutate(old, args.change)
+    print('{}x{} cost map, {:.1%} costs changed'.format(
+        args.pids, args.pids, args.change))
+
+    cases = [
+        ('merge-patch', 'json_merge_patch',
+         lambda: json_merge_patch.create_patch(old, new)),
+        ('merge-patch', 'structural',
+         lambda: create_patch(old, new, Diff.JSON_MERGE_PATCH)),
+        ('json-patch', 'jsonpatch',
+         lambda: jsonpatch.JsonPatch.from_diff(old, new).patch),
+        ('json-patch', 'structural',
+         lambda: create_patch(old, new, Diff.JSON_PATCH)),
+    ]
+    for diff_format, name, func in cases:
+        best = timeit(func, args.repeat)
+        print('{:>12} {:>16}: best {:.3f}s'.format(diff_format, name, best))
+
+
+if __name__ == '__main__':
+    main()
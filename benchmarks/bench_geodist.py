@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Benchmark of the geo-distance computation in `GeoDistanceService`.
+
+Compare the scalar (pure Python) path with the vectorized (NumPy) path for
+a full mesh of |srcs| x |dsts| endpoints:
+
+    $ python benchmarks/bench_geodist.py --srcs 1000 --dsts 1000
+"""
+
+import argparse
+import random
+import time
+from unittest import mock
+
+from alto.server.components.backend import GeoDistanceService
+
+
+def random_geomap(n, prefix):
+    return {'ipv4:{}.{}.{}.{}'.format(prefix, i >> 16 & 255, i >> 8 & 255, i & 255):
+            (random.uniform(-90, 90), random.uniform(-180, 180))
+            for i in range(n)}
+
+
+def run(srcs, dsts, vectorized):
+    geomap = dict(srcs)
+    geomap.update(dsts)
+    alg = GeoDistanceService('default', autoreload=False, vectorized=vectorized)
+    with mock.patch.object(alg, 'get_geomap', return_value=geomap):
+        start = time.perf_counter()
+        content = alg.lookup(list(srcs), list(dsts), {})
+        elapsed = time.perf_counter() - start
+    return elapsed, content['endpoint-cost-map']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geo-distance benchmark')
+    parser.add_argument('--srcs', type=int, default=1000, help='number of sources')
+    parser.add_argument('--dsts', type=int, default=1000, help='number of destinations')
+    parser.add_argument('--repeat', type=int, default=3, help='number of rounds')
+    args = parser.parse_args()
+
+    random.seed(0)
+    srcs = random_geomap(args.srcs, 10)
+    dsts = random_geomap(args.dsts, 11)
+
+    results = dict()
+    for vectorized in [False, True]:
+        name = 'vectorized' if vectorized else 'scalar'
+        timings = []
+        for _ in range(args.repeat):
+            elapsed, costs = run(srcs, dsts, vectorized)
+            timings.append(elapsed)
+        results[name] = costs
+        print('{:>10}: best {:.3f}s / mean {:.3f}s ({}x{} endpoints)'.format(
+            name, min(timings), sum(timings) / len(timings), args.srcs, args.dsts))
+
+    max_err = max(abs(results['scalar'][s][d] - results['vectorized'][s][d])
+                  for s in results['scalar'] for d in results['scalar'][s])
+    print('max abs difference: {:.3e} km'.format(max_err))
+
+
+if __name__ == '__main__':
+    main()
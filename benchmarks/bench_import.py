@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Benchmark of the startup cost of the TIPS components.
+
+Measure, in fresh interpreters, the time to import the modules pulling in
+the version control system, and optionally the time to start it, which
+connects to the ZooKeeper server configured by `ALTO_CONFIG`:
+
+    $ python benchmarks/bench_import.py --repeat 5
+    $ ALTO_CONFIG=etc/alto.conf python benchmarks/bench_import.py --start
+
+Before the version control system was started lazily, importing
+`alto.server.components.vcs` cost as much as `--start`.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+MODULES = [
+    'alto.server.components.vcs',
+    'alto.server.components.backend',
+]
+
+START = 'from alto.server.components.vcs import get_vcs; get_vcs().stop()'
+
+
+def run(code):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TIPS startup benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='number of rounds')
+    parser.add_argument('--start', action='store_true',
+                        help='also start the version control system')
+    args = parser.parse_args()
+
+    baseline = min(run('pass') for _ in range(args.repeat))
+    print('{:>40}: best {:.3f}s'.format('interpreter', baseline))
+    cases = [('import ' + module, 'import ' + module) for module in MODULES]
+    if args.start:
+        cases.append(('get_vcs()', START))
+    for name, code in cases:
+        best = min(run(code) for _ in range(args.repeat))
+        print('{:>40}: best {:.3f}s (+{:.3f}s)'.format(name, best, best - baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Benchmark of the update graph stores used by the version control system.
+
+Write and read back the snapshots of an N x N cost map in each store:
+
+    $ python benchmarks/bench_ugstore.py --pids 500
+    $ python benchmarks/bench_ugstore.py --pids 500 --redis-host localhost --zk-host localhost
+
+ZooKeeper rejects znodes larger than 1 MB (jute.maxbuffer) by default, so
+large cost maps can only be stored inline in small deployments.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+
+from alto.server.components.storage import get_update_graph_store
+
+
+def random_costmap(n):
+    pids = ['PID{}'.format(i) for i in range(n)]
+    return {
+        'meta': {
+            'dependent-vtags': [{'resource-id': 'networkmap', 'tag': '0' * 40}],
+            'cost-type': {'cost-mode': 'numerical', 'cost-metric': 'routingcost'}
+        },
+        'cost-map': {src: {dst: random.randint(1, 100) for dst in pids} for src in pids}
+    }
+
+
+def run(store, payloads, zk=None):
+    paths = ['/alto/bench/digest/ug/0/{}'.format(i) for i in range(len(payloads))]
+    start = time.perf_counter()
+    for path, data in zip(paths, payloads):
+        if store.inline:
+            zk.create(path, data, makepath=True)
+        else:
+            store.put(path, data)
+    write = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path, data in zip(paths, payloads):
+        assert store.get(path) == data
+    read = time.perf_counter() - start
+
+    if store.inline:
+        zk.delete('/alto/bench', recursive=True)
+    else:
+        store.delete('/alto/bench', recursive=True)
+    return write, read
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update graph store benchmark')
+    parser.add_argument('--pids', type=int, default=500, help='number of PIDs of the cost map')
+    parser.add_argument('--versions', type=int, default=10, help='number of snapshots')
+    parser.add_argument('--redis-host', help='benchmark the Redis store on this host')
+    parser.add_argument('--zk-host', help='benchmark the ZooKeeper store on this host')
+    args = parser.parse_args()
+
+    random.seed(0)
+    payloads = [json.dumps(random_costmap(args.pids)).encode() for _ in range(args.versions)]
+    size = sum(len(data) for data in payloads) / len(payloads)
+    print('{} snapshots of {}x{} cost map, {:.1f} KB each'.format(
+        args.versions, args.pids, args.pids, size / 1024))
+
+    stores = []
+    root = tempfile.TemporaryDirectory()
+    stores.append(('filesystem', get_update_graph_store('filesystem', root=root.name), None))
+    if args.redis_host:
+        stores.append(('redis', get_update_graph_store('redis', host=args.redis_host), None))
+    if args.zk_host:
+        from kazoo.client import KazooClient
+        zk = KazooClient(hosts=args.zk_host)
+        zk.start()
+        if size > 1024 * 1024:
+            print('zookeeper: skipped, snapshots exceed the 1 MB znode limit')
+        else:
+            stores.append(('zookeeper', get_update_graph_store('zookeeper', zk=zk), zk))
+
+    for name, store, zk in stores:
+        write, read = run(store, payloads, zk=zk)
+        print('{:>10}: write {:.2f} ms / read {:.2f} ms per snapshot'.format(
+            name, write * 1000 / args.versions, read * 1000 / args.versions))
+        store.close()
+    root.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,133 @@
+import ipaddress
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
+from pytricia import PyTricia
+
 from alto.common.error import NotSupportedError
 
+# Cached geolocations expire so that an updated GeoIP2 data source is
+# eventually reflected
+DEFAULT_CACHE_TTL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class GeoipCache:
+    """
+    Bounded LRU cache of geolocations.
+
+    Entries are keyed by IP address and, optionally, by the enclosing network
+    reported in the GeoIP2 record, so that any address in the same network is
+    answered from the cache as well.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of cached addresses (and networks).
+    ttl : float or None
+        Time to live of a cached entry in seconds. None means no expiration,
+        which SHOULD only be used for data sources that never change.
+    """
+
+    def __init__(self, size=4096, ttl=DEFAULT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._addrs = OrderedDict()
+        self._networks = OrderedDict()
+        self._network_trie = PyTricia(128)
+        self._lock = Lock()
+
+    def _expired(self, timestamp):
+        return self.ttl is not None and time.time() - timestamp > self.ttl
+
+    def get(self, endpoint):
+        with self._lock:
+            entry = self._addrs.get(endpoint)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._addrs.move_to_end(endpoint)
+                    return entry[0]
+                del self._addrs[endpoint]
+            try:
+                network = self._network_trie.get_key(endpoint)
+            except ValueError:
+                network = None
+            if network is None:
+                return None
+            entry = self._networks[network]
+            if self._expired(entry[1]):
+                self._evict_network(network)
+                return None
+            self._networks.move_to_end(network)
+            return entry[0]
+
+    def put(self, endpoint, geoinfo, network=None):
+        now = time.time()
+        with self._lock:
+            self._addrs[endpoint] = (geoinfo, now)
+            self._addrs.move_to_end(endpoint)
+            while len(self._addrs) > self.size:
+                self._addrs.popitem(last=False)
+            if network is None:
+                return
+            network = str(network)
+            self._network_trie[network] = network
+            self._networks[network] = (geoinfo, now)
+            self._networks.move_to_end(network)
+            while len(self._networks) > self.size:
+                self._evict_network(next(iter(self._networks)))
+
+    def _evict_network(self, network):
+        del self._networks[network]
+        if self._network_trie.has_key(network):
+            del self._network_trie[network]
+
+    def clear(self):
+        with self._lock:
+            self._addrs.clear()
+            self._networks.clear()
+            self._network_trie = PyTricia(128)
+
+
+geoip_caches = dict()
+geoip_caches_lock = Lock()
+
+
+def get_geoip_cache(key, size=4096, ttl=DEFAULT_CACHE_TTL):
+    """
+    Get the shared cache of a GeoIP data source.
+
+    The cache is shared by all the agents accessing the same data source with
+    the same cache settings, so it survives the agent being re-created.
+    """
+    key = (key, size, ttl)
+    with geoip_caches_lock:
+        cache = geoip_caches.get(key)
+        if cache is None:
+            cache = geoip_caches[key] = GeoipCache(size=size, ttl=ttl)
+        return cache
+
 
 class GeoipAgent:
 
     def __init__(self, db_path=None, account_id=None, license_key=None,
-                 geolite=True):
+                 geolite=True, cache_size=4096, cache_ttl=DEFAULT_CACHE_TTL,
+                 cache_network=False, max_concurrency=8):
         self.access_type = None
         self.geolite = geolite
+        self.max_concurrency = max_concurrency
+        self.executor = None
+        self._executor_lock = Lock()
         if db_path:
             from geoip2.database import Reader
             self.db_path = db_path
             self.access_type = 'database'
             self.client = Reader(self.db_path)
+            cache_key = (self.access_type, self.db_path)
         elif account_id and license_key:
             from geoip2.webservice import Client
             self.account_id = account_id
@@ -21,12 +137,111 @@ class GeoipAgent:
             if self.geolite:
                 kwargs['host'] = 'geolite.info'
             self.client = Client(self.account_id, self.licence_key, **kwargs)
+            cache_key = (self.access_type, self.account_id, self.geolite)
         else:
             raise NotSupportedError("Either 'db_path' or ('account_id', 'license_key') should present.")
+        self.cache = None
+        if cache_size:
+            self.cache = get_geoip_cache(cache_key, size=cache_size, ttl=cache_ttl)
+        self.cache_network = cache_network
+
+    def close(self):
+        with self._executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        self.client.close()
+
+    def lookup_endpoint(self, endpoint):
+        """
+        Query the geolocation of an endpoint from the GeoIP2 data source.
+
+        Returns
+        -------
+        geoinfo : tuple
+            `(latitude, longitude)` of the endpoint.
+        network : str or None
+            The enclosing network sharing the same GeoIP2 record.
+        """
+        geoinfo = self.client.city(endpoint)
+        network = None
+        if self.cache_network:
+            network = getattr(getattr(geoinfo, 'traits', None), 'network', None)
+            if network is not None and not isinstance(network, (ipaddress.IPv4Network,
+                                                                ipaddress.IPv6Network)):
+                network = ipaddress.ip_network(network, strict=False)
+        return (geoinfo.location.latitude, geoinfo.location.longitude), network
+
+    def lookup(self, endpoints, timeout=None):
+        """
+        Query the geolocations of endpoints.
+
+        In webservice mode, cache misses are resolved by at most
+        `max_concurrency` workers, so that the deadline also bounds slow
+        requests.
 
-    def lookup(self, endpoints):
+        Parameters
+        ----------
+        endpoints : list
+            List of IP addresses.
+        timeout : float or None
+            Deadline of the whole query in seconds. Endpoints not resolved
+            before the deadline are omitted from the result.
+
+        Returns
+        -------
+        geomap : dict
+            Mapping from endpoints to `(latitude, longitude)` tuples. Failed
+            lookups are logged and omitted from the result.
+        """
+        deadline = None if timeout is None else time.time() + timeout
         geomap = dict()
+        misses = dict()
         for endpoint in endpoints:
-            geoinfo = self.client.city(endpoint)
-            geomap[endpoint] = (geoinfo.location.latitude, geoinfo.location.longitude)
+            geoinfo = self.cache.get(endpoint) if self.cache is not None else None
+            if geoinfo is not None:
+                geomap[endpoint] = geoinfo
+            else:
+                misses[endpoint] = None
+
+        if self.access_type == 'webservice' and misses:
+            geomap.update(self.lookup_concurrently(misses, deadline))
+            return geomap
+
+        for endpoint in misses:
+            if deadline is not None and time.time() > deadline:
+                break
+            try:
+                geomap[endpoint] = self.resolve(endpoint)
+            except Exception as e:
+                logger.error('Failed to look up %s: %s', endpoint, e)
+        return geomap
+
+    def get_executor(self):
+        with self._executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=max(self.max_concurrency, 1))
+            return self.executor
+
+    def lookup_concurrently(self, endpoints, deadline=None):
+        executor = self.get_executor()
+        futures = {executor.submit(self.resolve, endpoint): endpoint
+                   for endpoint in endpoints}
+        timeout = None if deadline is None else max(deadline - time.time(), 0)
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            # Lookups already in flight still fill the cache when they finish
+            future.cancel()
+        geomap = dict()
+        for future in done:
+            if future.exception() is None:
+                geomap[futures[future]] = future.result()
+            else:
+                logger.error('Failed to look up %s: %s', futures[future], future.exception())
         return geomap
+
+    def resolve(self, endpoint):
+        geoinfo, network = self.lookup_endpoint(endpoint)
+        if self.cache is not None:
+            self.cache.put(endpoint, geoinfo, network=network)
+        return geoinfo
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Pluggable JSON encoders for ALTO responses, and decoders for requests.
+
+Encoders turn a JSON-serializable object into compact UTF-8 bytes, i.e.,
+the same output as the default renderers of the REST framework:
+
+- json: the standard library, always available.
+- orjson: requires `orjson`.
+- ujson: requires `ujson`.
+- auto: the fastest one installed.
+"""
+
+import json
+
+from alto.common.error import NotSupportedError
+
+
+JSON_ENCODERS = ['orjson', 'ujson', 'json']
+
+
+def encode_json(obj, default=None):
+    return json.dumps(obj, default=default, ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def create_orjson_encoder():
+    import orjson
+
+    def encode_orjson(obj, default=None):
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return encode_orjson
+
+
+def create_ujson_encoder():
+    import ujson
+
+    def encode_ujson(obj, default=None):
+        return ujson.dumps(obj, default=default, ensure_ascii=False,
+                           escape_forward_slashes=False).encode('utf-8')
+    return encode_ujson
+
+
+def create_orjson_decoder():
+    import orjson
+    return orjson.loads
+
+
+def create_ujson_decoder():
+    import ujson
+    return ujson.loads
+
+
+_encoders = dict()
+_decoders = dict()
+
+
+def get_json_encoder(name='auto'):
+    """
+    Get a JSON encoder by name.
+
+    Parameters
+    ----------
+    name : str
+        One of `auto`, `orjson`, `ujson` and `json`.
+
+    Returns
+    -------
+    encoder : callable
+        `encoder(obj, default=None)` returns the encoded bytes. `default` is
+        called for objects which cannot be serialized otherwise.
+    """
+    encoder = _encoders.get(name)
+    if encoder is not None:
+        return encoder
+    if name == 'auto':
+        for candidate in JSON_ENCODERS:
+            try:
+                encoder = get_json_encoder(candidate)
+                break
+            except ImportError:
+                continue
+    elif name == 'orjson':
+        encoder = create_orjson_encoder()
+    elif name == 'ujson':
+        encoder = create_ujson_encoder()
+    elif name == 'json':
+        encoder = encode_json
+    else:
+        raise NotSupportedError("Unsupported JSON encoder '{}'".format(name))
+    _encoders[name] = encoder
+    return encoder
+
+
+def get_json_decoder(name='auto'):
+    """
+    Get a JSON decoder by name.
+
+    Returns
+    -------
+    decoder : callable
+        `decoder(data)` decodes UTF-8 bytes or a string. It raises
+        `ValueError` if the data is not valid JSON.
+    """
+    decoder = _decoders.get(name)
+    if decoder is not None:
+        return decoder
+    if name == 'auto':
+        for candidate in JSON_ENCODERS:
+            try:
+                decoder = get_json_decoder(candidate)
+                break
+            except ImportError:
+                continue
+    elif name == 'orjson':
+        decoder = create_orjson_decoder()
+    elif name == 'ujson':
+        decoder = create_ujson_decoder()
+    elif name == 'json':
+        decoder = json.loads
+    else:
+        raise NotSupportedError("Unsupported JSON decoder '{}'".format(name))
+    _decoders[name] = decoder
+    return decoder
+
+
+def iter_json(obj, encoder=encode_json, depth=2):
+    """
+    Encode an object to JSON incrementally.
+
+    Objects are split into their members down to `depth` levels, and the
+    deeper values, e.g., the rows of a map, are encoded at once by
+    `encoder`.
+
+    Returns
+    -------
+    chunks : iterator
+        Encoded bytes, which join into the same output as `encoder(obj)`.
+    """
+    if depth <= 0 or not isinstance(obj, dict):
+        yield encoder(obj)
+        return
+    yield b'{'
+    for i, (key, value) in enumerate(obj.items()):
+        yield (b',' if i else b'') + encoder(str(key)) + b':'
+        yield from iter_json(value, encoder=encoder, depth=depth - 1)
+    yield b'}'
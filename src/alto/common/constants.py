@@ -74,6 +74,12 @@ class Diff(Enum):
     JSON_MERGE_PATCH = 2
 
 
+DIFF_MEDIA_TYPES = {
+    Diff.JSON_PATCH: 'application/json-patch+json',
+    Diff.JSON_MERGE_PATCH: 'application/merge-patch+json'
+}
+
+
 def get_diff_format(media_type):
     diff_format = Diff.JSON_MERGE_PATCH
     if media_type == 'application/json-patch+json':
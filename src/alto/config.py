@@ -25,8 +25,10 @@
 # - Jensen Zhang <jingxuan.n.zhang@gmail.com>
 
 import os
+import signal
 import sys
 import json
+import threading
 
 try:
     # Compatible with Python 2
@@ -58,52 +60,178 @@ def get_ordered_config_dirs():
     return config_dirs
 
 
-class Config:
+def get_file_stamp(location):
     """
-    Top configuration class.
+    Return a stamp of a file which changes whenever the file is modified or
+    replaced, or None if the file does not exist.
     """
-    def __init__(self) -> None:
+    try:
+        st = os.stat(location)
+    except (TypeError, OSError):
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class ConfigSnapshot:
+    """
+    Parsed content of a configuration file.
+
+    A snapshot parses the file once and caches the decoded values. It MUST be
+    treated as immutable, including the decoded JSON structures it returns.
+    """
+
+    def __init__(self, location, version=0, generation=0):
+        self.location = location
+        self.version = version
+        self.generation = generation
+        self.stamp = get_file_stamp(location)
         if sys.version_info < (3, 2):
             self.parser = ConfigParser.SafeConfigParser()
         else:
             self.parser = ConfigParser.ConfigParser()
+        if location:
+            self.parser.read(location)
+        self._cache = dict()
+
+    def get(self, section, option, fallback=None):
+        return self.parser.get(section, option, fallback=fallback)
+
+    def get_int(self, section, option, fallback=None):
+        key = ('int', section, option)
+        if key not in self._cache:
+            self._cache[key] = int(self.parser.get(section, option, fallback=fallback))
+        return self._cache[key]
+
+    def get_float(self, section, option, fallback=None):
+        key = ('float', section, option)
+        if key not in self._cache:
+            self._cache[key] = float(self.parser.get(section, option, fallback=fallback))
+        return self._cache[key]
+
+    def get_bool(self, section, option, fallback=None):
+        key = ('bool', section, option)
+        if key not in self._cache:
+            self._cache[key] = self.parser.getboolean(section, option, fallback=fallback)
+        return self._cache[key]
+
+    def get_json(self, section, option, fallback=None):
+        key = ('json', section, option)
+        if key not in self._cache:
+            value = self.parser.get(section, option, fallback=None)
+            self._cache[key] = json.loads(value.strip()) if value else fallback
+        return self._cache[key]
+
+
+_snapshots = dict()
+_snapshot_lock = threading.Lock()
+_reload_generation = 0
+
+
+def get_config_snapshot(location):
+    """
+    Get the process-wide snapshot of a configuration file.
+
+    The file is parsed again only if it has been modified or replaced since
+    the last snapshot, or a reload has been requested by `reload_config()`.
+    """
+    snapshot = _snapshots.get(location)
+    if snapshot is not None and snapshot.generation == _reload_generation \
+            and snapshot.stamp == get_file_stamp(location):
+        return snapshot
+    with _snapshot_lock:
+        snapshot = _snapshots.get(location)
+        if snapshot is None or snapshot.generation != _reload_generation \
+                or snapshot.stamp != get_file_stamp(location):
+            version = snapshot.version + 1 if snapshot is not None else 0
+            snapshot = ConfigSnapshot(location, version=version,
+                                      generation=_reload_generation)
+            _snapshots[location] = snapshot
+    return snapshot
+
+
+def reload_config(*args):
+    """
+    Force all the configuration files to be parsed again on next access.
+    """
+    global _reload_generation
+    _reload_generation += 1
+
+
+def install_reload_signal_handler(signum=getattr(signal, 'SIGHUP', None)):
+    """
+    Reload the configuration on SIGHUP.
+
+    The handler can only be installed from the main thread. Previously
+    installed handlers are still called.
+    """
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+    previous = signal.getsignal(signum)
+
+    def handler(*args):
+        reload_config()
+        if callable(previous):
+            previous(*args)
+
+    signal.signal(signum, handler)
+    return True
+
+
+class Config:
+    """
+    Top configuration class.
+
+    All the instances reading the same file share one `ConfigSnapshot`.
+    Values returned by the getters are shared as well and MUST NOT be
+    modified.
+    """
+    def __init__(self) -> None:
         if 'ALTO_CONFIG' in os.environ:
             self.location = os.environ['ALTO_CONFIG']
         else:
             config_paths = [os.path.join(d, CONFIG_FILE) for d in get_ordered_config_dirs()]
             self.location = next(iter(filter(os.path.exists, config_paths)), None)
 
+    @property
+    def snapshot(self):
+        return get_config_snapshot(self.location)
+
+    @property
+    def parser(self):
+        return self.snapshot.parser
+
+    def get_version(self):
+        """
+        Return the version of the configuration, which increases every time
+        the configuration is reloaded.
+        """
+        return self.snapshot.version
+
     ####################
     # ALTO client config
     ####################
     def get_server_auth(self):
-        self.parser.read(self.location)
-        auth_type = self.parser.get('client', 'auth_type', fallback=None)
+        snapshot = self.snapshot
+        auth_type = snapshot.get('client', 'auth_type', fallback=None)
         auth = None
         if auth_type == 'userpass':
             auth = (
-                self.parser.get('client', 'username'),
-                self.parser.get('client', 'password')
+                snapshot.get('client', 'username'),
+                snapshot.get('client', 'password')
                 )
         return auth
 
 
     def get_default_ird_uri(self):
-        self.parser.read(self.location)
-        uri = self.parser.get('client', 'default_ird', fallback=None)
-        return uri
+        return self.snapshot.get('client', 'default_ird', fallback=None)
 
 
     def get_default_networkmap_uri(self):
-        self.parser.read(self.location)
-        uri = self.parser.get('client', 'default_networkmap', fallback=None)
-        return uri
+        return self.snapshot.get('client', 'default_networkmap', fallback=None)
 
 
     def get_default_costmap_uri(self):
-        self.parser.read(self.location)
-        uri = self.parser.get('client', 'default_costmap', fallback=None)
-        return uri
+        return self.snapshot.get('client', 'default_costmap', fallback=None)
 
 
     def get_resource_uri(self, resource_id):
@@ -115,14 +243,12 @@ class Config:
 
 
     def get_static_resource_uri(self, resource_id):
-        self.parser.read(self.location)
-        static_ird = json.loads(self.parser.get('client', 'static_ird', fallback='{}').strip())
+        static_ird = self.snapshot.get_json('client', 'static_ird', fallback={})
         return static_ird.get(resource_id)
 
 
     def get_resource_spec_by_metric(self, metric):
-        self.parser.read(self.location)
-        metric_resources = json.loads(self.parser.get('client', 'metrics', fallback='{}').strip())
+        metric_resources = self.snapshot.get_json('client', 'metrics', fallback={})
         return metric_resources.get(metric)
 
 
@@ -130,67 +256,115 @@ class Config:
     # ALTO server config
     ####################
     def get_db_config(self):
-        self.parser.read(self.location)
-        db_config = json.loads(self.parser.get('server', 'db_config', fallback='{}').strip())
-        return db_config
+        return self.snapshot.get_json('server', 'db_config', fallback={})
 
 
     def get_configured_resources(self):
-        self.parser.read(self.location)
-        resources = json.loads(self.parser.get('server', 'resources', fallback='{}').strip())
-        return resources
+        return self.snapshot.get_json('server', 'resources', fallback={})
 
 
     def get_default_namespace(self):
-        self.parser.read(self.location)
-        return self.parser.get('server', 'default_namespace', fallback='default')
+        return self.snapshot.get('server', 'default_namespace', fallback='default')
 
 
     def get_server_base_uri(self):
-        self.parser.read(self.location)
-        return self.parser.get('server', 'base_uri', fallback=None)
+        return self.snapshot.get('server', 'base_uri', fallback=None)
+
+
+    def get_server_json_encoder(self):
+        return self.snapshot.get('server', 'json_encoder', fallback='auto')
 
 
     def get_server_cost_types(self):
-        self.parser.read(self.location)
-        cost_types_json = self.parser.get('server', 'cost_types', fallback=None)
-        if cost_types_json:
-            return json.loads(cost_types_json.strip())
+        return self.snapshot.get_json('server', 'cost_types')
 
 
     def get_debug_mode(self):
-        self.parser.read(self.location)
-        return self.parser.get('server', 'debug_mode', fallback='production')
+        return self.snapshot.get('server', 'debug_mode', fallback='production')
 
 
     ####################################
     # ALTO server version control config
     ####################################
     def get_vcs_zookeeper_host(self):
-        self.parser.read(self.location)
-        return self.parser.get('server.vcs', 'zookeeper_host', fallback=None)
+        return self.snapshot.get('server.vcs', 'zookeeper_host', fallback=None)
 
 
     def get_vcs_zookeeper_timeout(self):
-        self.parser.read(self.location)
-        return int(self.parser.get('server.vcs', 'zookeeper_timeout', fallback=15))
+        return self.snapshot.get_int('server.vcs', 'zookeeper_timeout', fallback=15)
+
+
+    def get_vcs_leader_election(self):
+        return self.snapshot.get_bool('server.vcs', 'leader_election', fallback=True)
+
+
+    def get_vcs_replica_id(self):
+        return self.snapshot.get('server.vcs', 'replica_id', fallback=None)
 
 
     def get_vcs_polling_interval(self):
-        self.parser.read(self.location)
-        return int(self.parser.get('server.vcs', 'polling_interval', fallback=5))
+        return self.snapshot.get_int('server.vcs', 'polling_interval', fallback=5)
 
 
     def get_vcs_snapshot_freq(self):
-        self.parser.read(self.location)
-        return int(self.parser.get('server.vcs', 'snapshot_freq', fallback=5))
+        return self.snapshot.get_int('server.vcs', 'snapshot_freq', fallback=5)
 
 
     def get_vcs_snapshot_limit(self):
-        self.parser.read(self.location)
-        return int(self.parser.get('server.vcs', 'snapshot_limit', fallback=10))
+        return self.snapshot.get_int('server.vcs', 'snapshot_limit', fallback=10)
+
+
+    def get_vcs_retention_age(self):
+        return self.snapshot.get_int('server.vcs', 'retention_age', fallback=0)
+
+
+    def get_vcs_retention_size(self):
+        return self.snapshot.get_int('server.vcs', 'retention_size', fallback=0)
+
+
+    def get_vcs_compaction_interval(self):
+        return self.snapshot.get_float('server.vcs', 'compaction_interval', fallback=60)
+
+
+    def get_vcs_snapshot_compression(self):
+        return self.snapshot.get('server.vcs', 'snapshot_compression', fallback='none')
 
 
     def get_vcs_init_version(self):
-        self.parser.read(self.location)
-        return int(self.parser.get('server.vcs', 'init_version', fallback=1))
+        return self.snapshot.get_int('server.vcs', 'init_version', fallback=1)
+
+
+    def get_vcs_storage(self):
+        return self.snapshot.get('server.vcs', 'storage', fallback='zookeeper')
+
+
+    def get_vcs_storage_config(self):
+        return self.snapshot.get_json('server.vcs', 'storage_config', fallback={})
+
+
+    def get_vcs_update_mode(self):
+        return self.snapshot.get('server.vcs', 'update_mode', fallback='polling')
+
+
+    def get_vcs_update_debounce(self):
+        return self.snapshot.get_float('server.vcs', 'update_debounce', fallback=0.5)
+
+
+    def get_vcs_update_workers(self):
+        return self.snapshot.get_int('server.vcs', 'update_workers', fallback=4)
+
+
+    def get_vcs_shortcut_mode(self):
+        return self.snapshot.get('server.vcs', 'shortcut_mode', fallback='none')
+
+
+    def get_vcs_shortcut_window(self):
+        return self.snapshot.get_int('server.vcs', 'shortcut_window', fallback=8)
+
+
+    def get_vcs_push_timeout(self):
+        return self.snapshot.get_int('server.vcs', 'push_timeout', fallback=30)
+
+
+    def get_vcs_push_stream_duration(self):
+        return self.snapshot.get_int('server.vcs', 'push_stream_duration', fallback=300)
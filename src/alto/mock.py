@@ -24,7 +24,9 @@
 # Authors:
 # - Jensen Zhang <jingxuan.n.zhang@gmail.com>
 
+import ipaddress
 import json
+import threading
 
 from unittest.mock import MagicMock
 
@@ -44,10 +46,21 @@ class MockGeoIP2(MagicMock):
             self.latitude = location[0]
             self.longitude = location[1]
 
+    class Traits:
+
+        def __init__(self, network) -> None:
+            self.network = network
+
     class GeoInfo:
 
-        def __init__(self, location) -> None:
+        def __init__(self, location, network=None) -> None:
             self.location = MockGeoIP2.Location(location)
+            self.traits = MockGeoIP2.Traits(network)
+
+        @classmethod
+        def from_db(cls, endpoint):
+            network = ipaddress.ip_network('{}/24'.format(endpoint), strict=False)
+            return cls(MOCK_GEOIP2_DB.get(endpoint, (0.0, 0.0)), network)
 
     class Reader:
 
@@ -55,7 +68,10 @@ class MockGeoIP2(MagicMock):
             self.path = path
 
         def city(self, endpoint):
-            return MockGeoIP2.GeoInfo(MOCK_GEOIP2_DB.get(endpoint, (0.0, 0.0)))
+            return MockGeoIP2.GeoInfo.from_db(endpoint)
+
+        def close(self):
+            pass
 
 
     class Client:
@@ -67,7 +83,10 @@ class MockGeoIP2(MagicMock):
             self.kwargs = kwargs
 
         def city(self, endpoint):
-            return MockGeoIP2.GeoInfo(MOCK_GEOIP2_DB.get(endpoint, (0.0, 0.0)))
+            return MockGeoIP2.GeoInfo.from_db(endpoint)
+
+        def close(self):
+            pass
 
 
 mockGeoIP2 = MockGeoIP2()
@@ -79,6 +98,9 @@ class MockKazoo(MagicMock):
 
         def __init__(self, **kwargs):
             self.base = dict()
+            self.locks = dict()
+            self.lock_cond = threading.Condition()
+            self.state_listeners = []
 
         def _parse_path(self, path):
             return path.split('/')[1:]
@@ -92,6 +114,9 @@ class MockKazoo(MagicMock):
         def start(self, **kwargs):
             pass
 
+        def add_listener(self, listener):
+            self.state_listeners.append(listener)
+
         def stop(self, **kwargs):
             pass
 
@@ -117,6 +142,13 @@ class MockKazoo(MagicMock):
             parent = self._get_leaf_node(nodes[:-1])
             parent[nodes[-1]] = data
 
+        def set(self, path, data, **kwargs):
+            nodes = self._parse_path(path)
+            parent = self._get_leaf_node(nodes[:-1])
+            if nodes[-1] not in parent:
+                raise KeyError(path)
+            parent[nodes[-1]] = data
+
         def get_children(self, path, **kwargs):
             nodes = self._parse_path(path)
             parent = self._get_leaf_node(nodes)
@@ -131,6 +163,69 @@ class MockKazoo(MagicMock):
             parent = self._get_leaf_node(nodes[:-1])
             del parent[nodes[-1]]
 
+        def transaction(self):
+            return MockKazoo.TransactionRequest(self)
+
+        def Lock(self, path, identifier=None):
+            return MockKazoo.Lock(self, path, identifier)
+
+    class Lock:
+
+        def __init__(self, client, path, identifier=None):
+            self.client = client
+            self.path = path
+            self.identifier = identifier
+            self.is_acquired = False
+            self.cancelled = False
+
+        def acquire(self, blocking=True, timeout=None, **kwargs):
+            with self.client.lock_cond:
+                self.cancelled = False
+                while True:
+                    holder = self.client.locks.setdefault(self.path, self)
+                    self.is_acquired = holder is self
+                    if self.is_acquired or not blocking:
+                        return self.is_acquired
+                    if self.cancelled:
+                        raise RuntimeError('Lock acquisition cancelled')
+                    if not self.client.lock_cond.wait(timeout) and timeout is not None:
+                        return False
+
+        def cancel(self):
+            with self.client.lock_cond:
+                self.cancelled = True
+                self.client.lock_cond.notify_all()
+
+        def release(self):
+            with self.client.lock_cond:
+                if self.client.locks.get(self.path) is self:
+                    del self.client.locks[self.path]
+                self.is_acquired = False
+                self.client.lock_cond.notify_all()
+            return True
+
+        def contenders(self):
+            holder = self.client.locks.get(self.path)
+            return [holder.identifier] if holder is not None else []
+
+    class TransactionRequest:
+
+        def __init__(self, client):
+            self.client = client
+            self.operations = []
+
+        def create(self, path, value=b'', **kwargs):
+            self.operations.append((self.client.create, path, value))
+
+        def delete(self, path, **kwargs):
+            self.operations.append((self.client.delete, path))
+
+        def commit(self):
+            results = []
+            for op, *args in self.operations:
+                results.append(op(*args))
+            return results
+
 
 mockKazoo = MockKazoo()
 
@@ -27,21 +27,33 @@
 
 import math
 import hashlib
+import heapq
 import ipaddress
 import json
 import random
+import logging
 import time
+from threading import Lock, Thread
 from urllib.parse import urljoin
 
 from alto.config import Config
+from alto.common.codec import get_json_encoder
+from alto.common.error import NotSupportedError
 from alto.common.constants import ALTO_CONTENT_TYPES, ALTO_PARAMETER_TYPES, get_diff_format
 from alto.mock import (TEST_DYNAMIC_NM_1,
                        TEST_DYNAMIC_NM_2,
                        TEST_DYNAMIC_NM_3,
                        TEST_DYNAMIC_NM_4,
                        TEST_DYNAMIC_NM_5)
+from alto.utils import get_algorithm
 
 from .db import data_broker_manager
+from .diff import compose_patches
+
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6378
 
 
 class MockService:
@@ -94,12 +106,41 @@ class MockService:
 class IRDService:
     """
     Backend algorithm for IRD generation.
+
+    The generated directory is cached per `(resource_id, base_uri)` along
+    with its ETag, and regenerated once the configuration is reloaded.
     """
 
-    def __init__(self, namespace, namespaces=None, **kwargs):
+    def __init__(self, namespace, namespaces=None, cache_size=64, **kwargs):
         self.ns = namespace
         self.namespaces = namespaces
         self.config = Config()
+        self.cache_size = cache_size
+        self._cache = dict()
+
+    def get_directory(self, self_resource_id, default_base_uri='https://localhost/'):
+        """
+        Get the directory and its ETag.
+
+        Returns
+        -------
+        directory : dict
+            The IRD response. It is shared by subsequent calls and MUST NOT
+            be modified.
+        etag : str
+            Strong entity tag of the directory.
+        """
+        stamp = self.config.get_version()
+        key = (self_resource_id, default_base_uri)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+        directory = self.list_resources(self_resource_id, default_base_uri=default_base_uri)
+        etag = '"{}"'.format(hashlib.sha1(json.dumps(directory, sort_keys=True).encode()).hexdigest())
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = (stamp, directory, etag)
+        return directory, etag
 
     def list_resources(self, self_resource_id, default_base_uri='https://localhost/'):
         resources = self.config.get_configured_resources()
@@ -140,6 +181,298 @@ class IRDService:
         return directory
 
 
+class MapService:
+    """
+    Base backend algorithm for maps precomputed from the data brokers.
+
+    The map is computed and serialized once per change of the data brokers
+    it depends on, then served as bytes along with its tag. Once built, the
+    map is rebuilt in the background when a data broker commits, and the
+    previous map is served until the new one is ready.
+    """
+
+    db_types = ()
+
+    def __init__(self, namespace, resource_id='', **kwargs):
+        self.ns = namespace
+        self.resource_id = resource_id
+        self.config = Config()
+        self._lock = Lock()
+        self._cache = None
+        self._refresh_lock = Lock()
+        self._refresh_pending = False
+        self._refreshing = False
+
+    def get_stamp(self):
+        """
+        Get the commit generations of the data brokers the map depends on.
+        """
+        generations = data_broker_manager.get_generations(self.ns)
+        return tuple(generations.get(db_type, 0) for db_type in self.db_types)
+
+    def get_cached(self):
+        """
+        Get the map.
+
+        Only the first build runs on the request threads. Afterwards, a stale
+        map is rebuilt in the background, and the previous map is served
+        until the new one is ready.
+        """
+        cache = self._cache
+        if cache is not None:
+            if cache[0] != self.get_stamp():
+                self.refresh()
+            return cache[1]
+        with self._lock:
+            if self._cache is None:
+                stamp = self.get_stamp()
+                self._cache = (stamp, self.build())
+                data_broker_manager.add_listener(self.ns, self.on_commit)
+            return self._cache[1]
+
+    def on_commit(self, namespace, db_type):
+        if db_type in self.db_types:
+            self.refresh()
+
+    def refresh(self):
+        """
+        Rebuild the map in the background.
+
+        Refreshes requested while a rebuild runs are coalesced into a single
+        rebuild after it.
+        """
+        with self._refresh_lock:
+            self._refresh_pending = True
+            if self._refreshing:
+                return
+            self._refreshing = True
+        Thread(target=self.run_refresh, name='refresh-{}'.format(self.resource_id),
+               daemon=True).start()
+
+    def run_refresh(self):
+        while True:
+            with self._refresh_lock:
+                if not self._refresh_pending:
+                    self._refreshing = False
+                    return
+                self._refresh_pending = False
+            try:
+                with self._lock:
+                    stamp = self.get_stamp()
+                    if self._cache[0] != stamp:
+                        self._cache = (stamp, self.build())
+            except Exception:
+                # The stamp stays stale, so that the next commit or request
+                # retries
+                logger.exception('Failed to rebuild the map %s', self.resource_id)
+
+    def build(self):
+        """
+        Override by the map for specific information resource.
+
+        Returns
+        -------
+        content : dict
+            The map.
+        body : bytes
+            The serialized map.
+        tag : str
+            Tag of the map content.
+        """
+        raise NotImplementedError()
+
+    def encode(self, obj):
+        return get_json_encoder(self.config.get_server_json_encoder())(obj)
+
+    def get_map(self):
+        """
+        Get the pre-serialized map.
+
+        Returns
+        -------
+        body : bytes
+            The serialized map. It is shared by subsequent calls.
+        tag : str
+            Tag of the map content.
+        """
+        _, body, tag = self.get_cached()
+        return body, tag
+
+    def lookup(self, *args, **kwargs):
+        """
+        Get the map. It is shared by subsequent calls and MUST NOT be modified.
+        """
+        return self.get_cached()[0]
+
+
+class NetworkMapService(MapService):
+    """
+    Backend algorithm for network map.
+
+    Each prefix of the endpoint database with the `pid_property` belongs to
+    the PID named by the value of the property.
+    """
+
+    db_types = ('endpoint',)
+
+    def __init__(self, namespace, resource_id='', pid_property='pid',
+                 default_pid=None, **kwargs):
+        super().__init__(namespace, resource_id=resource_id, **kwargs)
+        self.pid_property = pid_property
+        self.default_pid = default_pid
+        self.eb = data_broker_manager.get(self.ns, db_type='endpoint')
+
+    def get_network_map(self):
+        self.eb.build_cache()
+        nmap = dict()
+        for prefix, pid in self.eb.scan(self.pid_property):
+            if not isinstance(pid, str):
+                continue
+            family = 'ipv6' if ':' in prefix else 'ipv4'
+            nmap.setdefault(pid, dict()).setdefault(family, list()).append(prefix)
+        if self.default_pid:
+            prefixes = {prefix for pid in nmap.values() for family in pid.values() for prefix in family}
+            for family, prefix in [('ipv4', '0.0.0.0/0'), ('ipv6', '::/0')]:
+                if prefix not in prefixes:
+                    nmap.setdefault(self.default_pid, dict()).setdefault(family, list()).append(prefix)
+        return {pid: {family: sorted(prefixes, key=ipaddress.ip_network)
+                      for family, prefixes in sorted(nmap[pid].items())}
+                for pid in sorted(nmap)}
+
+    def build(self):
+        nmap = self.get_network_map()
+        tag = hashlib.sha1(self.encode(nmap)).hexdigest()
+        content = {
+            'meta': {
+                'vtag': {
+                    'resource-id': self.resource_id,
+                    'tag': tag
+                }
+            },
+            'network-map': nmap
+        }
+        return content, self.encode(content), tag
+
+
+class CostMapService(MapService):
+    """
+    Backend algorithm for cost map.
+
+    The cost between two PIDs of the dependent network map is the lowest
+    cost of the forwarding paths between their prefixes. Supported cost
+    metrics are `hopcount`, the number of forwarding devices on the path,
+    and `routingcost`, which also counts the AS hops after the egress.
+    """
+
+    db_types = ('endpoint', 'forwarding')
+
+    def __init__(self, namespace, resource_id='', network_map='',
+                 cost_metric='hopcount', **kwargs):
+        super().__init__(namespace, resource_id=resource_id, **kwargs)
+        self.network_map = network_map
+        self.cost_metric = cost_metric
+        self.eb = data_broker_manager.get(self.ns, db_type='endpoint')
+        self.fib = data_broker_manager.get(self.ns, db_type='forwarding')
+        self.nm_service = None
+
+    def get_network_map_service(self):
+        """
+        Get the shared backend algorithm of the dependent network map.
+
+        It is resolved from the configured resources on first use only.
+        """
+        if self.nm_service is not None:
+            return self.nm_service
+        resource = self.config.get_configured_resources().get(self.network_map)
+        if not resource or resource.get('type') != 'network-map':
+            raise NotSupportedError('Network map {} is not configured.'.format(self.network_map))
+        params = dict(resource.get('params', dict()))
+        params['resource_id'] = self.network_map
+        self.nm_service = get_algorithm(resource['algorithm'],
+                                        resource.get('namespace', self.ns), params)
+        return self.nm_service
+
+    def get_stamp(self):
+        _, nm_tag = self.get_network_map_service().get_map()
+        return (nm_tag,) + super().get_stamp()
+
+    def walk(self, ingress, dst):
+        """
+        Follow the forwarding path from an ingress to a destination.
+
+        Returns
+        -------
+        hops : int
+            Number of forwarding devices on the path.
+        action : Action or None
+            The action of the last device. None if the ingress is not
+            attached to any forwarding device.
+        """
+        hops, action, visited = 0, None, set()
+        node = ingress
+        while True:
+            ingress_prop = self.eb.lookup(node, ['dpid', 'in_port'])
+            dpid = ingress_prop.get('dpid')
+            if not dpid or dpid in visited:
+                return hops, action
+            visited.add(dpid)
+            action = self.fib.lookup(dpid, dst, in_port=ingress_prop.get('in_port') or '0')
+            hops += 1
+            if not action.next_hop:
+                return hops, action
+            node = action.next_hop
+
+    def get_cost(self, src, dst):
+        hops, action = self.walk(src, dst)
+        if action is None:
+            return None
+        if self.cost_metric == 'hopcount':
+            return hops
+        if self.cost_metric == 'routingcost':
+            as_path = action.actions.get('as_path') or []
+            if isinstance(as_path, str):
+                as_path = as_path.split()
+            return hops + len(as_path)
+        raise NotSupportedError('Cost metric {} is not supported.'.format(self.cost_metric))
+
+    def get_cost_map(self, nmap):
+        self.eb.build_cache()
+        self.fib.build_cache()
+        pid_prefixes = {pid: [prefix for family in sorted(addrs) for prefix in addrs[family]]
+                        for pid, addrs in nmap.items()}
+        cmap = dict()
+        for src_pid, src_prefixes in pid_prefixes.items():
+            costs = dict()
+            for dst_pid, dst_prefixes in pid_prefixes.items():
+                if src_pid == dst_pid:
+                    costs[dst_pid] = 0
+                    continue
+                pair_costs = [self.get_cost(src, dst)
+                              for src in src_prefixes for dst in dst_prefixes]
+                pair_costs = [cost for cost in pair_costs if cost is not None]
+                if pair_costs:
+                    costs[dst_pid] = min(pair_costs)
+            cmap[src_pid] = costs
+        return cmap
+
+    def build(self):
+        nm_content = self.get_network_map_service().lookup()
+        cmap = self.get_cost_map(nm_content['network-map'])
+        dependent_vtag = nm_content['meta']['vtag']
+        content = {
+            'meta': {
+                'dependent-vtags': [dependent_vtag],
+                'cost-type': {
+                    'cost-mode': 'numerical',
+                    'cost-metric': self.cost_metric
+                }
+            },
+            'cost-map': cmap
+        }
+        body = self.encode(content)
+        return content, body, hashlib.sha1(body).hexdigest()
+
+
 class EndpointPropertyService:
     """
     Backend algorithm for EPS.
@@ -164,11 +497,13 @@ class GeoIPPropertyService:
     Backend algorithm for entity property using GeoIP database.
     """
 
-    def __init__(self, namespace, data_source=None, autoreload=True, **kwargs):
+    def __init__(self, namespace, data_source=None, autoreload=True,
+                 lookup_timeout=None, **kwargs):
         self.ns = namespace
         self.autoreload = autoreload
         self.db = data_broker_manager.get(self.ns, db_type='delegate')
         self.data_source = data_source
+        self.lookup_timeout = lookup_timeout
 
     def get_geomap(self, entities):
         eidmap = dict()
@@ -177,8 +512,12 @@ class GeoIPPropertyService:
             if domain not in ['ipv4', 'ipv6']:
                 continue
             eidmap[e] = entityid
-        geomap = self.db.lookup(self.data_source, list(eidmap.values()))
-        return {e: geomap[eid] for e, eid in eidmap.items()}
+        kwargs = dict()
+        if self.lookup_timeout is not None:
+            kwargs['timeout'] = self.lookup_timeout
+        geomap = self.db.lookup(self.data_source, list(eidmap.values()), **kwargs)
+        # Endpoints missing the deadline of the data source are left out
+        return {e: geomap.get(eid) for e, eid in eidmap.items()}
 
     def lookup(self, entities):
         if self.autoreload:
@@ -201,15 +540,54 @@ class GeoDistanceService(GeoIPPropertyService):
     Backend algorithm for geo-distance based endpoint cost service.
     """
 
+    def __init__(self, namespace, data_source=None, autoreload=True,
+                 vectorized=True, **kwargs):
+        super().__init__(namespace, data_source=data_source,
+                         autoreload=autoreload, **kwargs)
+        self.vectorized = vectorized
+
     def get_geo_distance(self, src_loc, dst_loc):
         lat1, lng1 = map(math.radians, src_loc)
         lat2, lng2 = map(math.radians, dst_loc)
         d_lat = lat1 - lat2
         d_lng = lng1 - lng2
-        d_geo = 6378 * 2 * math.asin(math.sqrt(math.sin(d_lat/2)**2 +
-                                               math.cos(lat1)*math.cos(lat2)*math.sin(d_lng/2)**2))
+        d_geo = EARTH_RADIUS * 2 * math.asin(math.sqrt(math.sin(d_lat/2)**2 +
+                                                       math.cos(lat1)*math.cos(lat2)*math.sin(d_lng/2)**2))
         return d_geo
 
+    def get_geo_distance_matrix(self, src_locs, dst_locs):
+        """
+        Compute the geo-distances between all the source and destination
+        locations at once.
+
+        Parameters
+        ----------
+        src_locs : list
+            List of `(lat, lng)` tuples of the sources.
+        dst_locs : list
+            List of `(lat, lng)` tuples of the destinations.
+
+        Returns
+        -------
+        matrix : list or None
+            Row-major list of distances, where `matrix[i][j]` is the distance
+            from `src_locs[i]` to `dst_locs[j]`. If NumPy is not installed,
+            return None.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+        src = np.radians(np.asarray(src_locs, dtype=np.float64).reshape(-1, 2))
+        dst = np.radians(np.asarray(dst_locs, dtype=np.float64).reshape(-1, 2))
+        lat1 = src[:, 0, np.newaxis]
+        lat2 = dst[np.newaxis, :, 0]
+        d_lat = lat1 - lat2
+        d_lng = src[:, 1, np.newaxis] - dst[np.newaxis, :, 1]
+        h = np.sin(d_lat/2)**2 + np.cos(lat1)*np.cos(lat2)*np.sin(d_lng/2)**2
+        d_geo = EARTH_RADIUS * 2 * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+        return d_geo.tolist()
+
     def lookup(self, srcs, dsts, cost_type):
         if self.autoreload:
             self.db.build_cache()
@@ -221,16 +599,20 @@ class GeoDistanceService(GeoIPPropertyService):
         costs = dict()
         endpoints = set(srcs).union(set(dsts))
         geomap = self.get_geomap(endpoints)
-        for s in srcs:
-            src_loc = geomap.get(s)
-            if not src_loc:
-                continue
-            costs[s] = dict()
-            for d in dsts:
-                dst_loc = geomap.get(d)
-                if not dst_loc:
-                    continue
-                costs[s][d] = self.get_geo_distance(src_loc, dst_loc)
+        srcs = [s for s in dict.fromkeys(srcs) if geomap.get(s)]
+        dsts = [d for d in dict.fromkeys(dsts) if geomap.get(d)]
+
+        matrix = None
+        if self.vectorized and srcs and dsts:
+            matrix = self.get_geo_distance_matrix([geomap[s] for s in srcs],
+                                                  [geomap[d] for d in dsts])
+        if matrix is not None:
+            for s, row in zip(srcs, matrix):
+                costs[s] = dict(zip(dsts, row))
+        else:
+            for s in srcs:
+                src_loc = geomap[s]
+                costs[s] = {d: self.get_geo_distance(src_loc, geomap[d]) for d in dsts}
         content['endpoint-cost-map'] = costs
         return content
 
@@ -301,8 +683,9 @@ class PathVectorService:
         """
         Parameters
         ----------
-        flows : list
-            A list of flow objects.
+        flows : iterable
+            Flow objects, consumed lazily. Flows of the same source SHOULD
+            be consecutive.
 
         Returns
         -------
@@ -321,12 +704,13 @@ class PathVectorService:
         ane_dict = dict()
         as_path_dict = dict()
 
+        last_src, is_local = None, False
         for flow in flows:
             ingress, src, dst = self.parse_flow(flow)
-            src_prop = self.eb.lookup(src)
-            if src_prop is None:
-                continue
-            if not src_prop.get('is_local'):
+            if src != last_src:
+                src_prop = self.eb.lookup(src)
+                last_src, is_local = src, src_prop is not None and bool(src_prop.get('is_local'))
+            if not is_local:
                 continue
 
             if src not in paths:
@@ -364,12 +748,19 @@ class TIPSControlService:
     """
 
     def __init__(self, namespace, tips_resource_id='', **kwargs) -> None:
-        from .vcs import vcs_singleton
-
         self.ns = namespace
-        self.vcs = vcs_singleton
         self.tips_resource_id = tips_resource_id
         self.config = Config()
+        self._views = dict()
+        self._views_size = 1024
+
+    @property
+    def vcs(self):
+        # The version control system connects to ZooKeeper, start it on
+        # the first TIPS request only
+        from .vcs import get_vcs
+
+        return get_vcs()
 
     def subscribe(self, post_data, client_id='public'):
         resource_id = post_data.get('resource-id')
@@ -385,7 +776,10 @@ class TIPSControlService:
         # FIXME: the path root '/tips' SHOULD NOT be hardcoded
         tips_view['tips-view-uri'] = '/tips/{}/{}'.format(resource_id, digest)
         tips_view_summary = dict()
-        updates_graph = self.vcs.get_tips_view(resource_id, digest)
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return
+        updates_graph = meta['updates-graph']
         print('Got updates graph of {}/{}'.format(resource_id, digest))
         seqs = set()
         for start_seq in updates_graph:
@@ -398,12 +792,11 @@ class TIPSControlService:
             'end-seq': max(seqs),
             'start-edge-rec': {
                 'seq-i': 0,
-                'seq-j': int(updates_graph['0'][-1])
+                'seq-j': max(int(end_seq) for end_seq in updates_graph['0'])
             }
         }
 
-        # FIXME: get `support-server-push` from capabilities of the IRD entry
-        tips_view_summary['server-push'] = False
+        tips_view_summary['server-push'] = self.get_push_support()
         tips_view['tips-view-summary'] = tips_view_summary
         return tips_view
 
@@ -412,52 +805,204 @@ class TIPSControlService:
 
     def get_tips_view(self, resource_id, digest, ug_only=False, start_seq=None, end_seq=None):
         # TODO: check if the client has already subscribed the resource; if not, return Unauthorized error
-        ug = self.vcs.get_tips_view(resource_id, digest)
-        view = dict()
-        tag = hashlib.sha1(json.dumps(ug, sort_keys=True).encode()).hexdigest()
-        if not ug_only:
-            view['meta'] = {'resource-id': digest, 'tag': tag}
-            # TODO: support server push later
-            view['push-state'] = {'server-push': False, 'next-edge': None}
-        updates_graph = dict()
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return
+        ug = meta['updates-graph']
         if start_seq is not None and end_seq is not None:
             start_seq = str(start_seq)
             end_seq = str(end_seq)
-            edge_view = self.get_tips_edge_view(resource_id, digest, start_seq, end_seq)
+            edge_view = ug.get(start_seq, dict()).get(end_seq)
             if edge_view is None:
                 return
             updates_graph = {start_seq: {end_seq: edge_view}}
         else:
-            for start_seq in ug:
-                updates_graph[start_seq] = dict()
-                for end_seq in ug[start_seq]:
-                    edge_view = self.get_tips_edge_view(resource_id, digest, start_seq, end_seq)
-                    if edge_view is not None:
-                        updates_graph[start_seq][end_seq] = edge_view
-
+            updates_graph = ug
+        if ug_only:
+            return {'updates-graph': updates_graph}
+
+        if updates_graph is ug:
+            cached = self._views.get((resource_id, digest))
+            if cached is not None and cached[0] == meta['tag']:
+                return cached[1]
+        view = dict()
+        view['meta'] = {'resource-id': digest, 'tag': meta['tag']}
+        view['push-state'] = self.get_push_state(ug)
         view['updates-graph'] = updates_graph
-
+        if updates_graph is ug:
+            if len(self._views) >= self._views_size:
+                self._views.clear()
+            self._views[(resource_id, digest)] = (meta['tag'], view)
         return view
 
-    def get_tips_edge_view(self, resource_id, digest, start_seq, end_seq):
-        data = self.vcs.get_tips_data(resource_id, digest, start_seq, end_seq)
-        edge_view = None
-        if data is not None:
-            edge_view = {
-                'media-type': self.get_media_type(resource_id, patch=(start_seq != '0')),
-                'tag': hashlib.sha1(data).hexdigest(),
-                'size': len(data)
-            }
-        return edge_view
+    def get_push_support(self):
+        resource_config = self.get_configured_resources().get(self.tips_resource_id, dict())
+        capabilities = resource_config.get('capabilities', dict())
+        return bool(capabilities.get('support-server-push', False))
 
-    def get_tips_data(self, resource_id, digest, start_seq, end_seq):
-        start_seq = str(start_seq)
-        end_seq = str(end_seq)
-        data = self.vcs.get_tips_data(resource_id, digest, start_seq, end_seq)
-        if data is None:
-            return None, None
-        media_type = self.get_media_type(resource_id, patch=(start_seq != '0'))
-        return json.loads(data), media_type
+    def get_push_state(self, ug):
+        push_state = {'server-push': self.get_push_support(), 'next-edge': None}
+        if push_state['server-push']:
+            versions = [int(end_seq) for end_seqs in ug.values() for end_seq in end_seqs]
+            if versions:
+                push_state['next-edge'] = {'seq-i': max(versions), 'seq-j': max(versions) + 1}
+        return push_state
+
+    def get_next_edge(self, resource_id, digest, seq, timeout=None):
+        """
+        Wait for the next update of a TIPS view after version `seq`.
+
+        Parameters
+        ----------
+        seq : int
+            The latest version known by the client.
+        timeout : float or None
+            Maximum time to wait in seconds.
+
+        Returns
+        -------
+        edge : dict or None
+            The edge to catch up with the latest version, i.e., the patch
+            from `seq` if available or the latest snapshot otherwise. An
+            empty dict if no update before timeout. None if the TIPS view
+            does not exist.
+        """
+        if not self.get_push_support():
+            return None
+        version = self.vcs.wait_for_update(resource_id, digest, seq, timeout=timeout)
+        if version is None:
+            return None
+        if version <= seq:
+            return dict()
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return None
+        ug = meta['updates-graph']
+        start_seq = str(seq)
+        end_seqs = ug.get(start_seq)
+        if not end_seqs or start_seq == '0':
+            start_seq = '0'
+            end_seqs = ug.get(start_seq)
+            if not end_seqs:
+                return dict()
+        end_seq = str(max(int(e) for e in end_seqs))
+        edge_view = end_seqs[end_seq]
+        # FIXME: the path root '/tips' SHOULD NOT be hardcoded
+        edge = {
+            'seq-i': int(start_seq),
+            'seq-j': int(end_seq),
+            'uri': '/tips/{}/{}/ug/{}/{}'.format(resource_id, digest, start_seq, end_seq)
+        }
+        edge.update(edge_view)
+        return edge
+
+    def get_tips_edge(self, resource_id, digest, start_seq, end_seq):
+        """
+        Get the metadata of an edge in the update graph.
+
+        Returns
+        -------
+        edge : dict or None
+            The `media-type`, `tag` and `size` of the edge. None if the edge
+            does not exist.
+        """
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return None
+        return meta['updates-graph'].get(str(start_seq), dict()).get(str(end_seq))
+
+    def get_tips_payload(self, resource_id, digest, start_seq, end_seq):
+        """
+        Get the encoded payload of an edge as stored in the update graph.
+        """
+        return self.vcs.get_tips_data(resource_id, digest, str(start_seq), str(end_seq))
+
+    def get_catchup_edges(self, resource_id, digest, start_seq, end_seq):
+        """
+        Get the cheapest edges to update a client from version `start_seq`
+        to `end_seq`.
+
+        The edges are weighted by the size of their stored payloads. A path
+        of patches is only chosen if it is smaller than the snapshot of
+        `end_seq`, so that catching up never costs more than a snapshot.
+
+        Returns
+        -------
+        edges : list or None
+            `(start_seq, end_seq, edge)` of the edges to compose, where
+            `start_seq` is 0 for the snapshot. None if `end_seq` cannot be
+            reached.
+        """
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return None
+        if end_seq <= start_seq:
+            return None
+        ug = meta['updates-graph']
+        snapshot = ug.get('0', dict()).get(str(end_seq))
+        best = None if snapshot is None else snapshot['size']
+
+        # Dijkstra over the patches, which only move forward
+        dist = {start_seq: 0}
+        prev = dict()
+        heap = [(0, start_seq)]
+        while heap and start_seq > 0:
+            cost, seq = heapq.heappop(heap)
+            if seq == end_seq:
+                break
+            if cost > dist[seq]:
+                continue
+            for next_seq, edge in ug.get(str(seq), dict()).items():
+                next_seq = int(next_seq)
+                next_cost = cost + edge['size']
+                if next_seq > end_seq or (best is not None and next_cost >= best):
+                    continue
+                if next_cost < dist.get(next_seq, math.inf):
+                    dist[next_seq] = next_cost
+                    prev[next_seq] = (seq, edge)
+                    heapq.heappush(heap, (next_cost, next_seq))
+
+        if end_seq in prev:
+            edges = []
+            seq = end_seq
+            while seq != start_seq:
+                prev_seq, edge = prev[seq]
+                edges.append((prev_seq, seq, edge))
+                seq = prev_seq
+            return edges[::-1]
+        if snapshot is not None:
+            return [(0, end_seq, snapshot)]
+        return None
+
+    def get_catchup_payload(self, resource_id, digest, edges):
+        """
+        Compose the payloads of the edges returned by `get_catchup_edges()`.
+
+        Returns
+        -------
+        data : bytes or None
+            The encoded patch or snapshot. None if a payload is missing.
+        edges : list
+            The edges actually composed. Patches which cannot be composed
+            are replaced by the snapshot.
+        """
+        if len(edges) > 1:
+            payloads = []
+            for start_seq, end_seq, _ in edges:
+                data = self.get_tips_payload(resource_id, digest, start_seq, end_seq)
+                if data is None:
+                    return None, edges
+                payloads.append(json.loads(data))
+            patch = compose_patches(payloads, self.get_diff_format(resource_id))
+            if patch is not None:
+                return json.dumps(patch).encode(), edges
+            end_seq = edges[-1][1]
+            edge = self.get_tips_edge(resource_id, digest, 0, end_seq)
+            if edge is None:
+                return None, edges
+            edges = [(0, end_seq, edge)]
+        start_seq, end_seq, _ = edges[0]
+        return self.get_tips_payload(resource_id, digest, start_seq, end_seq), edges
 
     def get_configured_resources(self):
         return self.config.get_configured_resources()
@@ -475,10 +1020,3 @@ class TIPSControlService:
         capability = resource_config.get('capabilities', dict())
         diff_format_dict = capability.get('incremental-change-media-types', dict())
         return diff_format_dict.get(resource_id)
-
-    def get_media_type(self, resource_id, patch=False):
-        resources = self.get_configured_resources()
-        if patch:
-            return self.get_diff_media_type(resource_id, resources=resources)
-        resource_config = resources.get(resource_id)
-        return ALTO_CONTENT_TYPES.get(resource_config['type'])
@@ -3,6 +3,7 @@ import importlib
 import json
 import uuid
 import ipaddress
+from threading import RLock
 
 from pytricia import PyTricia
 
@@ -10,12 +11,22 @@ from alto.common.error import NotSupportedError
 from alto.utils import load_class
 
 
+def get_config_hash(config):
+    """
+    Compute a stable hash of a JSON-serializable configuration.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(config, sort_keys=True).encode())
+    return h.hexdigest()
+
+
 class DataBrokerManager(object):
     """
     Data broker manager singleton.
     """
 
     pool = dict()
+    listeners = dict()
 
     def __new__(cls):
         if not hasattr(cls, 'instance'):
@@ -41,6 +52,8 @@ class DataBrokerManager(object):
             self.pool[namespace] = dict()
         # if db_type not in self.pool[namespace]:
         self.pool[namespace][db_type] = db
+        if self.listeners.get(namespace):
+            db.watch()
 
     def get(self, namespace, db_type):
         """
@@ -61,6 +74,45 @@ class DataBrokerManager(object):
         """
         return self.pool.get(namespace, dict()).get(db_type)
 
+    def get_generations(self, namespace):
+        """
+        Get the commit generations of all the data brokers in a namespace.
+
+        Returns
+        -------
+        generations : dict
+            Mapping from data broker types to their commit generations.
+        """
+        return {db_type: db.get_generation()
+                for db_type, db in self.pool.get(namespace, dict()).items()}
+
+    def add_listener(self, namespace, callback):
+        """
+        Register a callback invoked whenever a transaction is committed to a
+        data broker in the namespace.
+
+        Parameters
+        ----------
+        namespace : str
+            Namespace of the data brokers.
+        callback : callable
+            Called with `(namespace, db_type)`. It runs in the committing
+            thread or in the notification thread of the backend, so it MUST
+            return quickly.
+        """
+        self.listeners.setdefault(namespace, list()).append(callback)
+        for db in self.pool.get(namespace, dict()).values():
+            db.watch()
+
+    def remove_listener(self, namespace, callback):
+        callbacks = self.listeners.get(namespace, list())
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def notify(self, namespace, db_type):
+        for callback in list(self.listeners.get(namespace, list())):
+            callback(namespace, db_type)
+
 
 data_broker_manager = DataBrokerManager()
 
@@ -109,8 +161,12 @@ class LocalPipe:
     def set(self, key, val):
         self._base[key] = val
 
-    def delete(self, key):
-        del self._base[key]
+    def delete(self, *keys):
+        for key in keys:
+            del self._base[key]
+
+    def incr(self, key, amount=1):
+        self._base[key] = int(self._base.get(key) or 0) + amount
 
     def execute(self):
         self.db._base = self._base
@@ -140,8 +196,40 @@ class DataBroker:
             self._backend = redis.Redis(**kwargs)
         else:
             raise NotSupportedError()
+        self._watcher = None
         data_broker_manager.register(self.ns, self.type, self)
 
+    @property
+    def generation_key(self):
+        """
+        Key of the counter increased by every committed transaction. It is
+        also the pub/sub channel announcing the commits in Redis.
+        """
+        return '{}:generation:{}'.format(self.ns, self.type)
+
+    def get_generation(self):
+        """
+        Get the number of transactions committed to this data broker.
+        """
+        generation = self._backend.get(self.generation_key)
+        return int(generation) if generation else 0
+
+    def watch(self):
+        """
+        Start watching commits from other processes.
+
+        Commits to a local backend are only visible in this process, and
+        are notified by the transaction itself.
+        """
+        if self.backend != 'redis' or self._watcher is not None:
+            return
+        pubsub = self._backend.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.generation_key: lambda message: self.notify()})
+        self._watcher = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def notify(self):
+        data_broker_manager.notify(self.ns, self.type)
+
     def _lookup(self, key):
         """
         Lookup value by key.
@@ -365,8 +453,16 @@ class Transaction:
     def commit(self):
         """
         Commit this transaction to the backend database.
+
+        The commit increases the generation of the data broker and notifies
+        the listeners registered to the data broker manager.
         """
+        self._pipe.incr(self.db.generation_key)
+        if self.db.backend == 'redis':
+            self._pipe.publish(self.db.generation_key, self.db.type)
         self._pipe.execute()
+        if self.db.backend == 'local':
+            self.db.notify()
 
 
 class ForwardingTransaction(Transaction):
@@ -403,7 +499,7 @@ class ForwardingTransaction(Transaction):
         self._pipe.set(full_key, rule.to_json())
 
     def commit(self):
-        self._pipe.execute()
+        super().commit()
 
 
 class EndpointDB(DataBroker):
@@ -469,6 +565,29 @@ class EndpointDB(DataBroker):
                     properties[prop_name] = prop_dict.get('val')
         return properties
 
+    def scan(self, prop_name):
+        """
+        Iterate over all the endpoints associated with a property.
+
+        Parameters
+        ----------
+        prop_name : str
+            Name of the property.
+
+        Returns
+        -------
+        iterator
+            Pairs of `(prefix, value)`.
+        """
+        prop_trie = self._base.get(prop_name)
+        if not prop_trie:
+            return
+        for prefix in list(prop_trie):
+            hash_key = prop_trie.get(prefix)
+            prop_json = self._lookup(hash_key) if hash_key else None
+            if prop_json:
+                yield prefix, json.loads(prop_json).get('val')
+
     def new_transaction(self):
         return EndpointTransaction(self)
 
@@ -511,17 +630,26 @@ class EndpointTransaction(Transaction):
             self._pipe.set(full_key, json.dumps(prop_obj, sort_keys=True))
 
     def commit(self):
-        self._pipe.execute()
+        super().commit()
 
 
 class DelegateDB(DataBroker):
     """
     Class of the data broker maintaining delegate data sources.
+
+    Delegated data source instances are long-lived: an instance is created on
+    the first lookup and reused until `build_cache` observes a change or the
+    removal of its configuration. A replaced instance is only closed once the
+    lookups still using it are finished.
     """
 
     def __init__(self, namespace='default', backend='redis', **kwargs):
         self.type = 'delegate'
         self._base = dict()
+        self._instances = dict()
+        self._instance_lock = RLock()
+        self._refs = dict()
+        self._retired = list()
         super().__init__(namespace=namespace, backend=backend, **kwargs)
 
     def build_cache(self):
@@ -540,8 +668,85 @@ class DelegateDB(DataBroker):
             data_source_config = json.loads(data_source_json)
 
             _base[data_source_name] = data_source_config
-        for data_source_name in _base.keys():
-            self._base[data_source_name] = _base[data_source_name]
+        with self._instance_lock:
+            self._base = _base
+            for data_source_name, instance in list(self._instances.items()):
+                data_source_config = _base.get(data_source_name)
+                if data_source_config is None or instance[0] != get_config_hash(data_source_config):
+                    self._retire_data_source(data_source_name)
+            released = self._drain_retired()
+        self._close_data_sources(released)
+
+    def get_data_source(self, data_source_name):
+        """
+        Get the instance of a delegated data source.
+
+        The instance may be closed by a later `build_cache`, use `lookup` to
+        query it concurrently.
+
+        Parameters
+        ----------
+        data_source_name : str
+            The name of a delegated data source.
+
+        Returns
+        -------
+        data_source : Any
+            The data source instance, or None if it cannot be loaded.
+        """
+        instance = self._instances.get(data_source_name)
+        if instance:
+            return instance[1]
+        with self._instance_lock:
+            instance = self._instances.get(data_source_name)
+            if instance:
+                return instance[1]
+            data_source_config = self._base.get(data_source_name)
+            if data_source_config is None:
+                return
+            config_hash = get_config_hash(data_source_config)
+            data_source_config = dict(data_source_config)
+            data_source_cls = data_source_config.pop('data_source_cls')
+            try:
+                cls = load_class(data_source_cls)
+            except Exception as e:
+                print(e)
+                return
+            data_source = cls(**data_source_config)
+            self._instances[data_source_name] = (config_hash, data_source)
+            return data_source
+
+    def _acquire_data_source(self, data_source_name):
+        with self._instance_lock:
+            data_source = self.get_data_source(data_source_name)
+            if data_source is not None:
+                self._refs[id(data_source)] = self._refs.get(id(data_source), 0) + 1
+            return data_source
+
+    def _release_data_source(self, data_source):
+        with self._instance_lock:
+            refs = self._refs.pop(id(data_source)) - 1
+            if refs > 0:
+                self._refs[id(data_source)] = refs
+            released = self._drain_retired()
+        self._close_data_sources(released)
+
+    def _retire_data_source(self, data_source_name):
+        _, data_source = self._instances.pop(data_source_name)
+        self._retired.append(data_source)
+
+    def _drain_retired(self):
+        released = [data_source for data_source in self._retired
+                    if id(data_source) not in self._refs]
+        self._retired = [data_source for data_source in self._retired
+                         if id(data_source) in self._refs]
+        return released
+
+    def _close_data_sources(self, data_sources):
+        for data_source in data_sources:
+            close = getattr(data_source, 'close', None)
+            if callable(close):
+                close()
 
     def lookup(self, data_source_name, *args, **kwargs):
         """
@@ -561,17 +766,13 @@ class DelegateDB(DataBroker):
         data : Any
             Response of the data source query.
         """
-        # data_source_config_json = self._lookup('{}:{}'.format(self.type, data_source_name))
-        # data_source_config = json.loads(data_source_config_json)
-        data_source_config = self._base.get(data_source_name)
-        data_source_cls = data_source_config.pop('data_source_cls')
-        try:
-            cls = load_class(data_source_cls)
-        except Exception as e:
-            print(e)
+        data_source = self._acquire_data_source(data_source_name)
+        if data_source is None:
             return
-        data_source = cls(**data_source_config)
-        return data_source.lookup(*args, **kwargs)
+        try:
+            return data_source.lookup(*args, **kwargs)
+        finally:
+            self._release_data_source(data_source)
 
     def new_transaction(self):
         return DelegateTransaction(self)
@@ -599,7 +800,7 @@ class DelegateTransaction(Transaction):
         if self.db.backend == 'redis':
             keys = list(self.db._backend.scan_iter(match='{}:{}:{}:*'.format(self.db.ns, self.db.type, data_source_name)))
         elif self.db.backend == 'local':
-            keys = list(self.db._backend.scan_iter(match='{}:{}:{}:'.format(self.db.ns, self.db.type, data_source_name)))
+            keys = list(self.db._backend.scan_iter(prefix='{}:{}:{}:'.format(self.db.ns, self.db.type, data_source_name)))
         else:
             raise NotImplementedError()
         if len(keys) > 0:
@@ -609,4 +810,4 @@ class DelegateTransaction(Transaction):
         self._pipe.set(full_key, json.dumps(data_source_config, sort_keys=True))
 
     def commit(self):
-        self._pipe.execute()
+        super().commit()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Structural diff of ALTO information resources.
+
+ALTO maps are shallow trees of JSON objects: rows keyed by PIDs or
+endpoints, each holding a list of prefixes (network map), an object of
+costs (cost map, endpoint cost map) or an object of properties. The diffs
+below walk the objects row by row, skip unchanged rows with a single
+comparison, and replace arrays as a whole instead of diffing their items.
+"""
+
+from alto.common.constants import Diff
+
+
+_MISSING = object()
+
+
+def escape_pointer(key):
+    """
+    Escape an object key as a JSON Pointer reference token (RFC 6901).
+    """
+    return key.replace('~', '~0').replace('/', '~1')
+
+
+def create_merge_patch(old, new):
+    """
+    Create a JSON Merge Patch (RFC 7396) from `old` to `new`.
+
+    Returns
+    -------
+    patch : dict or object
+        An empty dict if `old` and `new` are equal.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    patch = dict()
+    added = 0
+    for key, value in new.items():
+        old_value = old.get(key, _MISSING)
+        if old_value is value:
+            continue
+        if old_value is _MISSING:
+            patch[key] = value
+            added += 1
+        elif old_value != value:
+            if isinstance(value, dict) and isinstance(old_value, dict):
+                patch[key] = create_merge_patch(old_value, value)
+            else:
+                patch[key] = value
+    # Only look for removed keys if some are missing in `new`
+    if len(old) > len(new) - added:
+        for key in old:
+            if key not in new:
+                patch[key] = None
+    return patch
+
+
+def create_json_patch(old, new, path=''):
+    """
+    Create a JSON Patch (RFC 6902) from `old` to `new`.
+
+    Only `add`, `remove` and `replace` operations are generated.
+
+    Returns
+    -------
+    patch : list
+        An empty list if `old` and `new` are equal.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        if old == new:
+            return []
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    patch = []
+    for key in old:
+        if key not in new:
+            key_path = '{}/{}'.format(path, escape_pointer(key))
+            patch.append({'op': 'remove', 'path': key_path})
+    for key, value in new.items():
+        old_value = old.get(key, _MISSING)
+        if old_value is value:
+            continue
+        key_path = '{}/{}'.format(path, escape_pointer(key))
+        if old_value is _MISSING:
+            patch.append({'op': 'add', 'path': key_path, 'value': value})
+        elif old_value != value:
+            patch.extend(create_json_patch(old_value, value, key_path))
+    return patch
+
+
+def compose_merge_patches(first, second):
+    """
+    Compose two JSON Merge Patches into one, applying `first` then `second`.
+
+    Returns
+    -------
+    patch : dict or object
+        The composed patch, or `_MISSING` if it cannot be expressed as a
+        merge patch, i.e., `second` patches a member that `first` replaced
+        by a non-object or removed.
+    """
+    if not isinstance(second, dict):
+        return second
+    if not isinstance(first, dict):
+        return _MISSING
+    result = dict(first)
+    for key, value in second.items():
+        old_value = result.get(key, _MISSING)
+        if old_value is _MISSING or not isinstance(value, dict):
+            result[key] = value
+        elif isinstance(old_value, dict):
+            composed = compose_merge_patches(old_value, value)
+            if composed is _MISSING:
+                return _MISSING
+            result[key] = composed
+        else:
+            # The member must be replaced by a new object, which a merge
+            # patch would merge into the old one instead
+            return _MISSING
+    return result
+
+
+def compose_patches(patches, diff_format: Diff = Diff.JSON_MERGE_PATCH):
+    """
+    Compose consecutive patches of the given format into one.
+
+    Returns
+    -------
+    patch : object or None
+        None if the patches cannot be composed.
+    """
+    if diff_format == Diff.JSON_PATCH:
+        return [op for patch in patches for op in patch]
+    elif diff_format == Diff.JSON_MERGE_PATCH:
+        composed = dict()
+        for patch in patches:
+            composed = compose_merge_patches(composed, patch)
+            if composed is _MISSING:
+                return None
+        return composed
+    return patches[-1] if patches else None
+
+
+def create_patch(old, new, diff_format: Diff = Diff.JSON_MERGE_PATCH):
+    """
+    Create a patch from `old` to `new` in the given format.
+    """
+    if diff_format == Diff.JSON_PATCH:
+        return create_json_patch(old, new)
+    elif diff_format == Diff.JSON_MERGE_PATCH:
+        return create_merge_patch(old, new)
+    return new
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+
+import gzip
+import os
+import shutil
+import tempfile
+
+from alto.common.error import NotSupportedError
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def compress_payload(data, compression=None):
+    """
+    Compress a payload with `gzip` or `zstd`. Payloads are returned as they
+    are if `compression` is None or `none`.
+    """
+    if compression == 'gzip':
+        return gzip.compress(data)
+    elif compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    elif compression in [None, 'none']:
+        return data
+    raise NotSupportedError("Unsupported compression '{}'".format(compression))
+
+
+def decompress_payload(data):
+    """
+    Decompress a payload if it starts with a gzip or zstd magic number. JSON
+    payloads never do.
+    """
+    if data is None:
+        return None
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    elif data[:4] == ZSTD_MAGIC:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class UpdateGraphStore:
+    """
+    Base class of the storage backend of update graph payloads.
+
+    The structure of an update graph is kept in ZooKeeper as znodes
+    `/alto/<resource-id>/<digest>/ug/<i>/<j>`. The store holds the snapshot
+    and patch payloads of the edges, keyed by the znode path.
+
+    If `inline` is True, the payloads are stored in the znodes themselves.
+    If `shared` is False, the payloads are only visible to this replica.
+    """
+
+    inline = False
+    shared = True
+
+    def put(self, path, data):
+        """
+        Store the payload of an edge.
+
+        Parameters
+        ----------
+        path : str
+            Znode path of the edge.
+        data : bytes
+            Payload of the edge.
+        """
+        raise NotImplementedError()
+
+    def get(self, path):
+        """
+        Get the payload of an edge, or None if it does not exist.
+        """
+        raise NotImplementedError()
+
+    def delete(self, path, recursive=False):
+        """
+        Delete the payload of an edge, or all the payloads under a path if
+        `recursive` is True.
+        """
+        raise NotImplementedError()
+
+    def delete_many(self, paths):
+        """
+        Delete the payloads of multiple edges.
+        """
+        for path in paths:
+            self.delete(path)
+
+    def close(self):
+        pass
+
+
+class ZookeeperStore(UpdateGraphStore):
+    """
+    Store the payloads in the znodes of the update graph.
+
+    Payloads are limited by the znode size (1 MB by default).
+    """
+
+    inline = True
+
+    def __init__(self, zk):
+        self.zk = zk
+
+    def put(self, path, data):
+        pass
+
+    def get(self, path):
+        try:
+            data, stat = self.zk.get(path)
+        except Exception:
+            return None
+        return data
+
+    def delete(self, path, recursive=False):
+        pass
+
+    def delete_many(self, paths):
+        pass
+
+
+class FilesystemStore(UpdateGraphStore):
+    """
+    Store the payloads as files under a local directory.
+
+    Payloads are written to a temporary file first and atomically renamed,
+    so readers never see a partial payload.
+
+    Parameters
+    ----------
+    root : str
+        Directory holding the payload files.
+    shared : bool
+        Whether the directory is shared by all the replicas, e.g., mounted
+        from a network file system.
+    """
+
+    def __init__(self, root='/var/lib/alto/ug', shared=False):
+        self.root = root
+        self.shared = shared
+        os.makedirs(self.root, exist_ok=True)
+
+    def _get_file_path(self, path):
+        return os.path.join(self.root, path.strip('/'))
+
+    def put(self, path, data):
+        file_path = self._get_file_path(path)
+        dir_path = os.path.dirname(file_path)
+        os.makedirs(dir_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, path):
+        try:
+            with open(self._get_file_path(path), 'rb') as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def delete(self, path, recursive=False):
+        file_path = self._get_file_path(path)
+        if recursive and os.path.isdir(file_path):
+            shutil.rmtree(file_path, ignore_errors=True)
+            return
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisStore(UpdateGraphStore):
+    """
+    Store the payloads in Redis.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix of the Redis keys.
+    kwargs : dict
+        Arguments to create the Redis client.
+    """
+
+    def __init__(self, prefix='alto:ug', **kwargs):
+        import redis
+        self.prefix = prefix
+        self._backend = redis.Redis(**kwargs)
+
+    def _get_key(self, path):
+        return '{}:{}'.format(self.prefix, path.strip('/'))
+
+    def put(self, path, data):
+        self._backend.set(self._get_key(path), data)
+
+    def get(self, path):
+        return self._backend.get(self._get_key(path))
+
+    def delete(self, path, recursive=False):
+        key = self._get_key(path)
+        keys = [key]
+        if recursive:
+            keys += list(self._backend.scan_iter(match='{}/*'.format(key)))
+        self._backend.delete(*keys)
+
+    def delete_many(self, paths):
+        if paths:
+            self._backend.delete(*[self._get_key(path) for path in paths])
+
+    def close(self):
+        self._backend.close()
+
+
+def get_update_graph_store(backend, zk=None, **kwargs):
+    """
+    Create the storage backend of update graph payloads.
+
+    Parameters
+    ----------
+    backend : str
+        Storage backend. Currently supported backends:
+            - zookeeper
+            - filesystem
+            - redis
+    zk : KazooClient
+        ZooKeeper client of the version control system.
+    kwargs : dict
+        Arguments of the storage backend.
+    """
+    if backend == 'zookeeper':
+        return ZookeeperStore(zk)
+    elif backend == 'filesystem':
+        return FilesystemStore(**kwargs)
+    elif backend == 'redis':
+        return RedisStore(**kwargs)
+    raise NotSupportedError("Unsupported update graph storage '{}'".format(backend))
@@ -26,36 +26,85 @@
 
 import hashlib
 import json
+import os
+import socket
 import time
-from threading import Event, Thread
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Event, Lock, RLock, Thread
 from urllib.parse import urljoin
 
-import json_merge_patch
-import jsonpatch
 import requests
-from kazoo.client import KazooClient
 
 from alto.config import Config
-from alto.common.constants import ALTO_PARAMETER_TYPES, Diff
+from alto.common.error import NotSupportedError
+from alto.common.constants import (ALTO_CONTENT_TYPES,
+                                   ALTO_PARAMETER_TYPES,
+                                   DIFF_MEDIA_TYPES,
+                                   Diff)
+from alto.server.components.db import data_broker_manager
+from alto.server.components.diff import create_patch
+from alto.server.components.storage import (compress_payload,
+                                            decompress_payload,
+                                            get_update_graph_store)
+from alto.utils import get_algorithm
 
 
 class VersionControl:
     """
     Version control system for ALTO information resources.
+
+    The update graphs are shared by all the server replicas through
+    ZooKeeper. With `leader_election`, each view is generated by a single
+    replica, holding the `leader` lock of the view, while the other replicas
+    serve it from the shared store and take over once the leader goes away.
+
+    Constructing the version control system connects to ZooKeeper, which
+    blocks until the connection is established. Use `get_vcs()` to start it
+    on first use.
     """
 
     def __init__(self) -> None:
+        # The singleton is only initialized once
+        if getattr(self, 'initialized', False):
+            return
+        from kazoo.client import KazooClient
+
         self.config = Config()
         self.zk_host = self.config.get_vcs_zookeeper_host()
         self.zk_timeout = self.config.get_vcs_zookeeper_timeout()
+        self.leader_election = self.config.get_vcs_leader_election()
+        self.replica_id = (self.config.get_vcs_replica_id()
+                           or '{}:{}'.format(socket.gethostname(), os.getpid()))
         self.polling_interval = self.config.get_vcs_polling_interval()
         self.snapshot_freq = self.config.get_vcs_snapshot_freq()
         self.snapshot_limit = self.config.get_vcs_snapshot_limit()
+        self.retention_age = self.config.get_vcs_retention_age()
+        self.retention_size = self.config.get_vcs_retention_size()
+        self.compaction_interval = self.config.get_vcs_compaction_interval()
+        self.snapshot_compression = self.config.get_vcs_snapshot_compression()
         self.init_version = self.config.get_vcs_init_version()
+        self.update_mode = self.config.get_vcs_update_mode()
+        self.update_debounce = self.config.get_vcs_update_debounce()
+        self.shortcut_mode = self.config.get_vcs_shortcut_mode()
+        self.shortcut_window = self.config.get_vcs_shortcut_window()
         self.zk = KazooClient(hosts=self.zk_host)
+        self.zk.add_listener(self.on_zk_state)
         self.zk.start(timeout=self.zk_timeout)
         self.zk.ensure_path('/alto')
+        self.store = get_update_graph_store(self.config.get_vcs_storage(), zk=self.zk,
+                                            **self.config.get_vcs_storage_config())
+        if self.leader_election and not self.store.shared:
+            # Followers serve the payloads written by the leaders
+            self.store.close()
+            self.zk.stop()
+            raise NotSupportedError('Leader election requires a storage shared by all the replicas')
         self.subscribers = dict()
+        self.meta_cache = dict()
+        self.meta_cache_size = 1024
+        self.scheduler = ListenerScheduler(max_workers=self.config.get_vcs_update_workers(),
+                                           compaction_interval=self.compaction_interval)
+        self.initialized = True
 
 
     def __new__(cls):
@@ -65,18 +114,33 @@ class VersionControl:
 
     
     def __del__(self):
-        self.stop()
+        if getattr(self, 'initialized', False):
+            self.stop()
 
     
+    def on_zk_state(self, state):
+        """
+        Give up the leaderships once the ZooKeeper session is lost, as the
+        locks are released with the session.
+        """
+        if state == 'LOST':
+            for listener in list(self.subscribers.values()):
+                listener.demote()
+
+
     def stop(self):
         """
         Stop the version control system.
+
+        The next `get_vcs()` starts a new one.
         """
-        for listener in self.subscribers.values():
-            listener.stop()
-            listener.join()
+        with _vcs_lock:
+            if getattr(VersionControl, 'instance', None) is self:
+                del VersionControl.instance
+        self.scheduler.stop()
         self.subscribers.clear()
         self.zk.stop()
+        self.store.close()
 
 
     def subscribe(self, resource_id, request_body=None, client_id='public',
@@ -123,27 +187,73 @@ class VersionControl:
         print('Existing the resource listeners: {}'.format(self.subscribers))
         if (resource_id, digest) not in self.subscribers:
             print('Creating the resource listener (path={}) ...'.format(path))
-            resource_listener = ResourceListener(self, path, resource_id, resource,
-                                                 request_body=request_body,
-                                                 polling_interval=self.polling_interval,
-                                                 snapshot_freq=self.snapshot_freq,
-                                                 snapshot_limit=self.snapshot_limit,
-                                                 init_ver=self.init_version,
-                                                 diff_format=diff_format)
-            print('Created the resource listener (path={}, success={})'.format(path, resource_listener.success))
-            if not resource_listener.success:
+            # Listeners of the same resource and input share the fetched
+            # versions, only the diff formats differ
+            group = self.scheduler.get_group(get_group_key(resource_id, request_body))
+            if group is None:
+                resource_listener = self.create_listener(path, resource_id, digest, resource,
+                                                         request_body, diff_format)
+            else:
+                with group.lock:
+                    resource_listener = self.create_listener(path, resource_id, digest,
+                                                             resource, request_body,
+                                                             diff_format, group=group)
+            if resource_listener is None:
                 return None
-            self.subscribers[(resource_id, digest)] = resource_listener
-            resource_listener.start()
             print('The resource listener (path={}) started'.format(path))
 
         return digest
 
 
+    def create_listener(self, path, resource_id, digest, resource, request_body,
+                        diff_format, group=None):
+        """
+        Create and start the resource listener of a view.
+
+        The lock of the listener `group` MUST be held, so that the listener
+        starts from the latest version of the group.
+
+        Returns
+        -------
+        listener : ResourceListener or None
+            None if the listener failed to start.
+        """
+        init_ver, init_res = self.init_version, None
+        if group is not None and group.last_res is not None:
+            init_ver, init_res = group.version, group.last_res
+        resource_listener = ResourceListener(self, path, resource_id, resource,
+                                             request_body=request_body,
+                                             polling_interval=self.polling_interval,
+                                             snapshot_freq=self.snapshot_freq,
+                                             snapshot_limit=self.snapshot_limit,
+                                             retention_age=self.retention_age,
+                                             retention_size=self.retention_size,
+                                             init_ver=init_ver,
+                                             init_res=init_res,
+                                             diff_format=diff_format,
+                                             update_mode=self.update_mode,
+                                             update_debounce=self.update_debounce,
+                                             shortcut_mode=self.shortcut_mode,
+                                             shortcut_window=self.shortcut_window)
+        print('Created the resource listener (path={}, success={})'.format(path, resource_listener.success))
+        if not resource_listener.success:
+            return None
+        if group is not None and resource_listener.leader:
+            # A resumed update graph may be ahead of the group
+            group.version = max(group.version, resource_listener.last_ver)
+        self.subscribers[(resource_id, digest)] = resource_listener
+        self.scheduler.add(resource_listener)
+        return resource_listener
+
+
     def unsubscribe(self, resource_id, digest, client_id='public'):
         """
         Unsubscribe an update listener of an ALTO information resource.
 
+        Once the last client has unsubscribed, the listener of this process
+        is removed. The view itself is removed by its leader, which may run
+        in another replica and finds out on its next update.
+
         Parameters
         ----------
         resource_id : str
@@ -159,11 +269,11 @@ class VersionControl:
             # if all the clients have unsubscribed the resource, remove listener
             active_subscribers = self.zk.get_children(path_subscriber)
             if not active_subscribers:
-                listener = self.subscribers[(resource_id, digest)]
-                listener.stop()
-                listener.join()
-                self.zk.delete('/alto/{}/{}'.format(resource_id, digest), recursive=True)
-                del self.subscribers[(resource_id, digest)]
+                listener = self.subscribers.get((resource_id, digest))
+                if listener is not None:
+                    self.remove_listener(listener)
+                elif not self.has_leader(path):
+                    self.delete_ug_node(path, recursive=True)
         except Exception:
             import traceback
             print(traceback.format_exc())
@@ -172,6 +282,32 @@ class VersionControl:
         return True
 
 
+    def has_leader(self, path):
+        """
+        Check whether a replica is generating the view.
+        """
+        if not self.leader_election:
+            return False
+        return bool(self.zk.Lock('{}/leader'.format(path)).contenders())
+
+
+    def remove_listener(self, listener):
+        """
+        Remove a listener of this process, along with its view if it is the
+        leader.
+        """
+        leader = listener.leader
+        self.scheduler.remove(listener)
+        key = (listener.resource_id, listener.path.rsplit('/', 1)[-1])
+        if self.subscribers.get(key) is listener:
+            del self.subscribers[key]
+        if leader:
+            try:
+                self.delete_ug_node(listener.path, recursive=True)
+            except Exception as e:
+                print('Failed to delete {}: {}'.format(listener.path, e))
+
+
     def get_tips_view(self, resource_id, digest):
         """
         Get available update graph.
@@ -184,6 +320,92 @@ class VersionControl:
         return ug
 
 
+    def get_latest_version(self, resource_id, digest):
+        """
+        Get the latest version in an update graph, or None if the update
+        graph does not exist.
+        """
+        meta = self.get_tips_meta(resource_id, digest)
+        if meta is None:
+            return None
+        ug = meta['updates-graph']
+        versions = [int(end_seq) for end_seqs in ug.values() for end_seq in end_seqs]
+        return max(versions) if versions else None
+
+
+    def get_tips_meta(self, resource_id, digest):
+        """
+        Get the metadata of an update graph without reading any payload.
+
+        Returns
+        -------
+        meta : dict or None
+            - tag: hash of the update graph metadata
+            - updates-graph: `{start_seq: {end_seq: edge}}`, where each edge
+              has its `media-type`, `tag` and `size`.
+
+            The metadata MUST be treated as read-only. None if the update
+            graph does not exist.
+        """
+        listener = self.subscribers.get((resource_id, digest))
+        if listener is not None and listener.leader:
+            return listener.meta
+
+        # The update graph is generated by another replica, read the
+        # published metadata
+        try:
+            data, stat = self.zk.get('/alto/{}/{}/meta'.format(resource_id, digest))
+        except Exception:
+            return None
+        cached = self.meta_cache.get((resource_id, digest))
+        if cached is not None and cached[0] == data:
+            return cached[1]
+        meta = json.loads(data)
+        if len(self.meta_cache) >= self.meta_cache_size:
+            self.meta_cache.clear()
+        self.meta_cache[(resource_id, digest)] = (data, meta)
+        return meta
+
+
+    def wait_for_update(self, resource_id, digest, seq, timeout=None):
+        """
+        Wait until the update graph has a version newer than `seq`.
+
+        Parameters
+        ----------
+        resource_id : str
+            Resource ID of the subscribed information resource
+        digest : str
+            The digest token of a subscribed update listener.
+        seq : int
+            The latest version known by the client.
+        timeout : float or None
+            Maximum time to wait in seconds.
+
+        Returns
+        -------
+        version : int or None
+            The latest version, which is not newer than `seq` if timed out.
+            None if the update graph does not exist.
+        """
+        listener = self.subscribers.get((resource_id, digest))
+        if listener is not None and listener.leader:
+            return listener.wait_for_version(seq, timeout=timeout)
+
+        # The update graph is generated by another replica, watch it instead
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            version = self.get_latest_version(resource_id, digest)
+            if version is None or version > seq:
+                return version
+            if deadline is not None and time.time() >= deadline:
+                return version
+            wait = self.polling_interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+            time.sleep(max(wait, 0))
+
+
     def show_tips_view(self, resource_id, digest):
         ug = self.get_tips_view(resource_id, digest)
         ug_path = '/alto/{}/{}/ug'.format(resource_id, digest)
@@ -200,14 +422,133 @@ class VersionControl:
         """
         Get update data from start_seq to end_seq in an update graph.
         """
+        data = self.store.get('/alto/{}/{}/ug/{}/{}'.format(resource_id, digest, start_seq, end_seq))
+        return decompress_payload(data)
+
+
+    def create_ug_node(self, path, data, compression=None):
+        """
+        Add an edge to an update graph.
+
+        The payload is written to the update graph store before the znode is
+        created, so an edge is never visible without its payload.
+
+        Parameters
+        ----------
+        path : str
+            Znode path of the edge.
+        data : bytes
+            Payload of the edge.
+        compression : str or None
+            Compress the stored payload with `gzip` or `zstd`.
+        """
+        data = compress_payload(data, compression)
+        if self.store.inline:
+            self.zk.create(path, data)
+        else:
+            self.store.put(path, data)
+            self.zk.create(path, b'')
+
+
+    def delete_ug_node(self, path, recursive=False):
+        """
+        Remove an edge, or a subtree if `recursive` is True, from an update
+        graph along with the payloads.
+        """
+        self.zk.delete(path, recursive=recursive)
+        self.store.delete(path, recursive=recursive)
+
+
+    def delete_ug_nodes(self, paths, batch_size=256):
+        """
+        Remove multiple nodes from an update graph along with the payloads.
+
+        The znodes are deleted in ZooKeeper transactions of at most
+        `batch_size` operations. Children MUST be listed before their parents.
+        The nodes of a failed transaction, e.g., with a child not listed, are
+        removed one by one, recursively.
+
+        Returns
+        -------
+        removed : list
+            Paths of the removed nodes.
+        """
+        removed = []
         try:
-            data, stat = self.zk.get('/alto/{}/{}/ug/{}/{}'.format(resource_id, digest, start_seq, end_seq))
-        except Exception:
-            return None
-        return data
+            for i in range(0, len(paths), batch_size):
+                batch = paths[i:i + batch_size]
+                try:
+                    transaction = self.zk.transaction()
+                    for path in batch:
+                        transaction.delete(path)
+                    results = transaction.commit()
+                    failed = any(isinstance(result, Exception) for result in results or [])
+                except Exception:
+                    failed = True
+                if not failed:
+                    removed.extend(batch)
+                    continue
+                for path in batch:
+                    if not self.zk.exists(path):
+                        # Removed along with its parent, or by the transaction
+                        removed.append(path)
+                        continue
+                    try:
+                        self.delete_ug_node(path, recursive=True)
+                    except Exception as e:
+                        print('Failed to delete {}: {}'.format(path, e))
+        finally:
+            self.store.delete_many(removed)
+        return removed
+
+
+def get_local_resource(ctx: VersionControl, resource_id, resource, request_body=None):
+    """
+    Get ALTO response of an information resource from its backend algorithm
+    in this process.
 
+    The algorithm instance is shared with the northbound view, and the
+    response is returned as the Python object the view would render. The
+    object MUST be treated as read-only.
 
-vcs_singleton = VersionControl()
+    Parameters
+    ----------
+    ctx : VersionControl
+        Context of the version control system
+    resource_id : str
+        Resource ID
+    resource : dict
+        Metadata of the information resource
+    request_body : dict | None
+        Request body to query the information resource
+
+    Returns
+    -------
+    response : dict or None
+        The query response. If None, the resource cannot be generated in
+        process, e.g., it is served remotely or rendered as multipart.
+    """
+    algorithm = resource.get('algorithm')
+    if not algorithm:
+        return None
+    resource_type = resource.get('type')
+    namespace = resource.get('namespace', ctx.config.get_default_namespace())
+    params = dict(resource.get('params', dict()))
+    params['resource_id'] = resource_id
+    request_body = request_body or dict()
+
+    if resource_type in ['network-map', 'cost-map']:
+        alg = get_algorithm(algorithm, namespace, params)
+        return alg.lookup()
+    elif resource_type == 'endpoint-cost':
+        alg = get_algorithm(algorithm, namespace, params)
+        endpoint_filter = request_body['endpoints']
+        return alg.lookup(endpoint_filter['srcs'], endpoint_filter['dsts'],
+                          request_body.get('cost-type'))
+    elif resource_type == 'entity-prop':
+        alg = get_algorithm(algorithm, namespace, params)
+        return alg.lookup(request_body['entities'])
+    return None
 
 
 def get_resource(ctx: VersionControl, resource_id, resource, request_body=None):
@@ -274,6 +615,14 @@ def get_resource(ctx: VersionControl, resource_id, resource, request_body=None):
         return None
 
 
+def get_group_key(resource_id, request_body):
+    """
+    Get the key identifying the version stream of a resource and its input,
+    shared by all the diff formats.
+    """
+    return (resource_id, json.dumps(request_body, sort_keys=True))
+
+
 def get_request_digest(request_body, diff_format: Diff=Diff.JSON_MERGE_PATCH):
     request_body_enc = b''
     if request_body:
@@ -285,12 +634,48 @@ def get_request_digest(request_body, diff_format: Diff=Diff.JSON_MERGE_PATCH):
     return request_body_enc, digest
 
 
-class ResourceListener(Thread):
+class ResourceListener:
+    """
+    Update tracker of a subscribed information resource.
+
+    Listeners do not run on their own. They are driven by the
+    `ListenerScheduler` of the version control system, which regenerates the
+    resource and hands the result to `update()`.
+
+    Besides the edges between consecutive versions, shortcut edges let
+    lagging clients catch up with a single patch:
+
+    - `latest`: an edge from each of the last `shortcut_window` versions to
+      the latest version, replacing the shortcuts to the previous one.
+    - `skiplist`: an edge from version `v - 2^k` to `v` whenever `v` is a
+      multiple of `2^k` (relative to the initial version), for
+      `2 <= 2^k <= shortcut_window`.
+
+    A shortcut is only added if it is smaller than the full snapshot.
+    Shortcuts are computed by the scheduler workers after the new version is
+    published, so they never delay the updates of the views.
+
+    Old versions are removed by `compact()`, which the scheduler runs in the
+    background. The update graph keeps at most `snapshot_limit` snapshots,
+    and drops the versions older than `retention_age` seconds or beyond
+    `retention_size` bytes of payloads, but never the latest snapshot nor
+    the versions after it.
+
+    With leader election, only the listener holding the `leader` lock of the
+    view updates it. The others wait for the lock in a background thread,
+    and once they win the election, resume the update graph left by the
+    previous leader from a new snapshot.
+
+    Every listener stops once the view has no subscriber left.
+    """
 
     def __init__(self, ctx: VersionControl, path, resource_id, resource,
                  request_body=None, polling_interval=1, snapshot_freq=3,
-                 snapshot_limit=10, init_ver=1,
-                 diff_format: Diff=Diff.JSON_MERGE_PATCH) -> None:
+                 snapshot_limit=10, init_ver=1, init_res=None,
+                 diff_format: Diff=Diff.JSON_MERGE_PATCH,
+                 update_mode='polling', update_debounce=0.5,
+                 shortcut_mode='none', shortcut_window=8,
+                 retention_age=0, retention_size=0) -> None:
         self.ctx = ctx
         self.path = path
         self.resource_id = resource_id
@@ -300,67 +685,840 @@ class ResourceListener(Thread):
         self.polling_interval = polling_interval
         self.snapshot_freq = snapshot_freq
         self.snapshot_limit = snapshot_limit
+        self.retention_age = retention_age
+        self.retention_size = retention_size
+        self.version_times = dict()
         self.diff_format = diff_format
-        self.success = self.initialize(init_ver)
-        super().__init__()
+        self.update_mode = update_mode
+        self.update_debounce = update_debounce
+        self.shortcut_mode = shortcut_mode
+        self.shortcut_window = shortcut_window
+        self.history = OrderedDict()
+        self.namespace = resource.get('namespace', ctx.config.get_default_namespace())
+        self.group_key = get_group_key(resource_id, request_body)
+        self.version_cond = Condition()
+        # Guards the read-modify-write cycles of the update graph metadata
+        self.meta_lock = RLock()
+        self.shortcut_lock = Lock()
+        self.pending_shortcuts = deque()
+        self.shortcut_running = False
+        self.meta = None
+        self.local = True
+        self.leader = False
+        self.election = self.create_election()
+        self.standby = None
+        self.init_ver = init_ver
+        self.last_ver = None
+        self.last_res = None
+        self.success = True
+        if self.try_elect():
+            self.success = self.initialize(init_ver, init_res=init_res)
+        else:
+            self.stand_by()
+
+
+    def fetch(self):
+        """
+        Get the current response of the information resource.
+
+        The resource is generated in process if possible, otherwise it is
+        requested from the ALTO server over HTTP.
+
+        Returns
+        -------
+        res : dict or None
+            The current response. If None, the request failed.
+        """
+        if self.local:
+            try:
+                res = get_local_resource(self.ctx, self.resource_id, self.resource, self.request_body)
+            except Exception as e:
+                print('Failed to generate resource (id={}): {}'.format(self.resource_id, e))
+                return None
+            if res is not None:
+                return res
+            self.local = False
+        raw_res = get_resource(self.ctx, self.resource_id, self.resource, self.request_body)
+        if raw_res is None:
+            return None
+        return json.loads(raw_res)
+
+
+    def create_election(self):
+        if not self.ctx.leader_election:
+            return None
+        return self.ctx.zk.Lock('{}/leader'.format(self.path), self.ctx.replica_id)
 
 
-    def initialize(self, init_ver):
-        print('Getting resource (id={}, input={}) for intialization...'.format(self.resource_id, self.request_body))
-        raw_last_res = get_resource(self.ctx, self.resource_id, self.resource, self.request_body)
-        print('Got resource (id={}, input={})'.format(self.resource_id, self.request_body))
-        if raw_last_res is None:
+    def try_elect(self):
+        """
+        Try to win the leader election of the view without blocking.
+        """
+        if self.election is None:
+            return True
+        try:
+            return self.election.acquire(blocking=False)
+        except Exception as e:
+            print('Failed to elect the leader of {}: {}'.format(self.path, e))
             return False
-        self.ctx.zk.ensure_path('{}/ug/0'.format(self.path))
-        self.ctx.zk.create('{}/ug/0/{}'.format(self.path, init_ver), raw_last_res)
-        self.last_res = json.loads(raw_last_res)
-        self.init_ver = init_ver
-        self.last_ver = init_ver
-        return True
 
-    
+
+    def stand_by(self):
+        """
+        Wait for the leader lock in a background thread. ZooKeeper notifies
+        the lock holder once its predecessor goes away.
+        """
+        election = self.election
+        if election is None or self.standby is election:
+            return
+        self.standby = election
+        Thread(target=self.run_election, args=(election,), daemon=True).start()
+
+
+    def run_election(self, election):
+        while not self.stop_event.is_set() and election is self.election:
+            try:
+                if not self.has_subscribers():
+                    return
+                if election.acquire(blocking=True):
+                    # Initialize on the next update of the group
+                    self.ctx.scheduler.notify(self.group_key)
+                    return
+            except Exception as e:
+                if self.stop_event.is_set() or election is not self.election:
+                    return
+                print('Failed to elect the leader of {}: {}'.format(self.path, e))
+            self.stop_event.wait(self.polling_interval)
+
+
+    def elect(self):
+        """
+        Check whether the listener has won the leader election of the view.
+        """
+        return self.election is None or self.election.is_acquired
+
+
+    def has_subscribers(self):
+        """
+        Check whether any client still subscribes to the view.
+        """
+        path = '{}/subscriber'.format(self.path)
+        try:
+            return bool(self.ctx.zk.get_children(path))
+        except Exception:
+            pass
+        # The view has been removed, unless ZooKeeper is unreachable
+        try:
+            return self.ctx.zk.exists(path) is not None
+        except Exception:
+            return True
+
+
+    def cancel_election(self):
+        election = self.election
+        if election is None or election.is_acquired:
+            return
+        try:
+            election.cancel()
+        except Exception:
+            pass
+
+
+    def demote(self):
+        """
+        Stop updating the view, e.g., once the leader lock is lost.
+        """
+        self.leader = False
+        self.cancel_election()
+        self.election = self.create_election()
+        if not self.stop_event.is_set():
+            self.stand_by()
+
+
+    def resign(self):
+        """
+        Release the leader lock, so that another replica takes over.
+        """
+        self.leader = False
+        self.cancel_election()
+        if self.election is not None and self.election.is_acquired:
+            try:
+                self.election.release()
+            except Exception as e:
+                print('Failed to release the leader lock of {}: {}'.format(self.path, e))
+
+
+    def load_meta(self):
+        """
+        Get the metadata of the update graph left by a previous leader, or
+        None if it does not exist.
+        """
+        meta_path = '{}/meta'.format(self.path)
+        if not self.ctx.zk.exists(meta_path):
+            return None
+        data, _ = self.ctx.zk.get(meta_path)
+        return json.loads(data)
+
+
+    def initialize(self, init_ver, init_res=None):
+        """
+        Start updating the view from a snapshot of version `init_ver`, or of
+        the version following the existing update graph.
+        """
+        self.local = True
+        if init_res is not None:
+            last_res = init_res
+        else:
+            print('Getting resource (id={}, input={}) for intialization...'.format(self.resource_id, self.request_body))
+            last_res = self.fetch()
+            print('Got resource (id={}, input={})'.format(self.resource_id, self.request_body))
+        if last_res is None:
+            return False
+        with self.meta_lock:
+            self.ctx.zk.ensure_path('{}/ug/0'.format(self.path))
+            ug_meta = dict()
+            meta = self.load_meta()
+            if meta is not None:
+                ug_meta = meta['updates-graph']
+                versions = [int(end_seq) for end_seqs in ug_meta.values() for end_seq in end_seqs]
+                if versions:
+                    init_ver = max(init_ver, max(versions) + 1)
+            self.create_edge(ug_meta, '0', init_ver, json.dumps(last_res).encode())
+            self.save_meta(ug_meta)
+            self.last_res = last_res
+            self.init_ver = init_ver
+            self.version_times.clear()
+            self.version_times[init_ver] = time.time()
+            self.history.clear()
+            self.add_history(init_ver, last_res)
+            self.leader = True
+            self.publish_version(init_ver)
+            return True
+
+
+    def update(self, res, version=None):
+        """
+        Append a new version to the update graph if the resource changed.
+
+        Parameters
+        ----------
+        res : dict
+            The current response of the information resource. It is shared
+            by all the listeners of the same resource, and MUST NOT be
+            modified.
+        version : int or None
+            Version of `res` in the version stream of the resource. Defaults
+            to the version following the latest one.
+        """
+        patch = self.create_patch(self.last_res, res)
+        if not patch:
+            return
+        with self.meta_lock:
+            ug_meta = {start_seq: dict(edges) for start_seq, edges in self.meta['updates-graph'].items()}
+            self.last_res = res
+            self.ctx.zk.ensure_path('{}/ug/{}'.format(self.path, self.last_ver))
+            new_ver = version if version is not None else self.last_ver + 1
+            self.create_edge(ug_meta, self.last_ver, new_ver, json.dumps(patch).encode())
+            if (new_ver - self.init_ver) % self.snapshot_freq == 0:
+                self.create_edge(ug_meta, '0', new_ver, json.dumps(res).encode())
+            self.version_times[new_ver] = time.time()
+            self.save_meta(ug_meta)
+            self.publish_version(new_ver)
+        self.add_history(new_ver, res)
+        self.schedule_shortcuts(new_ver, res)
+
+
+    def add_history(self, version, res):
+        """
+        Keep the recent versions of the resource to compute shortcuts from.
+        """
+        if self.shortcut_mode == 'none':
+            return
+        self.history[version] = res
+        while len(self.history) > self.shortcut_window + 1:
+            self.history.popitem(last=False)
+
+
+    def schedule_shortcuts(self, new_ver, res):
+        """
+        Queue the shortcut edges to the new version, and hand them to a
+        scheduler worker. They are computed in place if the scheduler is not
+        running.
+        """
+        if self.shortcut_mode == 'latest':
+            start_seqs = [ver for ver in self.history if ver < new_ver - 1]
+        elif self.shortcut_mode == 'skiplist':
+            start_seqs = []
+            step = 2
+            while step <= self.shortcut_window:
+                if (new_ver - self.init_ver) % step == 0 and new_ver - step in self.history:
+                    start_seqs.append(new_ver - step)
+                step *= 2
+        else:
+            return
+        bases = {start_seq: self.history[start_seq] for start_seq in start_seqs}
+        with self.shortcut_lock:
+            self.pending_shortcuts.append((new_ver, res, bases))
+            if self.shortcut_running:
+                return
+            self.shortcut_running = True
+        if not self.ctx.scheduler.submit(self.run_shortcuts):
+            self.run_shortcuts()
+
+
+    def run_shortcuts(self):
+        """
+        Create the queued shortcuts in the order of the versions.
+        """
+        while True:
+            with self.shortcut_lock:
+                if not self.pending_shortcuts or self.stop_event.is_set():
+                    self.pending_shortcuts.clear()
+                    self.shortcut_running = False
+                    return
+                new_ver, res, bases = self.pending_shortcuts.popleft()
+            try:
+                self.create_shortcuts(new_ver, res, bases)
+            except Exception:
+                import traceback
+                print(traceback.format_exc())
+
+
+    def create_shortcuts(self, new_ver, res, bases):
+        """
+        Add shortcut edges to the new version, after it has been published.
+
+        Parameters
+        ----------
+        new_ver : int
+            The new version.
+        res : dict
+            The resource of the new version.
+        bases : dict
+            Mapping from the start versions of the shortcuts to their
+            resources.
+        """
+        snapshot_size = len(json.dumps(res).encode())
+        patches = dict()
+        for start_seq, base in bases.items():
+            data = json.dumps(self.create_patch(base, res)).encode()
+            if len(data) < snapshot_size:
+                patches[start_seq] = data
+
+        with self.meta_lock:
+            if not self.leader or self.meta is None:
+                return
+            if self.shortcut_mode == 'latest' and new_ver != self.last_ver:
+                # Superseded by a newer version
+                return
+            ug_meta = {start_seq: dict(edges) for start_seq, edges in self.meta['updates-graph'].items()}
+            if self.shortcut_mode == 'latest':
+                # Shortcuts to the previous version are superseded
+                prev_ver = str(new_ver - 1)
+                for start_seq, edges in ug_meta.items():
+                    if start_seq != '0' and int(start_seq) < new_ver - 2 and prev_ver in edges:
+                        self.ctx.delete_ug_node('{}/ug/{}/{}'.format(self.path, start_seq, prev_ver))
+                        del edges[prev_ver]
+
+            for start_seq, data in patches.items():
+                if str(start_seq) not in ug_meta:
+                    # Already cleaned up with its snapshot
+                    continue
+                self.create_edge(ug_meta, start_seq, new_ver, data)
+
+            if ug_meta != self.meta['updates-graph']:
+                self.save_meta(ug_meta)
+
+
+    def create_edge(self, ug_meta, start_seq, end_seq, data):
+        """
+        Add an edge to the update graph and record its metadata in `ug_meta`.
+        """
+        start_seq, end_seq = str(start_seq), str(end_seq)
+        compression = self.ctx.snapshot_compression if start_seq == '0' else None
+        self.ctx.create_ug_node('{}/ug/{}/{}'.format(self.path, start_seq, end_seq), data,
+                                compression=compression)
+        if start_seq == '0':
+            media_type = ALTO_CONTENT_TYPES.get(self.resource.get('type'))
+        else:
+            media_type = DIFF_MEDIA_TYPES.get(self.diff_format)
+        ug_meta.setdefault(start_seq, dict())[end_seq] = {
+            'media-type': media_type,
+            'tag': hashlib.sha1(data).hexdigest(),
+            'size': len(data)
+        }
+
+
+    def save_meta(self, ug_meta):
+        """
+        Publish the metadata of the update graph.
+
+        The metadata is kept in memory for this process, and written to the
+        `meta` znode for the other processes.
+        """
+        meta = {
+            'tag': hashlib.sha1(json.dumps(ug_meta, sort_keys=True).encode()).hexdigest(),
+            'updates-graph': ug_meta
+        }
+        data = json.dumps(meta).encode()
+        meta_path = '{}/meta'.format(self.path)
+        if self.ctx.zk.exists(meta_path):
+            self.ctx.zk.set(meta_path, data)
+        else:
+            self.ctx.zk.create(meta_path, data)
+        self.meta = meta
+
+
+    def publish_version(self, version):
+        """
+        Publish a new version and wake up the clients waiting for it.
+        """
+        with self.version_cond:
+            self.last_ver = version
+            self.version_cond.notify_all()
+
+
+    def wait_for_version(self, seq, timeout=None):
+        """
+        Wait until a version newer than `seq` is published.
+        """
+        with self.version_cond:
+            self.version_cond.wait_for(lambda: self.last_ver > seq or self.stop_event.is_set(),
+                                       timeout=timeout)
+            return self.last_ver
+
+
+    def get_retention_cutoff(self, ug_meta):
+        """
+        Get the oldest snapshot to retain. Older versions are outdated.
+        """
+        snapshots = sorted(int(sid) for sid in ug_meta.get('0', dict()))
+        if not snapshots:
+            return None
+        cutoff = snapshots[-self.snapshot_limit] if len(snapshots) > self.snapshot_limit else snapshots[0]
+
+        if self.retention_age:
+            expiry = time.time() - self.retention_age
+            fresh = [sid for sid in snapshots if self.version_times.get(sid, expiry) > expiry]
+            cutoff = max(cutoff, fresh[0] if fresh else snapshots[-1])
+
+        if self.retention_size:
+            # Each snapshot comes with the edges until the next snapshot
+            segments = []
+            for i, sid in enumerate(snapshots):
+                next_sid = snapshots[i + 1] if i + 1 < len(snapshots) else None
+                size = ug_meta['0'][str(sid)]['size']
+                size += sum(edge['size'] for start_seq, edges in ug_meta.items()
+                            if start_seq != '0' and int(start_seq) >= sid
+                            and (next_sid is None or int(start_seq) < next_sid)
+                            for edge in edges.values())
+                segments.append((sid, size))
+            retained = [(sid, size) for sid, size in segments if sid >= cutoff]
+            total = sum(size for _, size in retained)
+            while len(retained) > 1 and total > self.retention_size:
+                total -= retained.pop(0)[1]
+            cutoff = retained[0][0]
+        return cutoff
+
+
+    def compact(self):
+        """
+        Remove the outdated versions from the update graph according to the
+        retention policy.
+
+        Returns
+        -------
+        count : int
+            Number of removed edges.
+        """
+        with self.meta_lock:
+            ug_meta = {start_seq: dict(edges) for start_seq, edges in self.meta['updates-graph'].items()}
+            cutoff = self.get_retention_cutoff(ug_meta)
+            if cutoff is None:
+                return 0
+            paths = []
+            for sid in sorted(int(sid) for sid in ug_meta['0']):
+                if sid < cutoff:
+                    paths.append('{}/ug/0/{}'.format(self.path, sid))
+                    del ug_meta['0'][str(sid)]
+            for start_seq in sorted(int(sid) for sid in ug_meta if sid != '0'):
+                if start_seq < cutoff:
+                    paths.extend('{}/ug/{}/{}'.format(self.path, start_seq, end_seq)
+                                 for end_seq in ug_meta.pop(str(start_seq)))
+                    paths.append('{}/ug/{}'.format(self.path, start_seq))
+            if not paths:
+                return 0
+            # Hide the outdated versions before removing their payloads
+            self.save_meta(ug_meta)
+            self.ctx.delete_ug_nodes(paths)
+            for ver in [ver for ver in self.version_times if ver < cutoff]:
+                del self.version_times[ver]
+            return len(paths)
+
+
+    def create_patch(self, old, new):
+        return create_patch(old, new, diff_format=self.diff_format)
+
+
+    def stop(self):
+        self.stop_event.set()
+        with self.version_cond:
+            self.version_cond.notify_all()
+
+
+class ListenerGroup:
+    """
+    Resource listeners sharing the same information resource and input.
+
+    The group produces the version stream of the resource: the resource is
+    generated once per update, and a new version is only numbered if it
+    differs from the previous one. Each listener then encodes the new
+    version in its own diff format. Listeners which are not the leaders of
+    their views only run for the election, and join the version stream once
+    they win.
+
+    In `polling` mode, the group is updated every `polling_interval` seconds.
+    In `event` mode, it is only updated once a transaction is committed to a
+    data broker in the namespace of the resource. Commits arriving within
+    `update_debounce` seconds are coalesced into a single update, delayed by
+    at most `polling_interval` seconds.
+    """
+
+    def __init__(self, scheduler, listener: ResourceListener):
+        self.scheduler = scheduler
+        self.key = listener.group_key
+        self.namespace = listener.namespace
+        self.polling_interval = listener.polling_interval
+        self.update_mode = listener.update_mode
+        self.update_debounce = listener.update_debounce
+        self.listeners = []
+        self.last_res = listener.last_res
+        self.version = listener.last_ver if listener.leader else listener.init_ver - 1
+        self.lock = Lock()
+        self.scheduled = False
+        self.next_run = time.time() + self.polling_interval
+        # Guards the debounce window, which is updated by the data broker
+        # callbacks. `lock` is held during whole updates, so it is not used
+        self.change_lock = Lock()
+        self.first_change = None
+        self.last_change = None
+
+
+    def on_change(self, namespace, db_type):
+        now = time.time()
+        with self.change_lock:
+            if self.first_change is None:
+                self.first_change = now
+            self.last_change = now
+        self.scheduler.wakeup()
+
+
+    def get_due_time(self):
+        """
+        Get the time when the group should be updated, or None if it is not
+        waiting for any update.
+        """
+        if self.update_mode != 'event':
+            return self.next_run
+        with self.change_lock:
+            if self.first_change is None:
+                return None
+            return min(self.last_change + self.update_debounce,
+                       self.first_change + self.polling_interval)
+
+
+    def dispatch(self):
+        """
+        Mark the group as scheduled. Changes arriving from now on trigger
+        another update.
+        """
+        self.scheduled = True
+        with self.change_lock:
+            self.first_change = None
+            self.last_change = None
+
+
+    def compact(self):
+        with self.lock:
+            for listener in self.listeners:
+                if listener.stop_event.is_set() or not listener.leader:
+                    continue
+                try:
+                    listener.compact()
+                except Exception:
+                    import traceback
+                    print(traceback.format_exc())
+
+
+    def run(self):
+        with self.lock:
+            listeners = [listener for listener in self.listeners
+                         if not listener.stop_event.is_set()]
+            # The last client may have unsubscribed through another replica
+            orphans = [listener for listener in listeners if not listener.has_subscribers()]
+            listeners = [listener for listener in listeners if listener not in orphans]
+            leaders = [listener for listener in listeners if listener.leader]
+            elected = [listener for listener in listeners
+                       if not listener.leader and listener.elect()]
+            res = None
+            if leaders or elected:
+                res = (leaders + elected)[0].fetch()
+            if res is not None:
+                if res != self.last_res:
+                    self.version += 1
+                    for listener in leaders:
+                        try:
+                            listener.update(res, version=self.version)
+                        except Exception:
+                            import traceback
+                            print(traceback.format_exc())
+                    self.last_res = res
+                for listener in elected:
+                    try:
+                        if listener.initialize(self.version, init_res=res):
+                            self.version = max(self.version, listener.last_ver)
+                    except Exception:
+                        import traceback
+                        print(traceback.format_exc())
+        for listener in orphans:
+            listener.ctx.remove_listener(listener)
+        self.next_run = time.time() + self.polling_interval
+        self.scheduled = False
+
+
+class ListenerScheduler:
+    """
+    Scheduler driving all the resource listeners.
+
+    A single thread tracks when each group of listeners is due, and hands
+    the updates to a pool of at most `max_workers` threads. Every
+    `compaction_interval` seconds, it also queues the compaction of all the
+    update graphs.
+
+    Parameters
+    ----------
+    max_workers : int
+        Maximum number of resources generated concurrently.
+    compaction_interval : float
+        Interval between two compactions in seconds.
+    """
+
+    def __init__(self, max_workers=4, compaction_interval=60):
+        self.max_workers = max_workers
+        self.compaction_interval = compaction_interval
+        self.next_compaction = time.time() + compaction_interval
+        self.groups = dict()
+        self.lock = Lock()
+        self.wakeup_event = Event()
+        self.stop_event = Event()
+        self.thread = None
+        self.executor = None
+        self.pending = 0
+        self.running = 0
+
+
+    def add(self, listener: ResourceListener):
+        with self.lock:
+            group = self.groups.get(listener.group_key)
+            if group is None:
+                group = self.groups[listener.group_key] = ListenerGroup(self, listener)
+                if group.update_mode == 'event':
+                    data_broker_manager.add_listener(group.namespace, group.on_change)
+            group.listeners.append(listener)
+            if self.thread is None:
+                self.stop_event.clear()
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.wakeup()
+
+
+    def get_group(self, key):
+        with self.lock:
+            return self.groups.get(key)
+
+
+    def remove(self, listener: ResourceListener):
+        """
+        Stop a listener, and wait for its ongoing update to finish.
+        """
+        listener.stop()
+        with self.lock:
+            group = self.groups.get(listener.group_key)
+            if group is not None:
+                if listener in group.listeners:
+                    group.listeners.remove(listener)
+                if not group.listeners:
+                    self.release(group)
+        if group is not None:
+            with group.lock:
+                pass
+        listener.resign()
+
+
+    def release(self, group: ListenerGroup):
+        del self.groups[group.key]
+        if group.update_mode == 'event':
+            data_broker_manager.remove_listener(group.namespace, group.on_change)
+
+
+    def wakeup(self):
+        self.wakeup_event.set()
+
+
+    def notify(self, key):
+        """
+        Update a group as soon as possible, e.g., once a listener is elected.
+        """
+        group = self.get_group(key)
+        if group is not None:
+            group.next_run = time.time()
+            group.on_change(group.namespace, None)
+
+
+    def submit(self, fn, *args):
+        """
+        Run a background task on a worker.
+
+        Returns
+        -------
+        bool
+            False if the scheduler is not running.
+        """
+        with self.lock:
+            if self.executor is None:
+                return False
+            self.executor.submit(fn, *args)
+            return True
+
+
     def run(self):
-        self.ctx.zk.ensure_path('{}/ug/0'.format(self.path))
         while not self.stop_event.is_set():
-            time.sleep(self.polling_interval)
-            raw_res = get_resource(self.ctx, self.resource_id, self.resource, self.request_body)
-            if raw_res is None:
-                continue
-            res = json.loads(raw_res)
-            patch = self.create_patch(self.last_res, res)
-            if patch:
-                self.last_res = res
-                self.ctx.zk.ensure_path('{}/ug/{}'.format(self.path, self.last_ver))
-                new_ver = self.last_ver + 1
-                self.ctx.zk.create('{}/ug/{}/{}'.format(self.path, self.last_ver, new_ver),
-                                   json.dumps(patch).encode())
-                self.last_ver = new_ver
-                if (self.last_ver - self.init_ver) % self.snapshot_freq == 0:
-                    self.ctx.zk.create('{}/ug/0/{}'.format(self.path, self.last_ver), raw_res)
-            self.clean_up_old_snapshots()
-
-
-    def clean_up_old_snapshots(self):
-        snapshots = sorted([int(sid) for sid in self.ctx.zk.get_children('{}/ug/0'.format(self.path))])
-        if len(snapshots) > self.snapshot_limit:
-            last_snapshot = snapshots[-self.snapshot_limit]
-            outdated_snapshots = snapshots[:-self.snapshot_limit]
-            for sid in outdated_snapshots:
-                self.ctx.zk.delete('{}/ug/0/{}'.format(self.path, sid))
-            outdated_start_seqs = sorted([int(sid) for sid in self.ctx.zk.get_children('{}/ug'.format(self.path))
-                                          if 0 < int(sid) < last_snapshot])
-            for sid in outdated_start_seqs:
-                self.ctx.zk.delete('{}/ug/{}'.format(self.path, sid), recursive=True)
+            self.wakeup_event.clear()
+            now = time.time()
+            next_due = None
+            with self.lock:
+                for group in self.groups.values():
+                    if group.scheduled:
+                        continue
+                    due = group.get_due_time()
+                    if due is None:
+                        continue
+                    if due <= now:
+                        group.dispatch()
+                        self.pending += 1
+                        self.executor.submit(self.execute, group)
+                    elif next_due is None or due < next_due:
+                        next_due = due
+                if self.groups and self.next_compaction <= now:
+                    self.next_compaction = now + self.compaction_interval
+                    self.pending += 1
+                    self.executor.submit(self.execute_compaction, list(self.groups.values()))
+                if next_due is None or self.next_compaction < next_due:
+                    next_due = self.next_compaction
+            timeout = None if next_due is None else next_due - time.time()
+            if timeout is None or timeout > 0:
+                self.wakeup_event.wait(timeout)
 
 
-    def create_patch(self, old, new):
-        patch = new
-        if self.diff_format == Diff.JSON_PATCH:
-            patch = jsonpatch.JsonPatch.from_diff(old, new).patch
-        elif self.diff_format == Diff.JSON_MERGE_PATCH:
-            patch = json_merge_patch.create_patch(old, new)
-        return patch
+    def execute(self, group: ListenerGroup):
+        with self.lock:
+            self.pending -= 1
+            self.running += 1
+        try:
+            group.run()
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.wakeup()
+
+
+    def execute_compaction(self, groups):
+        with self.lock:
+            self.pending -= 1
+            self.running += 1
+        try:
+            for group in groups:
+                group.compact()
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+    def get_metrics(self):
+        """
+        Get the metrics of the scheduler.
+
+        Returns
+        -------
+        metrics : dict
+            - groups: number of distinct resources and inputs being tracked
+            - listeners: number of resource listeners
+            - leaders: number of resource listeners updating their views
+            - queue_depth: number of updates waiting for a worker
+            - running: number of updates being executed
+            - max_workers: size of the worker pool
+        """
+        with self.lock:
+            return {
+                'groups': len(self.groups),
+                'listeners': sum(len(group.listeners) for group in self.groups.values()),
+                'leaders': sum(listener.leader for group in self.groups.values()
+                               for listener in group.listeners),
+                'queue_depth': self.pending,
+                'running': self.running,
+                'max_workers': self.max_workers
+            }
 
 
     def stop(self):
+        listeners = []
+        with self.lock:
+            for group in list(self.groups.values()):
+                for listener in group.listeners:
+                    listener.stop()
+                listeners.extend(group.listeners)
+                self.release(group)
+            thread, executor = self.thread, self.executor
+            self.thread = None
+            self.executor = None
         self.stop_event.set()
+        self.wakeup()
+        if thread is not None:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for listener in listeners:
+            listener.resign()
+
+
+# Reentrant, as a collected instance may be stopped while it is held
+_vcs_lock = RLock()
+
+
+def get_vcs(create=True):
+    """
+    Get the version control system, starting it on first use.
+
+    Parameters
+    ----------
+    create : bool
+        Whether to start the version control system if it is not running.
+
+    Returns
+    -------
+    vcs : VersionControl or None
+        None if the version control system is not running and `create` is
+        False.
+    """
+    with _vcs_lock:
+        vcs = getattr(VersionControl, 'instance', None)
+        if vcs is not None or not create:
+            return vcs
+        try:
+            return VersionControl()
+        except Exception:
+            # Do not leave a half-initialized instance behind
+            if hasattr(VersionControl, 'instance'):
+                del VersionControl.instance
+            raise
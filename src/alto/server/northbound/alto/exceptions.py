@@ -30,15 +30,44 @@ from urllib.parse import quote
 
 from django.http import JsonResponse
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.views import exception_handler
 
 from alto.common.constants import ALTO_CONTENT_TYPE_ERROR
 
 
+class ALTOParseError(ParseError):
+    """
+    Malformed ALTO request, reported with an error code of RFC 7285:
+
+    - E_SYNTAX: the request is not valid JSON.
+    - E_MISSING_FIELD: a required field is missing.
+    - E_INVALID_FIELD_TYPE: a field has the wrong JSON type.
+    - E_INVALID_FIELD_VALUE: a field has an invalid value.
+    """
+
+    def __init__(self, code, field=None, value=None, detail=None):
+        super().__init__(detail=detail)
+        self.code = code
+        self.field = field
+        self.value = value
+
+    def get_meta(self):
+        meta = {'code': self.code}
+        if self.field is not None:
+            meta['field'] = self.field
+        if self.value is not None:
+            meta['value'] = self.value
+        return meta
+
+
 def alto_exception_handler(exc, context):
     response = exception_handler(exc, context)
     if response is not None:
         response.content_type = ALTO_CONTENT_TYPE_ERROR
+        if isinstance(exc, ALTOParseError):
+            response.data = {'meta': exc.get_meta()}
+            return response
         if 'meta' not in response.data:
             response.data['meta'] = dict()
         response.data['meta']['code'] = 'E_GENERIC_HTTP'
@@ -4,8 +4,10 @@ import hashlib
 from django.conf import settings
 from django.utils.encoding import force_bytes
 from rest_framework.parsers import JSONParser
-from rest_framework.renderers import JSONRenderer, MultiPartRenderer
+from rest_framework.renderers import BaseRenderer, JSONRenderer, MultiPartRenderer
 
+from alto.config import Config
+from alto.common.codec import get_json_decoder, get_json_encoder, iter_json
 from alto.common.constants import (ALTO_CONTENT_TYPE_IRD,
                                    ALTO_CONTENT_TYPE_NM,
                                    ALTO_CONTENT_TYPE_CM,
@@ -19,6 +21,11 @@ from alto.common.constants import (ALTO_CONTENT_TYPE_IRD,
                                    ALTO_PARAMETER_TYPE_PROPMAP,
                                    ALTO_PARAMETER_TYPE_TIPS)
 
+from .exceptions import ALTOParseError
+from .schema import validate_params
+
+config = Config()
+
 
 ################################
 # Renders for ALTO related views
@@ -39,7 +46,25 @@ class ALTOBaseRender(JSONRenderer):
         """
         Override by render for specific information resource.
         """
-        return super(ALTOBaseRender, self).render(data, accepted_media_type, renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
+
+    def get_encoder(self):
+        """
+        Get the JSON encoder selected by the `json_encoder` option.
+        """
+        return get_json_encoder(config.get_server_json_encoder())
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Encode the data to compact JSON with the configured encoder.
+
+        Indented responses are still rendered by the REST framework.
+        """
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or dict()) is not None:
+            return super(ALTOBaseRender, self).render(data, accepted_media_type, renderer_context)
+        return self.get_encoder()(data, default=self.encoder_class().default)
 
 
 class IRDRender(ALTOBaseRender):
@@ -50,7 +75,7 @@ class IRDRender(ALTOBaseRender):
     media_type = ALTO_CONTENT_TYPE_IRD
 
     def _render(self, data, accepted_media_type=None, renderer_context=None):
-        return super(ALTOBaseRender, self).render(data, accepted_media_type, renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class NetworkMapRender(ALTOBaseRender):
@@ -61,7 +86,7 @@ class NetworkMapRender(ALTOBaseRender):
     media_type = ALTO_CONTENT_TYPE_NM
 
     def _render(self, data, accepted_media_type=None, renderer_context=None):
-        return super(ALTOBaseRender, self).render(data, accepted_media_type, renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class CostMapRender(ALTOBaseRender):
@@ -72,7 +97,7 @@ class CostMapRender(ALTOBaseRender):
     media_type = ALTO_CONTENT_TYPE_CM
 
     def _render(self, data, accepted_media_type=None, renderer_context=None):
-        return super(ALTOBaseRender, self).render(data, accepted_media_type, renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class EndpointCostRender(ALTOBaseRender):
@@ -86,8 +111,7 @@ class EndpointCostRender(ALTOBaseRender):
         data = dict()
         data['meta'] = ecmap['meta']
         data['endpoint-cost-map'] = ecmap['endpoint-cost-map']
-        return super(ALTOBaseRender, self).render(data, accepted_media_type,
-                                                      renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class EndpointPropRender(ALTOBaseRender):
@@ -100,8 +124,7 @@ class EndpointPropRender(ALTOBaseRender):
     def _render(self, propmap, accepted_media_type=None, renderer_context=None):
         data = dict()
         data['endpoint-properties'] = propmap
-        return super(ALTOBaseRender, self).render(data, accepted_media_type,
-                                                    renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class EntityPropRender(ALTOBaseRender):
@@ -114,11 +137,16 @@ class EntityPropRender(ALTOBaseRender):
     def _render(self, propmap, accepted_media_type=None, renderer_context=None):
         data = dict()
         data['property-map'] = propmap
-        return super(ALTOBaseRender, self).render(data, accepted_media_type,
-                                                    renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
 
 
 class MultiPartRelatedRender(ALTOBaseRender):
+    """
+    Render for multipart/related responses, e.g., path vectors.
+
+    Views SHOULD stream the parts with `stream()` rather than render them at
+    once.
+    """
     # accept
     media_type = 'multipart/related'
     # multipart_related = 'multipart/related'
@@ -126,8 +154,8 @@ class MultiPartRelatedRender(ALTOBaseRender):
     type = ALTO_CONTENT_TYPE_ECS
     format = 'multipart'
     charset = 'utf-8'
-    # FIXME: `_boundary` shouldn't be fixed. Compute boundary by hash check of content at runtime
     BOUNDARY = hashlib.md5().hexdigest()
+    chunk_size = 64 * 1024
 
     def __init__(self):
         super(MultiPartRelatedRender, self).__init__()
@@ -136,40 +164,59 @@ class MultiPartRelatedRender(ALTOBaseRender):
 
         return self.encode_multipart(data)
 
-    def encode_multipart(self, data):
+    def get_boundary(self, parts):
+        """
+        Compute the boundary from the identities of the parts, i.e., their
+        Content-IDs and metadata, without encoding the parts.
+        """
+        m = hashlib.md5()
+        for part in parts:
+            m.update(force_bytes(part.get('Content-ID'), settings.DEFAULT_CHARSET))
+            meta = part.get('data', dict()).get('meta')
+            m.update(json.dumps(meta, sort_keys=True).encode())
+        return m.hexdigest()
+
+    def stream(self, parts, boundary=None):
+        """
+        Encode the parts incrementally, in chunks of about `chunk_size`
+        bytes.
+        """
         def to_bytes(s):
             return force_bytes(s, settings.DEFAULT_CHARSET)
 
-        lines = []
-        print(data)
-
-        for item in data:
-            try:
-                lines.extend(
-                    to_bytes(val)
-                    for val in [
-                        "--%s" % self.BOUNDARY,
-                        '{}: {}'.format('Content-Type', item.get('Content-Type')),
-                        "{}: {}".format('Content-ID', item.get('Content-ID')),
-                        "",
-                        json.dumps(item.get('data')),
-                    ]
-                )
-            except:
-                return to_bytes(data.get('detail'))
-
-        lines.extend(
-            [
-                to_bytes("--%s--" % self.BOUNDARY),
-                b"",
-            ]
-        )
-        return b"\r\n".join(lines)
+        encoder = self.get_encoder()
+        default = self.encoder_class().default
+
+        def encode(obj):
+            return encoder(obj, default=default)
+
+        boundary = boundary or self.BOUNDARY
+        for part in parts:
+            yield to_bytes('--{}\r\n{}: {}\r\n{}: {}\r\n\r\n'.format(
+                boundary,
+                'Content-Type', part.get('Content-Type'),
+                'Content-ID', part.get('Content-ID')))
+            chunk, size = [], 0
+            for s in iter_json(part.get('data'), encoder=encode):
+                chunk.append(s)
+                size += len(s)
+                if size >= self.chunk_size:
+                    yield b''.join(chunk)
+                    chunk, size = [], 0
+            chunk.append(b'\r\n')
+            yield b''.join(chunk)
+        yield to_bytes('--{}--\r\n'.format(boundary))
 
-    def get_context_type(self):
+    def encode_multipart(self, data):
+        try:
+            return b''.join(self.stream(data))
+        except (AttributeError, TypeError):
+            return force_bytes(data.get('detail'), settings.DEFAULT_CHARSET)
+
+    def get_context_type(self, boundary=None):
         return '{media_type}; boundary={boundary}; type={type}; charset={charset}'.format(
             media_type=self.media_type,
-            boundary=self.BOUNDARY,
+            boundary=boundary or self.BOUNDARY,
             type=self.type,
             charset=self.charset
         )
@@ -183,24 +230,62 @@ class TIPSRender(ALTOBaseRender):
     media_type = ALTO_CONTENT_TYPE_TIPS
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
-        return super(ALTOBaseRender, self).render(data, accepted_media_type,
-                                                    renderer_context)
+        return self.encode(data, accepted_media_type, renderer_context)
+
+
+class EventStreamRender(BaseRenderer):
+    """
+    Render for server-sent events.
+
+    The events are streamed by the view, so only errors are rendered here.
+    """
+
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return 'event: error\ndata: {}\n\n'.format(json.dumps(data)).encode(self.charset)
 
 
 ###################################
 # Parsers for ALTO related requests
 ###################################
-class EndpointCostParser(JSONParser):
+class ALTOParser(JSONParser):
+    """
+    Base parser for ALTO requests.
+
+    The request is decoded with the configured JSON library, and validated
+    against the precompiled schema of its parameter media type. Malformed
+    requests are rejected with the RFC 7285 error codes.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or dict()
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            data = get_json_decoder(config.get_server_json_encoder())(data)
+        except ValueError as exc:
+            raise ALTOParseError('E_SYNTAX', detail='JSON parse error - {}'.format(exc))
+        return validate_params(data, self.media_type)
+
+
+class EndpointCostParser(ALTOParser):
     media_type = ALTO_PARAMETER_TYPE_ECS
 
 
-class EndpointPropParser(JSONParser):
+class EndpointPropParser(ALTOParser):
     media_type = ALTO_PARAMETER_TYPE_EPS
 
 
-class EntityPropParser(JSONParser):
+class EntityPropParser(ALTOParser):
     media_type = ALTO_PARAMETER_TYPE_PROPMAP
 
 
-class TIPSParser(JSONParser):
+class TIPSParser(ALTOParser):
     media_type = ALTO_PARAMETER_TYPE_TIPS
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+"""
+Validation of ALTO request parameters.
+
+The schemas of the parameter media types are compiled once into nested
+validation functions, which check a decoded request in a single pass and
+raise `ALTOParseError` with the RFC 7285 error code of the first problem.
+
+A schema is written as:
+
+- a type, e.g., `str`, checked with `isinstance()`;
+- `[schema]` for an array of items matching `schema`;
+- `{'name': schema, 'name?': schema}` for an object, where names ending
+  with `?` are optional. Unknown fields are accepted for extensions.
+"""
+
+from alto.common.constants import (ALTO_PARAMETER_TYPE_FNM,
+                                   ALTO_PARAMETER_TYPE_FCM,
+                                   ALTO_PARAMETER_TYPE_ECS,
+                                   ALTO_PARAMETER_TYPE_EPS,
+                                   ALTO_PARAMETER_TYPE_PROPMAP,
+                                   ALTO_PARAMETER_TYPE_TIPS)
+
+from .exceptions import ALTOParseError
+
+
+JSON_TYPE_NAMES = {
+    str: 'string',
+    int: 'number',
+    float: 'number',
+    bool: 'boolean',
+    dict: 'object',
+    list: 'array'
+}
+
+
+def compile_schema(schema, field=''):
+    """
+    Compile a schema into a validation function.
+
+    Parameters
+    ----------
+    schema : type, list or dict
+        The schema to compile.
+    field : str
+        Path of the validated field in error reports, e.g.,
+        `cost-type/cost-mode`.
+
+    Returns
+    -------
+    validate : callable
+        `validate(value)` raises `ALTOParseError` if `value` does not
+        match the schema.
+    """
+    if isinstance(schema, list):
+        validate_item = compile_schema(schema[0], field)
+
+        def validate_array(value):
+            if not isinstance(value, list):
+                raise ALTOParseError('E_INVALID_FIELD_TYPE', field=field or None,
+                                     detail='{} must be an array'.format(field or 'request'))
+            for item in value:
+                validate_item(item)
+        return validate_array
+
+    if isinstance(schema, dict):
+        members = []
+        for name, member_schema in schema.items():
+            optional = name.endswith('?')
+            name = name.rstrip('?')
+            path = '{}/{}'.format(field, name) if field else name
+            members.append((name, optional, path, compile_schema(member_schema, path)))
+
+        def validate_object(value):
+            if not isinstance(value, dict):
+                raise ALTOParseError('E_INVALID_FIELD_TYPE', field=field or None,
+                                     detail='{} must be an object'.format(field or 'request'))
+            for name, optional, path, validate_member in members:
+                member = value.get(name)
+                if member is None:
+                    if not optional:
+                        raise ALTOParseError('E_MISSING_FIELD', field=path,
+                                             detail='{} is missing'.format(path))
+                    continue
+                validate_member(member)
+        return validate_object
+
+    expected = (int, float) if schema in (int, float) else schema
+    type_name = JSON_TYPE_NAMES.get(schema, schema.__name__)
+
+    def validate_value(value):
+        if not isinstance(value, expected) or (isinstance(value, bool) and schema is not bool):
+            raise ALTOParseError('E_INVALID_FIELD_TYPE', field=field,
+                                 detail='{} must be a {}'.format(field, type_name))
+    return validate_value
+
+
+COST_TYPE = {
+    'cost-mode': str,
+    'cost-metric': str,
+    'description?': str
+}
+
+ENDPOINT_FILTER = {
+    'srcs?': [str],
+    'dsts?': [str]
+}
+
+SCHEMAS = {
+    ALTO_PARAMETER_TYPE_FNM: {
+        'pids': [str],
+        'address-types?': [str]
+    },
+    ALTO_PARAMETER_TYPE_FCM: {
+        'cost-type': COST_TYPE,
+        'pids?': ENDPOINT_FILTER,
+        'constraints?': [str]
+    },
+    ALTO_PARAMETER_TYPE_ECS: {
+        'cost-type?': COST_TYPE,
+        'endpoints?': ENDPOINT_FILTER,
+        'endpoint-flows?': [ENDPOINT_FILTER],
+        'constraints?': [str],
+        'ane-property-names?': [str]
+    },
+    ALTO_PARAMETER_TYPE_EPS: {
+        'properties': [str],
+        'endpoints': [str]
+    },
+    ALTO_PARAMETER_TYPE_PROPMAP: {
+        'entities': [str],
+        'properties?': [str]
+    },
+    ALTO_PARAMETER_TYPE_TIPS: {
+        'resource-id': str,
+        'input?': dict
+    }
+}
+
+VALIDATORS = {media_type: compile_schema(schema) for media_type, schema in SCHEMAS.items()}
+
+
+def validate_params(data, media_type):
+    """
+    Validate the decoded parameters of an ALTO request.
+
+    Parameter media types without a schema are not validated.
+    """
+    validate = VALIDATORS.get(media_type)
+    if validate is not None:
+        validate(data)
+    return data
+
+
+def require_field(data, field):
+    """
+    Get a field required by a service, but optional in the schema of its
+    parameter media type.
+    """
+    value = data.get(field)
+    if value is None:
+        raise ALTOParseError('E_MISSING_FIELD', field=field,
+                             detail='{} is missing'.format(field))
+    return value
+
+
+def check_field_value(field, value, accepted):
+    """
+    Check that a field has one of the accepted values.
+    """
+    if value not in accepted:
+        raise ALTOParseError('E_INVALID_FIELD_VALUE', field=field, value=value,
+                             detail='{} must be one of {}'.format(field, ', '.join(accepted)))
+
+
+def get_request_params(request, media_type):
+    """
+    Get the validated parameters of a request.
+
+    Requests with an empty body are not parsed, so they are validated here
+    against the schema of `media_type`.
+    """
+    data = request.data
+    if not data:
+        data = validate_params(dict(), media_type)
+    return data
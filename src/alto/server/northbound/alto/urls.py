@@ -31,6 +31,13 @@ def generate_northbound_routes():
             tips_data_view = views.get_view('tips-data', resource_id, namespace, algorithm, params)
             urlpatterns.append(path('tips/<resource_id>/<digest>/ug/<int:start_seq>/<int:end_seq>',
                                     tips_data_view, name='{}:metadata'.format(resource_id)))
+            urlpatterns.append(path('tips/<resource_id>/<digest>/catchup/<int:start_seq>/<int:end_seq>',
+                                    tips_data_view, {'catchup': True}, name='{}:catchup'.format(resource_id)))
+            tips_push_view = views.get_view('tips-push', resource_id, namespace, algorithm, params)
+            urlpatterns.append(path('tips/<resource_id>/<digest>/push/<int:seq>',
+                                    tips_push_view, name='{}:push'.format(resource_id)))
+            urlpatterns.append(path('tips/<resource_id>/<digest>/push/<int:seq>/events',
+                                    tips_push_view, {'stream': True}, name='{}:push-events'.format(resource_id)))
 
     urlpatterns.append(path('openapi.yaml', get_schema_view(
         title="openalto/alto northbound API", description="openalto/alto northbound API"), name='openapi-schema'))
@@ -2,6 +2,7 @@ import socket
 import uuid
 
 import requests
+from django.utils.http import parse_etags
 from requests.exceptions import Timeout, ConnectionError
 
 IP_URLS = ["http://whatismyip.akamai.com/", "http://wgetip.com/"]
@@ -13,6 +14,33 @@ ALTO_CONTENT_TYPE_PROPMAP = 'application/alto-propmap+json'
 PREFIX_INET4 = "ipv4:"
 
 
+def etag_matches(request, etag):
+    """
+    Check whether the `If-None-Match` header of a request matches an ETag.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The HTTP request.
+    etag : str
+        The quoted entity tag of the current representation.
+
+    Returns
+    -------
+    bool
+        True if the client already has the current representation.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or not etag:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    # If-None-Match uses the weak comparison function (RFC 7232)
+    etag = etag[2:] if etag.startswith('W/') else etag
+    return any((e[2:] if e.startswith('W/') else e) == etag for e in etags)
+
+
 def get_content(alg, flows, prop_names, cost_type, resource_id, host_name):
     """
     Call path vector algorithm to compute path vectors and properties.
@@ -22,8 +50,8 @@ def get_content(alg, flows, prop_names, cost_type, resource_id, host_name):
     alg : class
         A class provide `lookup()` method for path vector lookup for a given set
         of `flows` and a given list of `property_names`.
-    flows : list
-        List of `(src, dst)` pairs.
+    flows : iterable
+        `(src, dst)` pairs.
     prop_names : list
         List of property names.
     service_name : str
@@ -66,7 +94,6 @@ def get_content(alg, flows, prop_names, cost_type, resource_id, host_name):
         ane_name = '.ane:%s' % (ane)
         ane_props = link_map[ane]
         props = prop_names if len(prop_names) > 0 else ane_props.keys()
-        print(props)
         property_map[ane_name] = {pn: ane_props[pn] for pn in props if ane_props.get(pn) is not None}
     data['property-map'] = property_map
 
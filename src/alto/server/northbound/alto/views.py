@@ -1,5 +1,11 @@
+import hashlib
+import itertools
+import json
+import time
 import uuid
 from django.conf import settings as conf_settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
 from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,23 +17,30 @@ from .render import (IRDRender,
                      EndpointCostRender,
                      EntityPropRender,
                      TIPSRender,
+                     EventStreamRender,
                      EndpointCostParser,
                      EntityPropParser,
                      TIPSParser)
+from .exceptions import ALTOParseError
+from .schema import check_field_value, get_request_params, require_field
+from .utils import etag_matches
 
 from alto.server.components.backend import (IRDService,
                                             PathVectorService,
                                             TIPSControlService,
                                             MockService)
 from alto.config import Config
-from alto.utils import load_class, setup_debug_db
+from alto.utils import get_algorithm, setup_debug_db
 from alto.common.constants import (ALTO_CONTENT_TYPE_IRD,
                                    ALTO_CONTENT_TYPE_NM,
                                    ALTO_CONTENT_TYPE_CM,
                                    ALTO_CONTENT_TYPE_ECS,
                                    ALTO_CONTENT_TYPE_TIPS,
                                    ALTO_CONTENT_TYPE_TIPS_VIEW,
-                                   ALTO_CONTENT_TYPE_PROPMAP)
+                                   ALTO_CONTENT_TYPE_PROPMAP,
+                                   ALTO_PARAMETER_TYPE_ECS,
+                                   ALTO_PARAMETER_TYPE_PROPMAP,
+                                   ALTO_PARAMETER_TYPE_TIPS)
 
 
 config = Config()
@@ -49,11 +62,30 @@ class IRDView(APIView):
 
     def get(self, request):
         base_uri = request.build_absolute_uri('/')
-        content = self.algorithm.list_resources(self.resource_id, default_base_uri=base_uri)
-        return Response(content, content_type=self.content_type)
+        content, etag = self.algorithm.get_directory(self.resource_id, default_base_uri=base_uri)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(content, content_type=self.content_type, headers={'ETag': etag})
 
 
-class NetworkMapView(APIView):
+class MapView(APIView):
+    """
+    Base ALTO view for maps served as a whole.
+    """
+
+    def get(self, request):
+        if not hasattr(self.algorithm, 'get_map'):
+            content = self.algorithm.lookup()
+            return Response(content, content_type=self.content_type)
+        # Precomputed maps are already serialized, skip the renderer
+        body, tag = self.algorithm.get_map()
+        etag = '"{}"'.format(tag)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return HttpResponse(body, content_type=self.content_type, headers={'ETag': etag})
+
+
+class NetworkMapView(MapView):
     """
     ALTO view for network map.
     """
@@ -63,13 +95,8 @@ class NetworkMapView(APIView):
     resource_id = ''
     content_type = ALTO_CONTENT_TYPE_NM
 
-    def get(self, request):
-        # TODO: Implement view for network map
-        content = self.algorithm.lookup()
-        return Response(content, content_type=self.content_type)
-
 
-class CostMapView(APIView):
+class CostMapView(MapView):
     """
     ALTO view for cost map.
     """
@@ -79,11 +106,6 @@ class CostMapView(APIView):
     resource_id = ''
     content_type = ALTO_CONTENT_TYPE_CM
 
-    def get(self, request):
-        # TODO: Implement view for network map
-        content = self.algorithm.lookup()
-        return Response(content, content_type=self.content_type)
-
 
 class EntityPropertyView(APIView):
     """
@@ -97,7 +119,7 @@ class EntityPropertyView(APIView):
     content_type = ALTO_CONTENT_TYPE_PROPMAP
 
     def post(self, request):
-        entities = request.data['entities']
+        entities = get_request_params(request, ALTO_PARAMETER_TYPE_PROPMAP)['entities']
         content = self.algorithm.lookup(entities)
         return Response(content, content_type=self.content_type)
 
@@ -122,14 +144,15 @@ class EndpointCostView(APIView):
         return ecmap
 
     def post(self, request):
-        endpoint_filter = request.data['endpoints']
-        srcs = endpoint_filter['srcs']
-        dsts = endpoint_filter['dsts']
-        cost_type = request.data.get('cost-type')
+        post_data = get_request_params(request, ALTO_PARAMETER_TYPE_ECS)
+        endpoint_filter = require_field(post_data, 'endpoints')
+        srcs = endpoint_filter.get('srcs', [])
+        dsts = endpoint_filter.get('dsts', [])
+        cost_type = post_data.get('cost-type')
         if cost_type:
             self.safe_check(cost_type)
         content = self.algorithm.lookup(srcs, dsts, cost_type)
-        constraints = request.data.get('constraints')
+        constraints = post_data.get('constraints')
         if constraints:
             content = self.apply_constraints(content, constraints)
         return Response(content, content_type=self.content_type)
@@ -145,33 +168,60 @@ class PathVectorView(APIView):
     algorithm = PathVectorService(config.get_default_namespace())
     resource_id = ''
 
-    def get_flows(self, srcs, dsts):
+    def parse_endpoints(self, endpoints, field):
+        """
+        Get the addresses of the IP endpoints, without duplicates.
+
+        Parameters
+        ----------
+        endpoints : list
+            List of typed endpoint addresses, e.g., `ipv4:192.0.2.1`.
+        field : str
+            Path of the endpoints in the request, for error reporting.
+
+        Returns
+        -------
+        addrs : list
+            List of addresses, in the order of `endpoints`.
+
+        Raises
+        ------
+        ALTOParseError
+            If an endpoint is not a typed IPv4 or IPv6 address.
+        """
+        addrs = dict()
+        for endpoint in endpoints:
+            addr_type, sep, addr = endpoint.partition(':')
+            if not sep or not addr or addr_type not in ('ipv4', 'ipv6'):
+                raise ALTOParseError('E_INVALID_FIELD_VALUE', field=field, value=endpoint,
+                                     detail='{} must be typed IP addresses'.format(field))
+            addrs[addr] = None
+        return list(addrs)
+
+    def get_flows(self, srcs, dsts, field='endpoints'):
         """
         Get full mesh flows of srcs x dsts.
 
+        The endpoints are parsed and validated once, before any flow is
+        generated, and the flows are generated lazily, grouped by source.
+
         Parameters
         ----------
         srcs : list
             List of source endpoints.
         dsts : list
             List of destination endpoints.
+        field : str
+            Path of the endpoint filter in the request.
 
         Returns
         -------
-        flows : list
-            List of `(src, dst)` pairs for full mesh of srcs x dsts.
+        flows : iterator
+            `(src, dst)` pairs for full mesh of srcs x dsts.
         """
-        flows = set()
-        for src in srcs:
-            src_type, src_addr = src.split(':', 1)
-            if src_type not in ['ipv4', 'ipv6']:
-                continue
-            for dst in dsts:
-                dst_type, dst_addr = dst.split(':', 1)
-                if dst_type not in ['ipv4', 'ipv6']:
-                    continue
-                flows.add((src_addr, dst_addr))
-        return flows
+        src_addrs = self.parse_endpoints(srcs, '{}/srcs'.format(field))
+        dst_addrs = self.parse_endpoints(dsts, '{}/dsts'.format(field))
+        return ((src_addr, dst_addr) for src_addr in src_addrs for dst_addr in dst_addrs)
 
     def get_params(self, post_data):
         """
@@ -184,27 +234,27 @@ class PathVectorView(APIView):
 
         Returns
         -------
-        flows : list
-            List of `(src, dst)` pairs.
+        flows : iterator
+            `(src, dst)` pairs.
         prop_names : list
             List of property names.
         cost_type : dict
             Cost type in the dictionary format.
         """
         if 'endpoints' in post_data:
-            srcs = post_data['endpoints']['srcs']
-            dsts = post_data['endpoints']['dsts']
-            flows = self.get_flows(srcs, dsts)
+            endpoint_filter = post_data['endpoints']
+            flows = self.get_flows(endpoint_filter.get('srcs', []), endpoint_filter.get('dsts', []))
         elif 'endpoint-flows' in post_data:
-            flows = set()
-            for spec in post_data['endpoint-flows']:
-                srcs, dsts = spec['srcs'], spec['dsts']
-                flows |= self.get_flows(srcs, dsts)
+            flows = itertools.chain.from_iterable([self.get_flows(spec.get('srcs', []),
+                                                                  spec.get('dsts', []),
+                                                                  'endpoint-flows')
+                                                   for spec in post_data['endpoint-flows']])
+        else:
+            require_field(post_data, 'endpoints')
 
-        assert 'cost-type' in post_data
-        cost_type = post_data['cost-type']
-        assert cost_type['cost-mode'] == 'array'
-        assert cost_type['cost-metric'] == 'ane-path'
+        cost_type = require_field(post_data, 'cost-type')
+        check_field_value('cost-type/cost-mode', cost_type['cost-mode'], ['array'])
+        check_field_value('cost-type/cost-metric', cost_type['cost-metric'], ['ane-path'])
 
         if 'ane-property-names' in post_data:
             prop_names = post_data['ane-property-names']
@@ -219,8 +269,8 @@ class PathVectorView(APIView):
 
         Parameters
         ----------
-        flows : list
-            List of `(src, dst)` pairs.
+        flows : iterable
+            `(src, dst)` pairs.
         prop_names : list
             List of property names.
         cost_type : dict
@@ -263,7 +313,6 @@ class PathVectorView(APIView):
             ane_name = '.ane:%s' % (ane)
             ane_props = link_map[ane]
             props = prop_names if len(prop_names) > 0 else ane_props.keys()
-            print(props)
             property_map[ane_name] = {pn: ane_props[pn] for pn in props if ane_props.get(pn) is not None}
         data['property-map'] = property_map
 
@@ -272,14 +321,16 @@ class PathVectorView(APIView):
         return [ ecs_part, prop_part ]
 
     def post(self, request):
-        post_data = dict(request.data)
-        content_type = self.renderer_classes[0]().get_context_type()
+        post_data = get_request_params(request, ALTO_PARAMETER_TYPE_ECS)
         host_name = request.get_host()
 
         flows, prop_names, cost_type = self.get_params(post_data)
 
         content = self.get_content(flows, prop_names, cost_type, host_name)
-        return Response(content, content_type=content_type)
+        render = self.renderer_classes[0]()
+        boundary = render.get_boundary(content)
+        return StreamingHttpResponse(render.stream(content, boundary),
+                                     content_type=render.get_context_type(boundary))
 
 
 class TIPSView(APIView):
@@ -294,7 +345,7 @@ class TIPSView(APIView):
     content_type = ALTO_CONTENT_TYPE_TIPS
 
     def post(self, request):
-        post_data = dict(request.data)
+        post_data = get_request_params(request, ALTO_PARAMETER_TYPE_TIPS)
         client_id = 'public'
         if request.user.is_authenticated:
             client_id = request.user.get_username()
@@ -343,22 +394,123 @@ class TIPSDataTransferView(APIView):
     resource_id = ''
     content_type = ALTO_CONTENT_TYPE_TIPS
 
-    def get(self, request, resource_id=None, digest=None, start_seq=None, end_seq=None):
-        content, media_type = self.algorithm.get_tips_data(resource_id, digest, start_seq, end_seq)
-        if content is None:
+    def get(self, request, resource_id=None, digest=None, start_seq=None, end_seq=None,
+            catchup=False):
+        if catchup:
+            return self.catchup(request, resource_id, digest, start_seq, end_seq)
+        # Serve the stored bytes as they are, without decoding and rendering
+        edge = self.algorithm.get_tips_edge(resource_id, digest, start_seq, end_seq)
+        if edge is None:
+            raise NotFound()
+        etag = '"{}"'.format(edge['tag'])
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        data = self.algorithm.get_tips_payload(resource_id, digest, start_seq, end_seq)
+        if data is None:
             raise NotFound()
             # return Response(dict(), status=404, content_type=ALTO_CONTENT_TYPE_ERROR)
-        return Response(content, content_type=media_type)
+        response = HttpResponse(data, content_type=edge['media-type'])
+        response['ETag'] = etag
+        response['Content-Length'] = len(data)
+        return response
 
+    def catchup(self, request, resource_id, digest, start_seq, end_seq):
+        """
+        Update a client from version `start_seq` to `end_seq` in a single
+        response, composing the cheapest path of stored patches, or with the
+        snapshot if it is smaller.
+        """
+        edges = self.algorithm.get_catchup_edges(resource_id, digest, start_seq, end_seq)
+        if edges is None:
+            raise NotFound()
+        # The payload decides which edges are served: a patch which cannot be
+        # composed falls back to the snapshot, whose ETag the client sends back
+        data, edges = self.algorithm.get_catchup_payload(resource_id, digest, edges)
+        if data is None:
+            raise NotFound()
+        etag = self.get_catchup_etag(edges)
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        response = HttpResponse(data, content_type=edges[-1][2]['media-type'])
+        response['ETag'] = etag
+        response['Content-Length'] = len(data)
+        if len(edges) == 1:
+            # FIXME: the path root '/tips' SHOULD NOT be hardcoded
+            response['Content-Location'] = '/tips/{}/{}/ug/{}/{}'.format(
+                resource_id, digest, edges[0][0], edges[0][1])
+        return response
+
+    @staticmethod
+    def get_catchup_etag(edges):
+        if len(edges) == 1:
+            return '"{}"'.format(edges[0][2]['tag'])
+        tags = ','.join(edge['tag'] for _, _, edge in edges)
+        return '"{}"'.format(hashlib.sha1(tags.encode()).hexdigest())
+
+
+class TIPSPushView(APIView):
+    """
+    ALTO view for TIPS server push.
 
-def get_view(resource_type, resource_id, namespace, algorithm=None, params=dict()):
+    Clients get notified of the next edge of a TIPS view either by long
+    polling, or by a stream of server-sent events.
+    """
+    renderer_classes = [TIPSRender, EventStreamRender]
+
+    algorithm = None # TIPSControlService(config.get_default_namespace())
+    resource_id = ''
+    content_type = ALTO_CONTENT_TYPE_TIPS_VIEW
+    timeout = config.get_vcs_push_timeout()
+    stream_duration = config.get_vcs_push_stream_duration()
+
+    def get(self, request, resource_id=None, digest=None, seq=None, stream=False):
+        if stream:
+            return self.stream(request, resource_id, digest, seq)
+        edge = self.algorithm.get_next_edge(resource_id, digest, seq, timeout=self.timeout)
+        if edge is None:
+            raise NotFound()
+        if not edge:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(edge, content_type=self.content_type)
+
+    def stream(self, request, resource_id, digest, seq):
+        last_event_id = request.META.get('HTTP_LAST_EVENT_ID')
+        if last_event_id and last_event_id.isdigit():
+            seq = int(last_event_id)
+        edge = self.algorithm.get_next_edge(resource_id, digest, seq, timeout=0)
+        if edge is None:
+            raise NotFound()
+
+        def events(edge, seq):
+            deadline = time.time() + self.stream_duration
+            while edge is not None:
+                if edge:
+                    seq = edge['seq-j']
+                    yield 'id: {}\nevent: edge\ndata: {}\n\n'.format(seq, json.dumps(edge))
+                else:
+                    yield ': keep-alive\n\n'
+                timeout = min(self.timeout, deadline - time.time())
+                if timeout <= 0:
+                    return
+                edge = self.algorithm.get_next_edge(resource_id, digest, seq, timeout=timeout)
+
+        response = StreamingHttpResponse(events(edge, seq), content_type=EventStreamRender.media_type)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+def get_view(resource_type, resource_id, namespace, algorithm=None, params=None):
+    # `params` comes from the shared configuration, never modify it in place
+    params = dict(params or {})
     if resource_type == 'ird':
         view_cls = IRDView
     elif resource_type == 'network-map':
-        # TODO: Implement view for network map
         view_cls = NetworkMapView
     elif resource_type == 'cost-map':
-        # TODO: Implement view for cost map
         view_cls = CostMapView
     elif resource_type == 'endpoint-cost':
         view_cls = EndpointCostView
@@ -375,12 +527,14 @@ def get_view(resource_type, resource_id, namespace, algorithm=None, params=dict(
     elif resource_type == 'tips-data':
         view_cls = TIPSDataTransferView
         params['tips_resource_id'] = resource_id
+    elif resource_type == 'tips-push':
+        view_cls = TIPSPushView
+        params['tips_resource_id'] = resource_id
     else:
         return
     if algorithm:
-        alg_cls = load_class(algorithm)
         params['resource_id'] = resource_id
-        alg = alg_cls(namespace, **params)
+        alg = get_algorithm(algorithm, namespace, params)
         return view_cls.as_view(resource_id=resource_id, algorithm=alg)
     else:
         return view_cls.as_view(resource_id=resource_id)
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from alto.config import install_reload_signal_handler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alto.server.northbound.settings')
 
 application = get_wsgi_application()
+
+# Reload alto.conf on SIGHUP
+install_reload_signal_handler()
@@ -1,4 +1,6 @@
 import importlib
+import json
+from threading import Lock
 
 
 def load_class(class_path):
@@ -6,6 +8,42 @@ def load_class(class_path):
     pkg = importlib.import_module(pkg_name)
     return pkg.__getattribute__(cls_name)
 
+
+algorithms = dict()
+algorithms_lock = Lock()
+
+
+def get_algorithm(algorithm, namespace, params=None):
+    """
+    Get the shared instance of a backend algorithm.
+
+    The northbound views and the resource listeners of the version control
+    system call the same instance for the same configured resource.
+
+    Parameters
+    ----------
+    algorithm : str
+        Class path of the backend algorithm.
+    namespace : str
+        Namespace of the data broker.
+    params : dict or None
+        Keyword arguments to initialize the algorithm.
+
+    Returns
+    -------
+    alg : object
+        The backend algorithm instance.
+    """
+    params = params or dict()
+    key = (algorithm, namespace, json.dumps(params, sort_keys=True, default=str))
+    with algorithms_lock:
+        alg = algorithms.get(key)
+        if alg is None:
+            alg_cls = load_class(algorithm)
+            alg = algorithms[key] = alg_cls(namespace, **params)
+    return alg
+
+
 def setup_debug_db(config):
     from alto.server.components.db import data_broker_manager, ForwardingDB, EndpointDB, DelegateDB
 
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+
+import pytest
+from unittest import mock
+
+from alto.server.components.backend import GeoDistanceService
+
+__author__ = "OpenALTO"
+__copyright__ = "OpenALTO"
+__license__ = "MIT"
+
+
+TEST_GEOMAP = {
+    'ipv4:10.1.0.2': (31.224, 121.469),
+    'ipv4:10.2.0.2': (41.311, -72.93),
+    'ipv4:10.3.0.2': (46.234, 6.053),
+    'ipv4:10.4.0.2': None
+}
+
+
+def lookup_geodist(srcs, dsts, vectorized=True):
+    alg = GeoDistanceService('default', autoreload=False, vectorized=vectorized)
+    with mock.patch.object(alg, 'get_geomap', return_value=TEST_GEOMAP):
+        return alg.lookup(srcs, dsts, {'cost-mode': 'numerical', 'cost-metric': 'routingcost'})
+
+
+def test_geodist_vectorized():
+    pytest.importorskip('numpy')
+    srcs = ['ipv4:10.1.0.2', 'ipv4:10.4.0.2']
+    dsts = ['ipv4:10.2.0.2', 'ipv4:10.3.0.2', 'ipv4:10.4.0.2', 'ipv4:10.5.0.2']
+
+    scalar = lookup_geodist(srcs, dsts, vectorized=False)['endpoint-cost-map']
+    vectorized = lookup_geodist(srcs, dsts)['endpoint-cost-map']
+    assert list(vectorized.keys()) == ['ipv4:10.1.0.2']
+    assert list(vectorized['ipv4:10.1.0.2'].keys()) == ['ipv4:10.2.0.2', 'ipv4:10.3.0.2']
+    for d, cost in scalar['ipv4:10.1.0.2'].items():
+        assert vectorized['ipv4:10.1.0.2'][d] == pytest.approx(cost)
+
+
+@mock.patch.dict('sys.modules', {'numpy': None})
+def test_geodist_without_numpy():
+    costs = lookup_geodist(['ipv4:10.1.0.2'], ['ipv4:10.1.0.2', 'ipv4:10.2.0.2'])['endpoint-cost-map']
+    assert costs['ipv4:10.1.0.2']['ipv4:10.1.0.2'] == 0
+    assert costs['ipv4:10.1.0.2']['ipv4:10.2.0.2'] == pytest.approx(11880, rel=0.01)
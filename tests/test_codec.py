@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+
+import json
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from alto.common.codec import JSON_ENCODERS, get_json_encoder, iter_json
+from alto.common.error import NotSupportedError
+
+__author__ = "OpenALTO"
+__copyright__ = "OpenALTO"
+__license__ = "MIT"
+
+
+DATA = {
+    'meta': {'vtag': {'resource-id': 'networkmap', 'tag': 'd41d8cd98f00b204e9800998ecf8427e'}},
+    'cost-map': {'PID{}'.format(i): {'PID{}'.format(j): i * 0.5 + j for j in range(10)}
+                 for i in range(10)},
+    'network-map': {'PID1': {'ipv4': ['192.0.2.0/24'], 'ipv6': ['2001:db8::/32']}},
+    'unicode': 'café / 中文',
+    'flags': [True, False, None, 1, -2]
+}
+
+
+@pytest.mark.parametrize('name', JSON_ENCODERS + ['auto'])
+def test_json_encoders(name):
+    try:
+        encoder = get_json_encoder(name)
+    except ImportError:
+        pytest.skip('{} is not installed'.format(name))
+    data = encoder(DATA)
+    assert json.loads(data) == DATA
+    # Same output as the default renderer of the REST framework
+    assert data == JSONRenderer().render(DATA)
+    assert b''.join(iter_json(DATA, encoder=encoder)) == data
+
+
+def test_unknown_json_encoder():
+    with pytest.raises(NotSupportedError):
+        get_json_encoder('unknown')
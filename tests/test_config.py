@@ -101,3 +101,32 @@ def test_alto_config(*args):
 
     init_version = config.get_vcs_init_version()
     assert init_version == 100
+
+
+def test_alto_config_reload(tmp_path):
+    from alto.config import reload_config
+
+    location = tmp_path / 'alto.conf'
+    location.write_text('[server]\ndefault_namespace = ns1\nresources = {"a": {}}\n')
+    with mock.patch.dict(os.environ, {'ALTO_CONFIG': str(location)}):
+        config = Config()
+        assert config.get_default_namespace() == 'ns1'
+        resources = config.get_configured_resources()
+        version = config.get_version()
+
+        # Parsed once and shared by all the instances
+        assert Config().get_configured_resources() is resources
+        assert Config().get_version() == version
+
+        # Reloaded once the file changes
+        location.write_text('[server]\ndefault_namespace = ns2\nresources = {"a": {}, "b": {}}\n')
+        st = location.stat()
+        os.utime(location, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        assert config.get_default_namespace() == 'ns2'
+        assert len(config.get_configured_resources()) == 2
+        assert config.get_version() == version + 1
+
+        # Reloaded on request (e.g., SIGHUP)
+        reload_config()
+        assert config.get_version() == version + 2
+        assert config.get_version() == version + 2
@@ -121,6 +121,22 @@ def test_databroker():
     for endpoint in endpoints:
         assert geomap[endpoint] == MOCK_GEOIP2_DB.get(endpoint, (0.0, 0.0))
 
+    # Test reusing delegated data source instances
+    data_source = db.get_data_source('local_db_geoip_agent')
+    assert db.lookup('local_db_geoip_agent', endpoints) == geomap
+    db.build_cache()
+    assert db.get_data_source('local_db_geoip_agent') is data_source
+
+    db_trans = db.new_transaction()
+    data_source_config['db_path'] = '/opt/test2.mmdb'
+    db_trans.add_data_source('local_db_geoip_agent', **data_source_config)
+    db_trans.commit()
+
+    db.build_cache()
+    new_data_source = db.get_data_source('local_db_geoip_agent')
+    assert new_data_source is not data_source
+    assert new_data_source.db_path == '/opt/test2.mmdb'
+
     # Test geoip2 data source agent using local db
     db_trans = db.new_transaction()
     data_source_config = {
@@ -136,3 +152,104 @@ def test_databroker():
     geomap = db.lookup('webservice_geoip_agent', endpoints)
     for endpoint in endpoints:
         assert geomap[endpoint] == MOCK_GEOIP2_DB.get(endpoint, (0.0, 0.0))
+
+
+def test_delegate_release():
+    db = DelegateDB(namespace='release', backend='local')
+    db_trans = db.new_transaction()
+    db_trans.add_data_source('mock', data_source_cls='unittest.mock.MagicMock', name='v1')
+    db_trans.commit()
+    db.build_cache()
+
+    # A replaced instance is closed once the in-flight lookup is finished
+    data_source = db._acquire_data_source('mock')
+    db_trans = db.new_transaction()
+    db_trans.add_data_source('mock', data_source_cls='unittest.mock.MagicMock', name='v2')
+    db_trans.commit()
+    db.build_cache()
+    assert not data_source.close.called
+    assert db.get_data_source('mock') is not data_source
+    db._release_data_source(data_source)
+    assert data_source.close.called
+
+    # A removed data source is released as well
+    data_source = db.get_data_source('mock')
+    db_trans = db.new_transaction()
+    db_trans._pipe.delete(*db._backend.scan_iter(prefix='release:delegate:mock:'))
+    db_trans.commit()
+    db.build_cache()
+    assert data_source.close.called
+    assert db.lookup('mock') is None
+
+
+@mock.patch.dict('sys.modules', {'geoip2.database': mockGeoIP2,
+                                 'geoip2.webservice': mockGeoIP2})
+def test_geoip_cache():
+    from alto.agent.geoip import GeoipAgent
+
+    agent = GeoipAgent(db_path='/opt/test-cache.mmdb', cache_size=2, cache_network=True)
+    agent.cache.clear()
+    with mock.patch.object(mockGeoIP2.Reader, 'city', autospec=True,
+                           side_effect=lambda _, e: mockGeoIP2.GeoInfo.from_db(e)) as city:
+        geomap = agent.lookup(['10.1.0.2', '10.2.0.2'])
+        assert city.call_count == 2
+        assert geomap['10.1.0.2'] == MOCK_GEOIP2_DB['10.1.0.2']
+
+        # Repeated lookups and addresses in a cached network hit the cache,
+        # even from a re-created agent of the same data source
+        agent = GeoipAgent(db_path='/opt/test-cache.mmdb', cache_size=2, cache_network=True)
+        geomap = agent.lookup(['10.1.0.2', '10.1.0.100', '10.2.0.2'])
+        assert city.call_count == 2
+        assert geomap['10.1.0.100'] == MOCK_GEOIP2_DB['10.1.0.2']
+
+        # The cache is bounded
+        agent.lookup(['10.3.0.2', '10.4.0.2'])
+        assert city.call_count == 4
+        agent.lookup(['10.1.0.2'])
+        assert city.call_count == 5
+
+    # Agents with other cache settings do not replace the shared cache
+    other = GeoipAgent(db_path='/opt/test-cache.mmdb', cache_size=8, cache_network=True)
+    assert other.cache is not agent.cache
+    assert GeoipAgent(db_path='/opt/test-cache.mmdb', cache_size=2).cache is agent.cache
+
+
+@mock.patch.dict('sys.modules', {'geoip2.database': mockGeoIP2,
+                                 'geoip2.webservice': mockGeoIP2})
+def test_geoip_concurrent_lookup():
+    import time
+    from alto.agent.geoip import GeoipAgent
+
+    def slow_city(_, endpoint):
+        if endpoint == '10.3.0.2':
+            time.sleep(1)
+        return mockGeoIP2.GeoInfo.from_db(endpoint)
+
+    agent = GeoipAgent(account_id='test-concurrent', license_key='secret', max_concurrency=4)
+    with mock.patch.object(mockGeoIP2.Client, 'city', autospec=True, side_effect=slow_city):
+        start = time.time()
+        geomap = agent.lookup(['10.1.0.2', '10.2.0.2', '10.3.0.2'], timeout=0.3)
+        assert time.time() - start < 1
+        assert geomap == {e: MOCK_GEOIP2_DB[e] for e in ['10.1.0.2', '10.2.0.2']}
+
+        # The late lookup still fills the cache
+        time.sleep(1)
+        assert agent.lookup(['10.3.0.2'], timeout=0.3) == {'10.3.0.2': (0.0, 0.0)}
+
+        # A single slow lookup is bounded by the deadline as well
+        agent.cache.clear()
+        start = time.time()
+        assert agent.lookup(['10.3.0.2', '10.3.0.2'], timeout=0.3) == dict()
+        assert time.time() - start < 1
+        time.sleep(1)
+
+    def failing_city(_, endpoint):
+        if endpoint == '10.2.0.2':
+            raise ValueError(endpoint)
+        return mockGeoIP2.GeoInfo.from_db(endpoint)
+
+    # Failed lookups are omitted, and the others are still returned
+    agent.cache.clear()
+    with mock.patch.object(mockGeoIP2.Client, 'city', autospec=True, side_effect=failing_city):
+        assert agent.lookup(['10.1.0.2', '10.2.0.2']) == {'10.1.0.2': MOCK_GEOIP2_DB['10.1.0.2']}
+    agent.close()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# The MIT License (MIT)
+#
+# Copyright (c) 2024 OpenALTO Community
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# Authors:
+
+
+import copy
+import random
+
+import json_merge_patch
+import jsonpatch
+
+from alto.common.constants import Diff
+from alto.server.components.diff import compose_patches, create_patch
+
+__author__ = "OpenALTO"
+__copyright__ = "OpenALTO"
+__license__ = "MIT"
+
+
+def random_costmap(n, seed):
+    rand = random.Random(seed)
+    pids = ['PID{}'.format(i) for i in range(n)] + ['PID/~{}'.format(n)]
+    return {
+        'meta': {
+            'dependent-vtags': [{'resource-id': 'networkmap', 'tag': str(seed)}],
+            'cost-type': {'cost-mode': 'numerical', 'cost-metric': 'routingcost'}
+        },
+        'cost-map': {src: {dst: rand.randint(1, 5) for dst in pids if rand.random() > 0.1}
+                     for src in pids if rand.random() > 0.1}
+    }
+
+
+def random_networkmap(n, seed):
+    rand = random.Random(seed)
+    return {
+        'meta': {'vtag': {'resource-id': 'networkmap', 'tag': str(seed)}},
+        'network-map': {'PID{}'.format(i): {'ipv4': ['10.{}.{}.0/24'.format(i, j)
+                                                     for j in range(rand.randint(0, 3))]}
+                        for i in range(n) if rand.random() > 0.1}
+    }
+
+
+def test_merge_patch():
+    for gen in [random_costmap, random_networkmap]:
+        for seed in range(5):
+            old, new = gen(20, seed), gen(20, seed + 1)
+            patch = create_patch(old, new, Diff.JSON_MERGE_PATCH)
+            assert patch == json_merge_patch.create_patch(old, new)
+            assert json_merge_patch.merge(copy.deepcopy(old), patch) == new
+            assert create_patch(old, copy.deepcopy(old), Diff.JSON_MERGE_PATCH) == {}
+
+
+def test_json_patch():
+    for gen in [random_costmap, random_networkmap]:
+        for seed in range(5):
+            old, new = gen(20, seed), gen(20, seed + 1)
+            patch = create_patch(old, new, Diff.JSON_PATCH)
+            assert {op['op'] for op in patch} <= {'add', 'remove', 'replace'}
+            assert jsonpatch.apply_patch(old, patch) == new
+            assert create_patch(old, copy.deepcopy(old), Diff.JSON_PATCH) == []
+
+
+def test_compose_patches():
+    for gen in [random_costmap, random_networkmap]:
+        docs = [gen(20, seed) for seed in range(5)]
+        for diff_format in [Diff.JSON_PATCH, Diff.JSON_MERGE_PATCH]:
+            patches = [create_patch(old, new, diff_format) for old, new in zip(docs, docs[1:])]
+            patch = compose_patches(patches, diff_format)
+            if diff_format == Diff.JSON_PATCH:
+                assert jsonpatch.apply_patch(docs[0], patch) == docs[-1]
+            elif patch is not None:
+                # Rows removed and added back cannot be merge patched at once
+                assert json_merge_patch.merge(copy.deepcopy(docs[0]), patch) == docs[-1]
+
+    # Costs updated and removed, but no row removed
+    docs = [random_costmap(20, 0)]
+    rand = random.Random(0)
+    for _ in range(4):
+        doc = copy.deepcopy(docs[-1])
+        for row in doc['cost-map'].values():
+            dst = rand.choice(list(row))
+            if rand.random() > 0.5 and len(row) > 1:
+                del row[dst]
+            else:
+                row[dst] = rand.randint(6, 9)
+        docs.append(doc)
+    patches = [create_patch(old, new, Diff.JSON_MERGE_PATCH) for old, new in zip(docs, docs[1:])]
+    patch = compose_patches(patches, Diff.JSON_MERGE_PATCH)
+    assert json_merge_patch.merge(copy.deepcopy(docs[0]), patch) == docs[-1]
+
+    # A removed object cannot be patched again by a merge patch
+    patches = [{'cost-map': {'PID1': None}}, {'cost-map': {'PID1': {'PID2': 1}}}]
+    assert compose_patches(patches, Diff.JSON_MERGE_PATCH) is None
+    patches = [{'cost-map': {'PID1': {'PID2': None}}}, {'cost-map': {'PID1': {'PID3': 1}}}]
+    assert compose_patches(patches, Diff.JSON_MERGE_PATCH) == {'cost-map': {'PID1': {'PID2': None, 'PID3': 1}}}
@@ -46,6 +46,7 @@ from alto.model.rfc9275 import ALTOPathVector
 from alto.utils import setup_debug_db, load_class
 from alto.common.constants import (ALTO_CONTENT_TYPE_IRD,
                                    ALTO_CONTENT_TYPE_NM,
+                                   ALTO_CONTENT_TYPE_CM,
                                    ALTO_CONTENT_TYPE_ECS,
                                    ALTO_CONTENT_TYPE_ECS_PV,
                                    ALTO_CONTENT_TYPE_PROPMAP,
@@ -75,6 +76,10 @@ TEST_ROUTES = [
         'path': '/networkmap/dynamic-networkmap',
         'view': 'alto.server.northbound.alto.views.NetworkMapView'
     },
+    {
+        'path': '/costmap/pid-costmap',
+        'view': 'alto.server.northbound.alto.views.CostMapView'
+    },
     {
         'path': '/tips-control/updates-graph',
         'view': 'alto.server.northbound.alto.views.TIPSView'
@@ -138,8 +143,10 @@ class ALTONorthboundTest(TestCase):
 
     @classmethod
     def tearDownClass(cls) -> None:
-        from alto.server.components.vcs import vcs_singleton
-        vcs_singleton.stop()
+        from alto.server.components.vcs import get_vcs
+        vcs = get_vcs(create=False)
+        if vcs is not None:
+            vcs.stop()
         return super().tearDownClass()
 
     @classmethod
@@ -163,8 +170,9 @@ class ALTONorthboundTest(TestCase):
         fib_trans.commit()
 
         eb_trans = eb.new_transaction()
-        eb_trans.add_property('10.1.0.0/24', {'is_local': True, 'dpid': 's1'})
+        eb_trans.add_property('10.1.0.0/24', {'is_local': True, 'dpid': 's1', 'pid': 'PID1'})
         eb_trans.add_property('10.0.0.2', {'dpid': 's2'})
+        eb_trans.add_property('10.2.0.0/24', {'pid': 'PID2'})
         eb_trans.commit()
 
         db_trans = db.new_transaction()
@@ -185,7 +193,7 @@ class ALTONorthboundTest(TestCase):
         tips_resources = [r for r in resources if resources[r]['type'] == 'tips']
 
         urls = show_urls(get_resolver().url_patterns)
-        assert len(urls) == len(resources) + 1 + len(tips_resources) * 4 + 1
+        assert len(urls) == len(resources) + 1 + len(tips_resources) * 7 + 1
 
         for route in TEST_ROUTES:
             perform_route_test(route)
@@ -202,6 +210,21 @@ class ALTONorthboundTest(TestCase):
         resources = self.config.get_configured_resources()
         self.assertEqual(len(ird['resources']), len(resources) - 1)
 
+        etag = response.get('ETag')
+        self.assertIsNotNone(etag)
+        response = self.client.get('/directory/directory',
+                                   accepts=ALTO_CONTENT_TYPE_IRD,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get('ETag'), etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get('/directory/directory',
+                                   accepts=ALTO_CONTENT_TYPE_IRD,
+                                   HTTP_IF_NONE_MATCH='"outdated"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ird)
+
 
     def test_view_networkmap(self):
         response = self.client.get('/networkmap/dynamic-networkmap',
@@ -211,6 +234,160 @@ class ALTONorthboundTest(TestCase):
         self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_NM)
 
 
+    def set_pids(self, pids):
+        eb = data_broker_manager.get('default', db_type='endpoint')
+        eb_trans = eb.new_transaction()
+        for prefix, pid in pids.items():
+            eb_trans.add_property(prefix, {'pid': pid})
+        eb_trans.commit()
+
+
+    def get_modified(self, path, accepts, etag, timeout=5):
+        # Maps are rebuilt in the background, and the previous map is served
+        # until then
+        deadline = time.time() + timeout
+        while True:
+            response = self.client.get(path, accepts=accepts, HTTP_IF_NONE_MATCH=etag)
+            if response.status_code != 304 or time.time() > deadline:
+                return response
+            time.sleep(0.1)
+
+
+    def test_view_precomputed_maps(self):
+        response = self.client.get('/networkmap/pid-networkmap',
+                                   accepts=ALTO_CONTENT_TYPE_NM)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_NM)
+        nmap = response.json()
+        self.assertEqual(nmap['network-map'], {'PID1': {'ipv4': ['10.1.0.0/24']},
+                                               'PID2': {'ipv4': ['10.2.0.0/24']}})
+        nm_etag = response.get('ETag')
+        self.assertEqual(nm_etag, '"{}"'.format(nmap['meta']['vtag']['tag']))
+        response = self.client.get('/networkmap/pid-networkmap',
+                                   accepts=ALTO_CONTENT_TYPE_NM,
+                                   HTTP_IF_NONE_MATCH=nm_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get('/costmap/pid-costmap',
+                                   accepts=ALTO_CONTENT_TYPE_CM)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_CM)
+        cmap = response.json()
+        self.assertEqual(cmap['meta']['dependent-vtags'], [nmap['meta']['vtag']])
+        self.assertEqual(cmap['meta']['cost-type']['cost-metric'], 'routingcost')
+        # 2 forwarding devices and 2 AS hops from PID1, PID2 is not attached
+        self.assertEqual(cmap['cost-map'], {'PID1': {'PID1': 0, 'PID2': 4},
+                                            'PID2': {'PID2': 0}})
+        cm_etag = response.get('ETag')
+        response = self.client.get('/costmap/pid-costmap',
+                                   accepts=ALTO_CONTENT_TYPE_CM,
+                                   HTTP_IF_NONE_MATCH=cm_etag)
+        self.assertEqual(response.status_code, 304)
+
+        try:
+            self.set_pids({'10.1.0.0/24': 'PID1', '10.2.0.0/24': 'PID2', '10.3.0.0/24': 'PID3'})
+            response = self.get_modified('/networkmap/pid-networkmap', ALTO_CONTENT_TYPE_NM, nm_etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('PID3', response.json()['network-map'])
+            response = self.get_modified('/costmap/pid-costmap', ALTO_CONTENT_TYPE_CM, cm_etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['cost-map']['PID3'], {'PID3': 0})
+            cm_etag = response.get('ETag')
+
+            # A stale map is served while another thread rebuilds it
+            algorithm = resolve('/costmap/pid-costmap').func.view_initkwargs['algorithm']
+            algorithm._lock.acquire()
+            try:
+                self.set_pids({'10.1.0.0/24': 'PID1', '10.2.0.0/24': 'PID2'})
+                response = self.client.get('/costmap/pid-costmap',
+                                           accepts=ALTO_CONTENT_TYPE_CM,
+                                           HTTP_IF_NONE_MATCH=cm_etag)
+                self.assertEqual(response.status_code, 304)
+            finally:
+                algorithm._lock.release()
+        finally:
+            self.set_pids({'10.1.0.0/24': 'PID1', '10.2.0.0/24': 'PID2'})
+        response = self.get_modified('/costmap/pid-costmap', ALTO_CONTENT_TYPE_CM, cm_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('PID3', response.json()['cost-map'])
+
+
+    def test_precomputed_map_refresh(self):
+        import threading
+        algorithm = resolve('/costmap/pid-costmap').func.view_initkwargs['algorithm']
+        response = self.client.get('/costmap/pid-costmap', accepts=ALTO_CONTENT_TYPE_CM)
+        self.assertEqual(response.status_code, 200)
+        cm_etag = response.get('ETag')
+
+        def count_refreshers():
+            return sum(1 for thread in threading.enumerate()
+                       if thread.name == 'refresh-{}'.format(algorithm.resource_id))
+
+        try:
+            # Bursts of commits are coalesced by a single refresher, and a
+            # failed rebuild is retried on the next request
+            with mock.patch.object(algorithm, 'build', side_effect=RuntimeError):
+                for i in range(10):
+                    self.set_pids({'10.1.0.0/24': 'PID1', '10.2.0.0/24': 'PID2',
+                                   '10.3.0.0/24': 'PID{}'.format(i + 3)})
+                    self.assertLessEqual(count_refreshers(), 1)
+                for _ in range(50):
+                    if not count_refreshers():
+                        break
+                    time.sleep(0.1)
+                response = self.client.get('/costmap/pid-costmap',
+                                           accepts=ALTO_CONTENT_TYPE_CM,
+                                           HTTP_IF_NONE_MATCH=cm_etag)
+                self.assertEqual(response.status_code, 304)
+            response = self.get_modified('/costmap/pid-costmap', ALTO_CONTENT_TYPE_CM, cm_etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('PID12', response.json()['cost-map'])
+            cm_etag = response.get('ETag')
+        finally:
+            self.set_pids({'10.1.0.0/24': 'PID1', '10.2.0.0/24': 'PID2'})
+        response = self.get_modified('/costmap/pid-costmap', ALTO_CONTENT_TYPE_CM, cm_etag)
+        self.assertNotIn('PID12', response.json()['cost-map'])
+
+
+    def test_pv_flows(self):
+        from alto.server.northbound.alto.views import PathVectorView
+        view = PathVectorView()
+        flows = view.get_flows(['ipv4:10.1.0.2', 'ipv6:2001:db8::1', 'ipv4:10.1.0.2'],
+                               ['ipv4:10.2.0.2', 'ipv4:10.3.0.2'])
+        self.assertNotIsInstance(flows, (list, set))
+        self.assertListEqual(list(flows), [('10.1.0.2', '10.2.0.2'), ('10.1.0.2', '10.3.0.2'),
+                                           ('2001:db8::1', '10.2.0.2'), ('2001:db8::1', '10.3.0.2')])
+
+        # Invalid endpoints are rejected before any flow is generated
+        from alto.server.northbound.alto.exceptions import ALTOParseError
+        with self.assertRaises(ALTOParseError):
+            view.get_flows(['ipv4:10.1.0.2'], ['ipv4:10.2.0.2', 'pid:PID1'])
+
+
+    def test_multipart_stream(self):
+        from alto.server.northbound.alto.render import MultiPartRelatedRender
+        data = {'meta': {'vtag': {'tag': '1'}},
+                'endpoint-cost-map': {'10.1.0.{}'.format(i): {'10.2.0.2': ['ane:{}'.format(i)]}
+                                      for i in range(100)}}
+
+        render = MultiPartRelatedRender()
+        render.chunk_size = 256
+        parts = [{'Content-Type': ALTO_CONTENT_TYPE_ECS, 'Content-ID': '<ecs@localhost>', 'data': data}]
+        boundary = render.get_boundary(parts)
+        self.assertNotEqual(boundary, render.BOUNDARY)
+        chunks = list(render.stream(parts, boundary))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode(), '\r\n'.join([
+            '--{}'.format(boundary),
+            'Content-Type: {}'.format(ALTO_CONTENT_TYPE_ECS),
+            'Content-ID: <ecs@localhost>',
+            '',
+            render.get_encoder()(data).decode(),
+            '--{}--'.format(boundary),
+            '']))
+
+
     def test_view_pv(self):
         response = self.client.post('/pathvector/pv',
                                     data=json.dumps({
@@ -241,7 +418,7 @@ class ALTONorthboundTest(TestCase):
         pv.boundary = content_type_params.get('boundary')
         if 'charset' in content_type_params:
             pv.charset = content_type_params.get('charset')
-        pv.from_payload(response.content.decode())
+        pv.from_payload(b''.join(response.streaming_content).decode())
 
         self.assertTrue('10.1.0.2' in pv.ecmap_)
         self.assertTrue(len(pv.anepm_) > 0)
@@ -322,6 +499,11 @@ class ALTONorthboundTest(TestCase):
 
         time.sleep(5)
 
+        # Freeze the update graph, so that no edge is compacted while it is
+        # being checked
+        from alto.server.components.vcs import get_vcs
+        get_vcs().scheduler.stop()
+
         response = self.client.get('{}/meta'.format(uri), accepts=ALTO_CONTENT_TYPE_TIPS_VIEW)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.has_header('Content-Type'), True)
@@ -342,6 +524,13 @@ class ALTONorthboundTest(TestCase):
                     self.assertEqual(response.status_code, 200)
                     self.assertEqual(response.has_header('Content-Type'), True)
                     self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_NM)
+                    self.assertEqual(response.get('Content-Length'), str(len(response.content)))
+                    etag = response.get('ETag')
+                    self.assertEqual(etag, '"{}"'.format(updates_graph[start_seq][end_seq]['tag']))
+                    response = self.client.get('{}/ug/{}/{}'.format(uri, start_seq, end_seq),
+                                               accepts=ALTO_CONTENT_TYPE_NM,
+                                               HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304)
                 else:
                     self.assertEqual(updates_graph[start_seq][end_seq]['media-type'],
                                      'application/merge-patch+json')
@@ -351,6 +540,55 @@ class ALTONorthboundTest(TestCase):
                     self.assertEqual(response.has_header('Content-Type'), True)
                     self.assertEqual(response.get('Content-Type'), 'application/merge-patch+json')
 
+        # Catch up from the oldest version to the latest one at once
+        versions = sorted(int(end_seq) for end_seqs in updates_graph.values() for end_seq in end_seqs)
+        for start_seq in [versions[0], 0]:
+            response = self.client.get('{}/catchup/{}/{}'.format(uri, start_seq, versions[-1]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get('Content-Length'), str(len(response.content)))
+            etag = response.get('ETag')
+            response = self.client.get('{}/catchup/{}/{}'.format(uri, start_seq, versions[-1]),
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        # Patches which cannot be composed fall back to the snapshot, whose
+        # ETag is revalidated as well
+        from alto.server.components.backend import TIPSControlService
+        chain, seq = [], str(versions[0])
+        while seq != str(versions[-1]):
+            next_seq = min(updates_graph[seq], key=int)
+            chain.append((int(seq), int(next_seq), updates_graph[seq][next_seq]))
+            seq = next_seq
+        self.assertGreater(len(chain), 1)
+        with mock.patch.object(TIPSControlService, 'get_catchup_edges', return_value=chain), \
+                mock.patch('alto.server.components.backend.compose_patches', return_value=None):
+            response = self.client.get('{}/catchup/{}/{}'.format(uri, versions[0], versions[-1]))
+            self.assertEqual(response.status_code, 200)
+            etag = response.get('ETag')
+            response = self.client.get('{}/catchup/{}/{}'.format(uri, versions[0], versions[-1]),
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.get('ETag'), etag)
+        response = self.client.get('{}/catchup/{}/{}'.format(uri, versions[-1], versions[-1] + 1000))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('{}/push/0'.format(uri), accepts=ALTO_CONTENT_TYPE_TIPS_VIEW)
+        self.assertEqual(response.status_code, 200)
+        edge = response.json()
+        self.assertEqual(edge['seq-i'], 0)
+        self.assertIn(str(edge['seq-j']), updates_graph['0'])
+
+        response = self.client.get('{}/push/0/events'.format(uri), accepts='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get('Content-Type'), 'text/event-stream')
+        event = next(iter(response.streaming_content)).decode()
+        self.assertIn('event: edge', event)
+        self.assertIn('id: {}'.format(edge['seq-j']), event)
+        response.close()
+
+        response = self.client.get('/tips/{}/unknown/push/0'.format(req_resource_id),
+                                   accepts=ALTO_CONTENT_TYPE_TIPS_VIEW)
+        self.assertEqual(response.status_code, 404)
+
 
     def test_error_unsupported_media_type(self):
         response = self.client.post('/entityprop/geoip',
@@ -368,6 +606,46 @@ class ALTONorthboundTest(TestCase):
         self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_ERROR)
 
 
+    def test_error_bad_request(self):
+        cases = [
+            ('/entityprop/geoip', ALTO_PARAMETER_TYPE_PROPMAP, '{"entities": [',
+             {'code': 'E_SYNTAX'}),
+            ('/entityprop/geoip', ALTO_PARAMETER_TYPE_PROPMAP, '{}',
+             {'code': 'E_MISSING_FIELD', 'field': 'entities'}),
+            ('/entityprop/geoip', ALTO_PARAMETER_TYPE_PROPMAP, '',
+             {'code': 'E_MISSING_FIELD', 'field': 'entities'}),
+            ('/entityprop/geoip', ALTO_PARAMETER_TYPE_PROPMAP, '{"entities": "ipv4:10.1.0.2"}',
+             {'code': 'E_INVALID_FIELD_TYPE', 'field': 'entities'}),
+            ('/pathvector/pv', ALTO_PARAMETER_TYPE_ECS,
+             json.dumps({'cost-type': {'cost-mode': 'array'},
+                         'endpoints': {'srcs': [], 'dsts': []}}),
+             {'code': 'E_MISSING_FIELD', 'field': 'cost-type/cost-metric'}),
+            ('/pathvector/pv', ALTO_PARAMETER_TYPE_ECS,
+             json.dumps({'cost-type': {'cost-mode': 'numerical', 'cost-metric': 'ane-path'},
+                         'endpoints': {'srcs': [], 'dsts': []}}),
+             {'code': 'E_INVALID_FIELD_VALUE', 'field': 'cost-type/cost-mode', 'value': 'numerical'}),
+            ('/pathvector/pv', ALTO_PARAMETER_TYPE_ECS,
+             json.dumps({'cost-type': {'cost-mode': 'array', 'cost-metric': 'ane-path'}}),
+             {'code': 'E_MISSING_FIELD', 'field': 'endpoints'}),
+            ('/pathvector/pv', ALTO_PARAMETER_TYPE_ECS,
+             json.dumps({'cost-type': {'cost-mode': 'array', 'cost-metric': 'ane-path'},
+                         'endpoints': {'srcs': ['mac:00:00:5e:00:53:01'], 'dsts': []}}),
+             {'code': 'E_INVALID_FIELD_VALUE', 'field': 'endpoints/srcs',
+              'value': 'mac:00:00:5e:00:53:01'}),
+            ('/pathvector/pv', ALTO_PARAMETER_TYPE_ECS,
+             json.dumps({'cost-type': {'cost-mode': 'array', 'cost-metric': 'ane-path'},
+                         'endpoints': {'srcs': ['ipv4:10.1.0.2'], 'dsts': ['10.2.0.2']}}),
+             {'code': 'E_INVALID_FIELD_VALUE', 'field': 'endpoints/dsts', 'value': '10.2.0.2'}),
+            ('/tips-control/updates-graph', ALTO_PARAMETER_TYPE_TIPS, '{"resource-id": 1}',
+             {'code': 'E_INVALID_FIELD_TYPE', 'field': 'resource-id'}),
+        ]
+        for path, content_type, data, meta in cases:
+            response = self.client.post(path, data=data, content_type=content_type)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(response.get('Content-Type'), ALTO_CONTENT_TYPE_ERROR)
+            self.assertDictEqual(response.json()['meta'], meta)
+
+
     def test_error_not_found(self):
         response = self.client.get('/not_exist',
                                    accepts=ALTO_CONTENT_TYPE_IRD)
@@ -55,8 +55,8 @@ class ALTOVersionControlTest(TestCase):
         return super().setUpClass()
     
     def setUp(self) -> None:
-        from alto.server.components.vcs import VersionControl
-        self.vcs = VersionControl()
+        from alto.server.components.vcs import get_vcs
+        self.vcs = get_vcs(create=True)
         return super().setUp()
 
     def tearDown(self) -> None:
@@ -78,7 +78,13 @@ class ALTOVersionControlTest(TestCase):
 
         # Full Replacement Test
         self.vcs.show_tips_view(resource_id, digest)
-        update_graph = self.vcs.get_tips_view(resource_id, digest)
+        # Compaction runs periodically; run one pass before the update
+        # graph is read so that the snapshot limit is enforced
+        listener = self.vcs.subscribers[(resource_id, digest)]
+        group = self.vcs.scheduler.get_group(listener.group_key)
+        with group.lock:
+            listener.compact()
+            update_graph = self.vcs.get_tips_view(resource_id, digest)
         full_versions = update_graph['0']
 
         snapshot_limit = self.config.get_vcs_snapshot_limit()
@@ -136,3 +142,327 @@ class ALTOVersionControlTest(TestCase):
         # Stop Test
         self.vcs.stop()
         self.assertDictEqual(self.vcs.subscribers, dict(), 'stop() MUST clean up all the active subscription')
+
+    def test_get_vcs(self):
+        from alto.server.components.vcs import get_vcs
+        self.assertIs(get_vcs(create=False), self.vcs)
+        self.assertIs(get_vcs(), self.vcs)
+
+        # A stopped version control system is not reused
+        self.vcs.stop()
+        self.assertIsNone(get_vcs(create=False))
+        self.vcs = get_vcs()
+        self.assertIsNot(self.vcs, None)
+        self.assertIs(get_vcs(create=False), self.vcs)
+
+    def test_local_resource(self):
+        from alto.server.components.vcs import get_local_resource
+
+        resources = self.config.get_configured_resources()
+        with mock.patch('requests.request') as mocked_request:
+            res = get_local_resource(self.vcs, 'dynamic-networkmap', resources['dynamic-networkmap'])
+            mocked_request.assert_not_called()
+        self.assertIn('network-map', res)
+
+        # Multipart resources fall back to HTTP
+        self.assertIsNone(get_local_resource(self.vcs, 'pv', resources['pv'],
+                                             request_body={'endpoints': {'srcs': [], 'dsts': []}}))
+
+    def test_event_driven_updates(self):
+        from alto.server.components.db import data_broker_manager
+
+        self.vcs.update_mode = 'event'
+        self.vcs.update_debounce = 0.1
+        resource_id = 'dynamic-networkmap'
+        digest = self.vcs.subscribe(resource_id, client_id='client1')
+        listener = self.vcs.subscribers[(resource_id, digest)]
+        init_ver = listener.last_ver
+
+        # No commit, no update
+        self.assertEqual(listener.wait_for_version(init_ver, timeout=1.5), init_ver)
+
+        endpoint_db = data_broker_manager.get('default', 'endpoint')
+        generation = endpoint_db.get_generation()
+        for i in range(3):
+            trans = endpoint_db.new_transaction()
+            trans.add_property('10.0.0.{}'.format(i), {'pid': 'PID{}'.format(i)})
+            trans.commit()
+        self.assertEqual(endpoint_db.get_generation(), generation + 3)
+
+        # Commits in a burst are coalesced into one update
+        self.assertEqual(listener.wait_for_version(init_ver, timeout=3), init_ver + 1)
+        self.assertEqual(listener.wait_for_version(init_ver + 1, timeout=1.5), init_ver + 1)
+
+    def test_scheduler(self):
+        resource_id = 'dynamic-networkmap'
+        digest = self.vcs.subscribe(resource_id, client_id='client1')
+        digest2 = self.vcs.subscribe(resource_id, client_id='client2', diff_format=Diff.JSON_PATCH)
+        self.assertNotEqual(digest, digest2)
+
+        # Subscriptions to the same resource share the generation
+        metrics = self.vcs.scheduler.get_metrics()
+        self.assertEqual(metrics['groups'], 1)
+        self.assertEqual(metrics['listeners'], 2)
+        self.assertEqual(metrics['queue_depth'], 0)
+
+        listener = self.vcs.subscribers[(resource_id, digest)]
+        listener2 = self.vcs.subscribers[(resource_id, digest2)]
+        self.assertGreater(listener.wait_for_version(listener.last_ver, timeout=3), listener.init_ver)
+        self.assertGreater(listener2.wait_for_version(listener2.last_ver, timeout=3), listener2.init_ver)
+
+        self.assertTrue(self.vcs.unsubscribe(resource_id, digest2, client_id='client2'))
+        self.assertEqual(self.vcs.scheduler.get_metrics()['listeners'], 1)
+
+        # A new diff format joins the version stream of the resource
+        digest2 = self.vcs.subscribe(resource_id, client_id='client2', diff_format=Diff.JSON_PATCH)
+        listener2 = self.vcs.subscribers[(resource_id, digest2)]
+        self.assertGreater(listener2.init_ver, listener.init_ver)
+        listener2.wait_for_version(listener2.init_ver, timeout=3)
+        group = self.vcs.scheduler.get_group(listener.group_key)
+        with group.lock:
+            self.assertEqual(listener.last_ver, group.version)
+            self.assertEqual(listener2.last_ver, group.version)
+
+    def test_filesystem_store(self):
+        import tempfile
+        from alto.server.components.storage import FilesystemStore
+
+        with tempfile.TemporaryDirectory() as root:
+            self.vcs.store = FilesystemStore(root=root)
+            resource_id = 'dynamic-networkmap'
+            digest = self.vcs.subscribe(resource_id, client_id='client1')
+            listener = self.vcs.subscribers[(resource_id, digest)]
+            init_ver = listener.init_ver
+            listener.wait_for_version(init_ver, timeout=3)
+
+            # ZooKeeper only keeps the structure of the update graph
+            path = '/alto/{}/{}/ug/0/{}'.format(resource_id, digest, init_ver)
+            data, _ = self.vcs.zk.get(path)
+            self.assertEqual(data, b'')
+            snapshot = json.loads(self.vcs.get_tips_data(resource_id, digest, '0', init_ver))
+            self.assertIn('network-map', snapshot)
+            patch = self.vcs.get_tips_data(resource_id, digest, init_ver, init_ver + 1)
+            self.assertIsNotNone(patch)
+
+            self.assertTrue(self.vcs.unsubscribe(resource_id, digest, client_id='client1'))
+
+            # Followers cannot serve payloads stored on the leader's host
+            from alto.common.error import NotSupportedError
+            from alto.server.components.vcs import get_vcs
+            self.vcs.stop()
+            with mock.patch.object(Config, 'get_vcs_storage', return_value='filesystem'), \
+                    mock.patch.object(Config, 'get_vcs_storage_config', return_value={'root': root}):
+                with self.assertRaises(NotSupportedError):
+                    get_vcs()
+                self.assertIsNone(get_vcs(create=False))
+            with mock.patch.object(Config, 'get_vcs_storage', return_value='filesystem'), \
+                    mock.patch.object(Config, 'get_vcs_storage_config',
+                                      return_value={'root': root, 'shared': True}):
+                self.vcs = get_vcs()
+            self.assertTrue(self.vcs.store.shared)
+            self.assertIsNone(self.vcs.get_tips_data(resource_id, digest, '0', init_ver))
+            self.assertFalse(os.path.exists(os.path.join(root, 'alto', resource_id, digest)))
+
+    def test_tips_meta(self):
+        from alto.server.components.backend import TIPSControlService
+
+        resource_id = 'dynamic-networkmap'
+        digest = self.vcs.subscribe(resource_id, client_id='client1')
+        listener = self.vcs.subscribers[(resource_id, digest)]
+        listener.wait_for_version(listener.init_ver, timeout=3)
+        self.vcs.scheduler.stop()
+
+        meta = self.vcs.get_tips_meta(resource_id, digest)
+        for start_seq, end_seqs in meta['updates-graph'].items():
+            for end_seq, edge in end_seqs.items():
+                data = self.vcs.get_tips_data(resource_id, digest, start_seq, end_seq)
+                self.assertEqual(edge['size'], len(data))
+
+        # The metadata is published to the other processes
+        del self.vcs.subscribers[(resource_id, digest)]
+        self.assertDictEqual(self.vcs.get_tips_meta(resource_id, digest), meta)
+
+        # The TIPS view is served without reading any payload
+        tips = TIPSControlService('default', tips_resource_id='updates-graph')
+        with mock.patch.object(self.vcs.store, 'get', side_effect=AssertionError):
+            view = tips.get_tips_view(resource_id, digest)
+            self.assertEqual(view['meta']['tag'], meta['tag'])
+            self.assertDictEqual(view['updates-graph'], meta['updates-graph'])
+            self.assertIs(tips.get_tips_view(resource_id, digest), view)
+
+    def test_shortcuts(self):
+        from alto.server.components.vcs import ResourceListener
+
+        def make_map(ver):
+            network_map = {'PID{}'.format(i): {'ipv4': ['10.{}.0.0/16'.format(i)]} for i in range(100)}
+            network_map['PID0'] = {'ipv4': ['192.0.2.{}/32'.format(ver)]}
+            return {'network-map': network_map}
+
+        resource_id = 'dynamic-networkmap'
+        resource = self.config.get_configured_resources()[resource_id]
+        for mode, window in [('latest', 4), ('skiplist', 4)]:
+            path = '/alto/{}/shortcut-{}'.format(resource_id, mode)
+            listener = ResourceListener(self.vcs, path, resource_id, resource, snapshot_freq=100,
+                                        init_ver=1, init_res=make_map(1),
+                                        shortcut_mode=mode, shortcut_window=window)
+            for ver in range(2, 9):
+                listener.update(make_map(ver))
+            ug = listener.meta['updates-graph']
+            self.assertIn('8', ug['7'])
+            if mode == 'latest':
+                for start_seq in range(4, 7):
+                    self.assertIn('8', ug[str(start_seq)])
+                self.assertNotIn('7', ug['4'])
+                start_seq, end_seq = 4, 8
+            else:
+                self.assertIn('7', ug['5'])
+                self.assertIn('5', ug['3'])
+                self.assertIn('5', ug['1'])
+                # Not aligned on a power of 2
+                self.assertNotIn('8', ug['6'])
+                start_seq, end_seq = 3, 5
+
+            data = self.vcs.get_tips_data(resource_id, 'shortcut-{}'.format(mode), start_seq, end_seq)
+            self.assertEqual(ug[str(start_seq)][str(end_seq)]['size'], len(data))
+            patched = json_merge_patch.merge(make_map(start_seq), json.loads(data))
+            self.assertDictEqual(patched, make_map(end_seq))
+
+        # Shortcuts are computed off the update path once the scheduler runs
+        path = '/alto/{}/shortcut-background'.format(resource_id)
+        listener = ResourceListener(self.vcs, path, resource_id, resource, init_ver=1,
+                                    init_res=make_map(1), shortcut_mode='latest', shortcut_window=4)
+        listener.update(make_map(2))
+        with mock.patch.object(self.vcs.scheduler, 'submit', return_value=True) as submit:
+            listener.update(make_map(3))
+            submit.assert_called_once_with(listener.run_shortcuts)
+            self.assertNotIn('3', listener.meta['updates-graph']['1'])
+            # Superseded shortcuts are skipped
+            listener.update(make_map(4))
+            listener.run_shortcuts()
+        ug = listener.meta['updates-graph']
+        self.assertListEqual(sorted(ug['1']), ['2', '4'])
+        self.assertListEqual(sorted(ug['2']), ['3', '4'])
+
+        # Shortcuts larger than the snapshot are skipped
+        listener.update({'network-map': {}})
+        self.assertListEqual(list(listener.meta['updates-graph']['2']), ['3'])
+
+    def test_compaction(self):
+        from alto.server.components.vcs import ResourceListener
+
+        def make_map(ver):
+            return {'network-map': {'PID0': {'ipv4': ['192.0.2.{}/32'.format(ver)]}}}
+
+        resource_id = 'dynamic-networkmap'
+        digest = 'compaction'
+        resource = self.config.get_configured_resources()[resource_id]
+        self.vcs.snapshot_compression = 'gzip'
+        listener = ResourceListener(self.vcs, '/alto/{}/{}'.format(resource_id, digest), resource_id,
+                                    resource, snapshot_freq=2, snapshot_limit=3, init_ver=1)
+        for ver in range(2, 10):
+            listener.update(make_map(ver))
+        ug = listener.meta['updates-graph']
+        self.assertListEqual(sorted(ug['0'], key=int), ['1', '3', '5', '7', '9'])
+
+        # Snapshots are compressed in the store, not in the metadata
+        raw, _ = self.vcs.zk.get('/alto/{}/{}/ug/0/9'.format(resource_id, digest))
+        self.assertTrue(raw.startswith(b'\x1f\x8b'))
+        data = self.vcs.get_tips_data(resource_id, digest, '0', '9')
+        self.assertEqual(json.loads(data), make_map(9))
+        self.assertEqual(ug['0']['9']['size'], len(data))
+
+        # Count-based retention, removing the nodes one by one if a
+        # transaction fails
+        with mock.patch.object(self.vcs.zk, 'transaction', side_effect=RuntimeError):
+            self.assertGreater(listener.compact(), 0)
+        self.assertIsNone(self.vcs.zk.exists('/alto/{}/{}/ug/3'.format(resource_id, digest)))
+        ug = listener.meta['updates-graph']
+        self.assertListEqual(sorted(ug['0'], key=int), ['5', '7', '9'])
+        self.assertTrue(all(int(start_seq) >= 5 for start_seq in ug if start_seq != '0'))
+        self.assertIsNone(self.vcs.get_tips_data(resource_id, digest, '3', '4'))
+        self.assertEqual(listener.compact(), 0)
+
+        # Size-based retention keeps the latest snapshot at least
+        listener.retention_size = 1
+        listener.compact()
+        ug = listener.meta['updates-graph']
+        self.assertListEqual(list(ug['0']), ['9'])
+        self.assertListEqual(list(ug), ['0'])
+
+        # Age-based retention
+        listener.retention_size = 0
+        listener.retention_age = 60
+        for ver in range(10, 12):
+            listener.update(make_map(ver))
+        for ver in listener.version_times:
+            if ver < 11:
+                listener.version_times[ver] -= 120
+        listener.compact()
+        self.assertListEqual(list(listener.meta['updates-graph']['0']), ['11'])
+
+    def test_leader_election(self):
+        from alto.server.components.vcs import ListenerGroup, ResourceListener
+
+        def make_map(ver):
+            return {'network-map': {'PID0': {'ipv4': ['192.0.2.{}/32'.format(ver)]}}}
+
+        resource_id = 'dynamic-networkmap'
+        digest = 'election'
+        path = '/alto/{}/{}'.format(resource_id, digest)
+        resource = self.config.get_configured_resources()[resource_id]
+        self.vcs.zk.ensure_path('{}/subscriber/client1'.format(path))
+        leader = ResourceListener(self.vcs, path, resource_id, resource,
+                                  init_ver=1, init_res=make_map(1))
+        self.assertTrue(leader.leader)
+        leader.update(make_map(2))
+        self.assertEqual(leader.last_ver, 2)
+
+        # Another replica stands by and serves the published update graph
+        follower = ResourceListener(self.vcs, path, resource_id, resource,
+                                    init_ver=1, init_res=make_map(2))
+        self.assertTrue(follower.success)
+        self.assertFalse(follower.leader)
+        self.assertIsNone(follower.meta)
+        self.assertFalse(follower.elect())
+
+        # The follower takes over once the leader resigns, and resumes the
+        # update graph from a new snapshot
+        leader.resign()
+        for _ in range(30):
+            if follower.elect():
+                break
+            time.sleep(0.1)
+        self.assertTrue(follower.elect())
+        group = ListenerGroup(self.vcs.scheduler, follower)
+        group.listeners.append(follower)
+        group.run()
+        self.assertTrue(follower.leader)
+        self.assertEqual(follower.last_ver, 3)
+        self.assertGreaterEqual(group.version, 3)
+        ug = follower.meta['updates-graph']
+        self.assertIn('3', ug['0'])
+        self.assertIn('2', ug['1'])
+
+        # Leaderships are given up with the ZooKeeper session
+        self.vcs.subscribers[(resource_id, digest)] = follower
+        self.vcs.on_zk_state('LOST')
+        self.assertFalse(follower.leader)
+        del self.vcs.subscribers[(resource_id, digest)]
+        follower.stop()
+        follower.resign()
+
+        # The last client unsubscribes through a replica without the leader,
+        # which then removes the view on its next update
+        digest = 'election-teardown'
+        path = '/alto/{}/{}'.format(resource_id, digest)
+        self.vcs.zk.ensure_path('{}/subscriber/client1'.format(path))
+        leader = ResourceListener(self.vcs, path, resource_id, resource,
+                                  init_ver=1, init_res=make_map(1))
+        group = ListenerGroup(self.vcs.scheduler, leader)
+        group.listeners.append(leader)
+        self.assertTrue(self.vcs.unsubscribe(resource_id, digest, client_id='client1'))
+        self.assertIsNotNone(self.vcs.zk.exists('{}/meta'.format(path)))
+        group.run()
+        self.assertTrue(leader.stop_event.is_set())
+        self.assertFalse(leader.leader)
+        self.assertIsNone(self.vcs.zk.exists(path))